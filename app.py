@@ -1,9 +1,18 @@
 import sys
 from simple_agent import SimpleAgent
-from stage_manager import StageManager
+from stage_manager import StageManager, ROUTES_FILE
 from data_manager import DataManager
-from conversation_ui import print_agent_message, print_user_message, get_user_input, ThinkingAnimation
-from widget_handler import is_widget_field, show_widget_for_field
+from conversation_ui import print_agent_message, print_user_message, get_user_input, ThinkingAnimation, AgentMessageStream
+from widget_handler import is_widget_field, show_widget_for_field, next_chained_widget, widget_chain_response
+from llm_backends import create_backend, CASSETTE_FILE
+from session import Session, SESSIONS_DIR
+from history_manager import HistoryManager
+from metrics import TurnMetrics, MetricsLog, print_summary
+from storage import create_storage, DEFAULT_DB_FILE
+from rule_engine import offline_response
+from response_cache import create_response_cache, DEFAULT_CACHE_FILE
+from numeric_extractor import fast_path_response
+from prefetch import create_prefetcher, WidgetPrefetch, DEFAULT_BUDGET
 
 def main():
     """Simple onboarding with flattened architecture"""
@@ -12,12 +21,63 @@ def main():
     prompt_mode = "--full-prompt" in sys.argv
     language_mode = "--language" in sys.argv
     test_mode = "--test" in sys.argv
+    stream_mode = "--stream" in sys.argv
+    chat_mode = "--chat-messages" in sys.argv
+    metrics_mode = "--metrics" in sys.argv
+    offline_recommendations = "--offline-recommendations" in sys.argv
+    local_extraction = "--local-extraction" in sys.argv
+    widget_chain = "--widget-chain" in sys.argv
     
     # Check for model parameter
     model = "gpt-4.1"  # default
+    llm = "openai"  # default, "stub" answers locally, "record"/"replay" write/read a cassette
+    llm_latency = 0.0  # artificial latency of the stub and replay backends
+    cassette_file = CASSETTE_FILE
+    session_id = None  # default session uses data/*.json
+    sessions_dir = SESSIONS_DIR
+    history_budget = None  # default sends the full history
+    log_fsync = "interval"  # conversation log fsync policy: none, interval or always
+    storage_name = "json"  # default keeps data in data/*.json, "sqlite" uses a database
+    db_file = DEFAULT_DB_FILE
+    temperature = None  # default uses the provider's sampling temperature
+    response_cache_mode = "on" if "--response-cache" in sys.argv else None  # "force" also caches temperature > 0
+    response_cache_file = DEFAULT_CACHE_FILE
+    prefetch_mode = "all" if "--prefetch" in sys.argv else None  # a number prefetches the top-k options
+    prefetch_budget = DEFAULT_BUDGET
+    routes_file = ROUTES_FILE if "--model-routes" in sys.argv else None  # default sends every turn to --model
     for arg in sys.argv:
         if arg.startswith("--model="):
             model = arg.split("=")[1]
+        elif arg.startswith("--llm="):
+            llm = arg.split("=")[1]
+        elif arg.startswith("--llm-latency="):
+            llm_latency = float(arg.split("=")[1])
+        elif arg.startswith("--cassette="):
+            cassette_file = arg.split("=")[1]
+        elif arg.startswith("--session="):
+            session_id = arg.split("=")[1]
+        elif arg.startswith("--sessions-dir="):
+            sessions_dir = arg.split("=")[1]
+        elif arg.startswith("--history-budget="):
+            history_budget = int(arg.split("=")[1])
+        elif arg.startswith("--log-fsync="):
+            log_fsync = arg.split("=")[1]
+        elif arg.startswith("--storage="):
+            storage_name = arg.split("=")[1]
+        elif arg.startswith("--db="):
+            db_file = arg.split("=")[1]
+        elif arg.startswith("--temperature="):
+            temperature = float(arg.split("=")[1])
+        elif arg.startswith("--response-cache="):
+            response_cache_mode = arg.split("=")[1]
+        elif arg.startswith("--response-cache-file="):
+            response_cache_file = arg.split("=")[1]
+        elif arg.startswith("--prefetch="):
+            prefetch_mode = arg.split("=")[1]
+        elif arg.startswith("--prefetch-budget="):
+            prefetch_budget = int(arg.split("=")[1])
+        elif arg.startswith("--model-routes="):
+            routes_file = arg.split("=")[1]
     
     # Display mode information
     if debug_mode:
@@ -29,19 +89,42 @@ def main():
     
     print("Type 'quit' to exit")
     
+    storage = create_storage(storage_name, db_file)
+    
+    # Resolve the session: --session=new creates one, an existing id resumes it
+    if session_id is None:
+        session = Session.default()
+    elif session_id != "new" and Session.exists(session_id, sessions_dir):
+        session = Session.load(session_id, sessions_dir, storage=storage)
+    else:
+        session = Session.create(None if session_id == "new" else session_id, sessions_dir=sessions_dir)
+    if session.directory:
+        print(f"Session: {session.session_id}")
+    
     # Initialize components
+    data_manager = DataManager(session=session, log_fsync=log_fsync, storage=storage)
+    history_manager = HistoryManager(token_budget=history_budget, data_manager=data_manager) if history_budget else None
     agent = SimpleAgent(
         debug_mode=debug_mode, 
         prompt_mode=prompt_mode, 
         language_mode=language_mode, 
-        model=model
+        model=model,
+        backend=create_backend(llm, latency=llm_latency, cassette=cassette_file, model=model),
+        session=session,
+        chat_mode=chat_mode,
+        history_manager=history_manager,
+        temperature=temperature,
+        response_cache=create_response_cache(response_cache_mode, response_cache_file)
     )
-    stage_manager = StageManager(debug_mode=debug_mode)
-    data_manager = DataManager()
+    stage_manager = StageManager(debug_mode=debug_mode, data_manager=data_manager, session=session, routes_file=routes_file)
+    prefetcher = create_prefetcher(prefetch_mode, prefetch_budget)
+    prefetch = WidgetPrefetch(prefetcher, agent, stage_manager, data_manager, widget_chain, offline_recommendations) if prefetcher else None
     system_messages_history = []
+    metrics_log = MetricsLog(session.metrics_file)
     
     # Main conversation loop
     user_input = ""  # Initialize user_input
+    after_widget = False  # user_input is a widget selection
     
     while not stage_manager.is_complete():
         # Get user input if needed (and not already set from widget)
@@ -68,22 +151,86 @@ def main():
             if debug_mode:
                 print(f"[DEBUG] - Automatic transition to recommendations stage")
         
+        turn_metrics = TurnMetrics(stage_manager.conversation_turn + 1, stage_manager.get_current_stage())
+        
         # Get FRESH stage context AFTER previous updates have been applied
         stage_context = stage_manager.get_current_stage_context()
         profile_and_data_context = stage_manager.get_profile_and_data_context()
+        # Model settings of the stage and of the field being answered (None without --model-routes)
+        route = stage_manager.get_route(response["system_commands"]["asking"] if 'response' in locals() else None)
         # Agent conversation with thinking animation
         thinking_animation = ThinkingAnimation()
         thinking_animation.start()
+        streamed_results = []
+        streamed = False
+        
+        # A numeric answer (age, weight, height) the extractor can read needs no LLM call,
+        # and in widget chain mode neither does moving from one widget to the next
+        local_raw, local_source = None, None
+        if user_input and stage_manager.get_current_stage() == "QUESTIONNAIRE" and 'response' in locals():
+            chained_field = next_chained_widget(data_manager.load_data()) if widget_chain and after_widget else None
+            if chained_field:
+                local_raw, local_source = widget_chain_response(chained_field, language_mode), "widget_chain"
+            elif local_extraction:
+                local_raw = fast_path_response(response["system_commands"]["asking"], user_input, data_manager.load_data(), language_mode)
+                local_source = "local_extractor"
+        
+        if offline_recommendations and stage_manager.get_current_stage() == "RECOMMENDATIONS":
+            # Rule engine picks the actions, no LLM call
+            response = agent.respond_locally(user_input, offline_response(data_manager.eligible_actions(), language_mode))
+            thinking_animation.stop()
+            print_agent_message(response["user_message"])
+        elif local_raw is not None:
+            response = agent.respond_locally(user_input, local_raw, source=local_source)
+            thinking_animation.stop()
+            print_agent_message(response["user_message"])
+        elif stream_mode:
+            streamed = True
+            # Show the user-facing text as tokens arrive (system message is hidden)
+            message_stream = AgentMessageStream(on_first_text=thinking_animation.stop)
+            
+            # Persist updates as soon as each </update> arrives, before the stream ends
+            def on_event(event):
+                if event["type"] == "update":
+                    streamed_results.append(apply_update(event, data_manager, debug_mode))
+            
+            response = agent.ask_stream(user_input, stage_context, profile_and_data_context,
+                                        on_text=message_stream.write, on_event=on_event, route=route)
+            thinking_animation.stop()
+            message_stream.finish(response["user_message"])
+            if debug_mode and agent.last_stream_timing["ttft_ms"] is not None:
+                timing = agent.last_stream_timing
+                print(f"[DEBUG] - Time to first token: {timing['ttft_ms']:.0f} ms (total {timing['total_ms']:.0f} ms)")
+        else:
+            response = agent.ask(user_input, stage_context, profile_and_data_context, route=route)
+            
+            thinking_animation.stop()
+            
+            # Display response FIRST (before widgets)
+            print_agent_message(response["user_message"])
         
-        response = agent.ask(user_input, stage_context, profile_and_data_context)
+        if debug_mode and route is not None and agent.last_metrics.get("route"):
+            print(f"[DEBUG] - Route: {route['label']} -> {agent.last_metrics['route_model']}")
         
-        thinking_animation.stop()
+        if debug_mode and agent.last_usage:
+            usage = agent.last_usage
+            print(f"[DEBUG] - Prompt tokens: {usage['prompt_tokens']} (cached {usage['cached_tokens']}, "
+                  f"uncached {usage['uncached_tokens']}), completion tokens: {usage['completion_tokens']}")
         
-        # Display response FIRST (before widgets)
-        print_agent_message(response["user_message"])
+        turn_metrics.update(agent.last_metrics)
         
         # Execute system commands (this may show widgets)
-        command_results = execute_system_commands(response["system_commands"], data_manager, debug_mode, test_mode)
+        with turn_metrics.measure("command_execution"):
+            if streamed:
+                # Updates were already applied while streaming
+                remaining_commands = dict(response["system_commands"], updates=[])
+                command_results = streamed_results + execute_system_commands(remaining_commands, data_manager, debug_mode, test_mode,
+                                                                             metrics=turn_metrics, prefetch=prefetch)
+            else:
+                command_results = execute_system_commands(response["system_commands"], data_manager, debug_mode, test_mode,
+                                                          metrics=turn_metrics, prefetch=prefetch)
+        # Time spent waiting on the user in a widget is not command execution
+        turn_metrics.add("command_execution", -turn_metrics.record.get("widget_wait_ms", 0.0))
         
         # Check if a widget was completed
         widget_selection = None
@@ -99,16 +246,21 @@ def main():
             "command_results": command_results
         })
         
-        # Update stage based on response
-        stage_manager.update_stage(response)
-        
-        # Save conversation turn to history
-        data_manager.save_conversation_turn(
-            user_input=user_input,
-            assistant_response=response["user_message"],
-            system_commands=response["system_commands"],
-            current_stage=stage_manager.get_current_stage()
-        )
+        with turn_metrics.measure("persistence"):
+            # Update stage based on response
+            stage_manager.update_stage(response)
+            
+            # Write the turn's data changes once
+            data_manager.flush()
+            
+            # Save conversation turn to history
+            data_manager.save_conversation_turn(
+                user_input=user_input,
+                assistant_response=response["user_message"],
+                system_commands=response["system_commands"],
+                current_stage=stage_manager.get_current_stage()
+            )
+        metrics_log.append(turn_metrics.finish())
         
         # Display recommendations if any
         if response["system_commands"]["recommendations"]:
@@ -125,6 +277,7 @@ def main():
         
         # Clear user_input for next iteration (unless widget sets it)
         user_input = ""
+        after_widget = widget_selection is not None
         
         # If widget was completed, set widget selection as next user input
         if widget_selection:
@@ -138,44 +291,62 @@ def main():
     # Handle final recommendations if we're in recommendations stage
     if stage_manager.get_current_stage() == "RECOMMENDATIONS":
         handle_final_recommendations(agent, data_manager, system_messages_history, debug_mode)
+    
+    # Quitting mid-turn must not lose updates that were already applied
+    data_manager.close()
+    if prefetcher is not None:
+        prefetcher.flush()
+    
+    if metrics_mode:
+        print_summary(metrics_log.records)
+    if agent.response_cache is not None and (metrics_mode or debug_mode):
+        print(f"🗄️  Response cache: {agent.response_cache.summary()}")
+    if prefetcher is not None and (metrics_mode or debug_mode):
+        print(f"🔮 Prefetch: {prefetcher.summary()}")
 
-def execute_system_commands(system_commands, data_manager, debug_mode, test_mode=False):
-    """Execute system commands and return results"""
+def execute_system_commands(system_commands, data_manager, debug_mode, test_mode=False, show_widgets=True, metrics=None,
+                            prefetch=None):
+    """Execute system commands against the session's data manager and return results
+    
+    With show_widgets=False the widget is not shown in the terminal; a
+    WIDGET_PENDING result is returned instead so the caller (e.g. the server
+    engine) can collect the selection itself. A WidgetPrefetch starts the
+    next turn's LLM calls while the widget is open.
+    """
     results = []
     
     # Process updates - but skip widget fields to prevent LLM overwriting widget selections
     for update in system_commands["updates"]:
-        field = update["field"]
-        value = update["value"]
-        
-        # Protection: Skip updates for widget fields
-        if is_widget_field(field):
-            if debug_mode:
-                print(f"[DEBUG] - Skipping update for widget field: {field}")
-            results.append(f"SKIP_UPDATE: {field} is widget field")
-            continue
-            
-        result = data_manager.update_field(field, value)
-        results.append(f"UPDATE: {result}")
+        results.append(apply_update(update, data_manager, debug_mode))
     
     # Check if asking field is a widget field
     if system_commands["asking"]:
         field = system_commands["asking"]
         
-        if is_widget_field(field):
+        if is_widget_field(field) and not show_widgets:
+            results.append(f"WIDGET_PENDING: {field}")
+        elif is_widget_field(field):
             if debug_mode:
                 print(f"[DEBUG] - Showing widget for field: {field}")
             
+            if prefetch is not None:
+                prefetch.opened(field)
+            
             # Test mode: Print marker before widget is shown so test can provide input
             if test_mode:
                 print(f"[TEST_INPUT_NEEDED:QUESTIONNAIRE:{field}]", flush=True)
             
             # Show widget and get user selection
-            widget_result = show_widget_for_field(field)
+            if metrics is not None:
+                with metrics.measure("widget_wait"):
+                    widget_result = show_widget_for_field(field)
+            else:
+                widget_result = show_widget_for_field(field)
             
             if widget_result == "QUIT":
                 # User wants to quit during widget selection - exit main loop
                 import sys
+                data_manager.flush()
                 print("    ❌ Uygulamadan çıkılıyor...")
                 sys.exit(0)
             elif widget_result is not None:
@@ -184,6 +355,8 @@ def execute_system_commands(system_commands, data_manager, debug_mode, test_mode
                 
                 # Use English value for backend storage
                 result = data_manager.update_field(field, english_value)
+                if prefetch is not None:
+                    prefetch.chosen(field, english_value)
                 results.append(f"WIDGET_UPDATE: {result}")
                 # Store Turkish display for user display
                 results.append(f"WIDGET_COMPLETED: {turkish_display}")
@@ -204,6 +377,20 @@ def execute_system_commands(system_commands, data_manager, debug_mode, test_mode
     
     return results
 
+def apply_update(update, data_manager, debug_mode):
+    """Apply a single <update> command and return its result line"""
+    field = update["field"]
+    value = update["value"]
+    
+    # Protection: Skip updates for widget fields
+    if is_widget_field(field):
+        if debug_mode:
+            print(f"[DEBUG] - Skipping update for widget field: {field}")
+        return f"SKIP_UPDATE: {field} is widget field"
+    
+    result = data_manager.update_field(field, value)
+    return f"UPDATE: {result}"
+
 def handle_final_recommendations(agent, data_manager, system_messages_history, debug_mode):
     """Handle final recommendations parsing and saving"""
     # Find the last system message with recommendations
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Bulk recommendation pipeline over a JSONL file of user records
+
+Regenerates recommendations for many users without driving app.py: every
+input line is one user, either {"user_id": ..., "data": {...}, "profile": {...}}
+or the data fields at the top level. Each user gets the RECOMMENDATIONS turn
+(recommendation_prompt.txt with the get_data_status output and the rule
+engine's eligible actions), and one record per user is appended to the
+output file in the save_recommendations format, plus "user_id".
+
+At most --concurrency LLM calls run at once; a failed call (or a response
+without recommendations) is retried --retries times with exponential
+backoff. An input line that is not valid JSON, or whose numeric fields
+cannot be read, counts as a failed user. The output file is the checkpoint: users already in it are
+skipped, so a killed run picks up where it stopped.
+
+Usage:
+    python batch_recommend.py users.jsonl --out=recommendations.jsonl
+    python batch_recommend.py users.jsonl --out=recommendations.jsonl --concurrency=16 --retries=5
+    python batch_recommend.py users.jsonl --out=recommendations.jsonl --llm=stub --llm-latency=0.2
+    python batch_recommend.py users.jsonl --out=recommendations.jsonl --offline-recommendations
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+
+from data_manager import DataManager, build_recommendation_record
+from numeric_extractor import NUMERIC_FIELDS, to_number
+from prompt_registry import shared_cache, get_prompt, read_json
+from rule_engine import format_candidates, offline_response
+from text_parser import parse_response
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_DELAY = 1.0  # Seconds before the first retry, doubled on every further one
+PROGRESS_EVERY = 100
+
+def _typed(field, value):
+    """Convert numeric fields like DataManager.update_field, ValueError if unreadable"""
+    if value is None or field not in NUMERIC_FIELDS:
+        return value
+    number = to_number(field, value)
+    if number is None:
+        raise ValueError(f"Could not read a number for '{field}' from '{value}'")
+    return number
+
+def read_records(path, fields):
+    """Yield (user_id, data, profile, error) for every input line - error is None unless the line is unusable"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            user_id = f"line-{line_number}"
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("record is not a JSON object")
+                source = record.get("data", record)
+                user_id = str(record.get("user_id", record.get("id", user_id)))
+                data = {field: _typed(field, source.get(field)) for field in fields}
+            except (ValueError, AttributeError) as e:
+                yield user_id, None, None, f"unreadable record: {e}"
+                continue
+            yield user_id, data, record.get("profile") or {}, None
+
+def load_checkpoint(path):
+    """Return the user ids already written to the output file
+
+    A killed run may have left a partial last line - it is cut off so the
+    next record starts on a fresh line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    complete_bytes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete_bytes += len(line)
+            try:
+                done.add(json.loads(line)["user_id"])
+            except (ValueError, KeyError):
+                continue
+
+    if complete_bytes < os.path.getsize(path):
+        os.truncate(path, complete_bytes)
+    return done
+
+class BatchRecommender:
+    """Runs the recommendation turn for many users with bounded concurrency"""
+
+    def __init__(self, agent, output_file, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 retry_delay=DEFAULT_RETRY_DELAY, offline=False, language_mode=False):
+        self.agent = agent  # None with offline=True
+        self.output_file = output_file
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.offline = offline
+        self.language_mode = language_mode
+        # Only formats data status and ranks actions - never reads the data files
+        self.data_manager = DataManager()
+        self.completed = 0
+        self.failed = []
+        self._output = None
+
+    async def run(self, records):
+        """Process every (user_id, data, profile, error) record, appending results as they finish"""
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)  # Input is read only as fast as it is processed
+        self._output = open(self.output_file, 'a', encoding='utf-8')
+        try:
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+            for record in records:
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            self._output.close()
+
+    async def _worker(self, queue):
+        """Take records off the queue until the end marker"""
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            await self._process(*record)
+
+    async def _process(self, user_id, data, profile, error=None):
+        """Recommend for one user (with retries) and write the result"""
+        if error is not None:
+            print(f"❌ {user_id}: {error}")
+            self.failed.append(user_id)
+            return
+
+        candidates = self.data_manager.eligible_actions(data)
+
+        for attempt in range(self.retries + 1):
+            try:
+                message, actions = await self._recommend(data, profile, candidates)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"❌ {user_id}: {e}")
+                    self.failed.append(user_id)
+                    return
+                await asyncio.sleep(self.retry_delay * 2 ** attempt * random.uniform(1.0, 1.5))
+
+        record = {"user_id": user_id, **build_recommendation_record(data, actions, message)}
+        # One complete line per user - the checkpoint only counts finished lines
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+
+        self.completed += 1
+        if self.completed % PROGRESS_EVERY == 0:
+            print(f"  ... {self.completed} users done")
+
+    async def _recommend(self, data, profile, candidates):
+        """Return (message, actions) for one user"""
+        if self.offline:
+            response = parse_response(offline_response(candidates, self.language_mode))
+        else:
+            # A fork has its own empty history and shares the pooled LLM client
+            agent = self.agent.fork()
+            response = await agent.ask_async("", get_prompt("recommendation_prompt"), self._context(data, profile, candidates))
+
+        actions = response["system_commands"]["recommendations"]
+        if not actions:
+            raise ValueError("response contains no recommendations")
+        return response["user_message"], actions
+
+    def _context(self, data, profile, candidates):
+        """Profile and data context, laid out like StageManager.get_profile_and_data_context"""
+        context_parts = []
+        if profile.get("name"):
+            context_parts.append(f"USER PROFILE:\nName: {profile['name']}")
+            context_parts.append(f"User Type: {profile.get('user_type', 'new')}")
+        context_parts.append(f"CURRENT DATA STATUS:\n{self.data_manager.get_data_status(data)}")
+        context_parts.append(format_candidates(candidates))
+        return "\n\n".join(context_parts)
+
+def main():
+    """Parse flags and run the batch"""
+    debug_mode = "--debug" in sys.argv
+    language_mode = "--language" in sys.argv
+    chat_mode = "--chat-messages" in sys.argv
+    offline = "--offline-recommendations" in sys.argv
+
+    input_file = None
+    output_file = "data/batch_recommendations.jsonl"
+    concurrency = DEFAULT_CONCURRENCY
+    retries = DEFAULT_RETRIES
+    retry_delay = DEFAULT_RETRY_DELAY
+    model = "gpt-4.1"
+    llm = "openai"
+    llm_latency = 0.0
+    cassette_file = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--out="):
+            output_file = arg.split("=")[1]
+        elif arg.startswith("--concurrency="):
+            concurrency = int(arg.split("=")[1])
+        elif arg.startswith("--retries="):
+            retries = int(arg.split("=")[1])
+        elif arg.startswith("--retry-delay="):
+            retry_delay = float(arg.split("=")[1])
+        elif arg.startswith("--model="):
+            model = arg.split("=")[1]
+        elif arg.startswith("--llm="):
+            llm = arg.split("=")[1]
+        elif arg.startswith("--llm-latency="):
+            llm_latency = float(arg.split("=")[1])
+        elif arg.startswith("--cassette="):
+            cassette_file = arg.split("=")[1]
+        elif not arg.startswith("--"):
+            input_file = arg
+
+    if input_file is None:
+        print("Usage: python batch_recommend.py users.jsonl [--out=recommendations.jsonl] [--concurrency=N] [--retries=N]")
+        sys.exit(1)
+
+    agent = None
+    if not offline:
+        from simple_agent import SimpleAgent
+        from llm_backends import create_backend, CASSETTE_FILE
+        agent = SimpleAgent(
+            debug_mode=debug_mode,
+            language_mode=language_mode,
+            model=model,
+            backend=create_backend(llm, latency=llm_latency, jitter=llm_latency,
+                                   cassette=cassette_file or CASSETTE_FILE, model=model),
+            chat_mode=chat_mode
+        )
+
+    fields = list(shared_cache.get(DataManager().data_file, read_json))
+    done = load_checkpoint(output_file)
+    records = (record for record in read_records(input_file, fields) if record[0] not in done)
+    if done:
+        print(f"↩️  Resuming: {len(done)} users already in {output_file}")
+
+    recommender = BatchRecommender(agent, output_file, concurrency, retries, retry_delay, offline, language_mode)
+    start_time = time.perf_counter()
+    asyncio.run(recommender.run(records))
+    elapsed = time.perf_counter() - start_time
+
+    rate = recommender.completed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ {recommender.completed} users written to {output_file} in {elapsed:.1f}s ({rate:.1f}/s)"
+          + (f", {len(recommender.failed)} failed (re-run to retry them)" if recommender.failed else ""))
+    if recommender.failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Per-turn data file I/O: write-through DataManager vs the write-back cache
+
+Replays the data side of a questionnaire turn the way app.main runs it
+(execute_system_commands with three updates and an asking field, stage
+update, the next turn's data status, the history save) against a temporary
+session, and counts the file operations each variant makes per turn:
+opens for reading, opens for writing and renames.
+
+Usage:
+    python bench/data_io.py
+    python bench/data_io.py --turns=500
+"""
+
+import os
+import sys
+import time
+import builtins
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session import Session
+from data_manager import DataManager
+from stage_manager import StageManager
+from app import execute_system_commands
+
+UPDATES = [
+    {"field": "age", "value": "34"},
+    {"field": "weight", "value": "72"},
+    {"field": "height", "value": "178"}
+]
+
+class FileOpCounter:
+    """Counts open() and os.replace() calls made while active"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def __enter__(self):
+        self._open, self._replace = builtins.open, os.replace
+
+        def counting_open(file, mode="r", *args, **kwargs):
+            self.counts["write opens" if any(flag in mode for flag in "wax+") else "read opens"] += 1
+            return self._open(file, mode, *args, **kwargs)
+
+        def counting_replace(*args, **kwargs):
+            self.counts["renames"] += 1
+            return self._replace(*args, **kwargs)
+
+        builtins.open, os.replace = counting_open, counting_replace
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open, os.replace = self._open, self._replace
+
+def run_turns(write_back, turns, sessions_dir):
+    """Run the data side of `turns` questionnaire turns, returns (op counts, seconds)"""
+    session = Session.create(sessions_dir=sessions_dir)
+    data_manager = DataManager(session=session, write_back=write_back)
+    stage_manager = StageManager(data_manager=data_manager, session=session)
+    stage_manager.current_stage = "QUESTIONNAIRE"
+    commands = {"updates": UPDATES, "asking": "age", "recommendations": []}
+    response = {"user_message": "Thanks!", "system_commands": commands}
+
+    with FileOpCounter() as counter:
+        start = time.perf_counter()
+        for _ in range(turns):
+            execute_system_commands(commands, data_manager, debug_mode=False)
+            stage_manager.update_stage(response)
+            data_manager.flush()
+            data_manager.save_conversation_turn("34, 72kg, 178cm", "Thanks!", commands, "QUESTIONNAIRE")
+            stage_manager.get_profile_and_data_context()
+        elapsed = time.perf_counter() - start
+
+    return counter.counts, elapsed
+
+def main():
+    """Compare both variants and print the per-turn counts"""
+    turns = 200
+    for arg in sys.argv:
+        if arg.startswith("--turns="):
+            turns = int(arg.split("=")[1])
+
+    print(f"📁 Data file operations per turn ({turns} turns, 3 updates each)")
+    print("   (conversation_history.json and session.json writes are included in both)")
+    with tempfile.TemporaryDirectory() as sessions_dir:
+        for label, write_back in (("before", False), ("after", True)):
+            counts, elapsed = run_turns(write_back, turns, sessions_dir)
+            per_turn = ", ".join(f"{name} {counts[name] / turns:.1f}" for name in ("read opens", "write opens", "renames"))
+            print(f"{label:<7} {per_turn} | {elapsed / turns * 1000:.2f} ms/turn")
+
+if __name__ == "__main__":
+    main()
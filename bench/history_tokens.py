@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Prompt tokens per turn with and without the history manager
+
+Runs every scenario in data/test.json through ConversationEngine with the
+local stub LLM (no API key needed), once sending the full history and once
+with a token-budgeted HistoryManager, and prints the estimated prompt tokens
+of each LLM call. Sessions are created in a temporary directory, so the
+data/ files are never touched.
+
+Usage:
+    python bench/history_tokens.py
+    python bench/history_tokens.py --budget=200 --keep-turns=3 --reply-tokens=80 --chat-messages
+    python bench/history_tokens.py "Social Smoker"
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simple_agent import SimpleAgent
+from session import Session
+from conversation_engine import ConversationEngine
+from llm_backends import StubBackend, prompt_text
+from history_manager import HistoryManager, estimate_tokens
+
+MAX_SUBMITS = 60
+FILLER_SENTENCE = "That is really helpful to know, and it gives me a clearer picture of your daily routine. "
+
+class MeasuringBackend(StubBackend):
+    """Stub backend that records the estimated size of every prompt
+    
+    The scripted replies are padded to a realistic length, since real model
+    messages are much longer than the stub's one-liners.
+    """
+
+    def __init__(self, reply_tokens):
+        super().__init__()
+        self.filler = FILLER_SENTENCE * max(0, reply_tokens // estimate_tokens(FILLER_SENTENCE))
+        self.prompt_tokens = []
+
+    def respond(self, prompt, model=None):
+        self.prompt_tokens.append(estimate_tokens(prompt_text(prompt)))
+        return self.filler + super().respond(prompt, model)
+
+async def run_scenario(scenario, sessions_dir, history_manager, chat_mode, reply_tokens):
+    """Drive one scenario to completion, returns the prompt tokens per LLM call"""
+    backend = MeasuringBackend(reply_tokens)
+    agent = SimpleAgent(backend=backend, chat_mode=chat_mode, history_manager=history_manager)
+    session = Session.create(data=scenario.get("existing_data"), sessions_dir=sessions_dir)
+    engine = ConversationEngine(agent.fork(session), session)
+    inputs = scenario.get("inputs", {})
+
+    events = await engine.start()
+    for _ in range(MAX_SUBMITS):
+        if engine.is_complete():
+            break
+        if engine.pending_widget:
+            text = inputs.get(engine.pending_widget, "1")
+        else:
+            asking = next((e["field"] for e in reversed(events) if e["type"] == "input_needed"), None)
+            text = inputs.get(asking, "ok")
+        events = await engine.submit(text)
+
+    return backend.prompt_tokens
+
+def print_curve(name, full, budgeted):
+    """Print tokens per LLM call side by side with a bar for the budgeted run"""
+    print(f"\n📈 {name}")
+    print(f"  {'call':>4} {'full':>7} {'budget':>7}")
+    scale = max(full + budgeted) / 40 or 1
+    for index in range(max(len(full), len(budgeted))):
+        a = full[index] if index < len(full) else 0
+        b = budgeted[index] if index < len(budgeted) else 0
+        print(f"  {index + 1:>4} {a:>7} {b:>7}  {'█' * int(b / scale)}{'░' * max(0, int(a / scale) - int(b / scale))}")
+    saved = 1 - sum(budgeted) / sum(full) if sum(full) else 0
+    print(f"  total {sum(full):>6} {sum(budgeted):>7}  ({saved:.0%} fewer prompt tokens)")
+
+def main():
+    """Parse flags and compare both runs for every selected scenario"""
+    budget = 300
+    keep_turns = 4
+    reply_tokens = 60
+    chat_mode = "--chat-messages" in sys.argv
+    names = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--budget="):
+            budget = int(arg.split("=")[1])
+        elif arg.startswith("--keep-turns="):
+            keep_turns = int(arg.split("=")[1])
+        elif arg.startswith("--reply-tokens="):
+            reply_tokens = int(arg.split("=")[1])
+        elif not arg.startswith("--"):
+            names.append(arg)
+
+    with open("data/test.json", "r") as f:
+        scenarios = json.load(f).get("test_scenarios", [])
+    if names:
+        scenarios = [s for s in scenarios if s["name"] in names]
+
+    print(f"🧮 Prompt tokens per LLM call (local estimate), budget {budget} tokens, last {keep_turns} turns verbatim")
+    totals = [0, 0]
+    with tempfile.TemporaryDirectory() as sessions_dir:
+        for scenario in scenarios:
+            full = asyncio.run(run_scenario(scenario, sessions_dir, None, chat_mode, reply_tokens))
+            budgeted = asyncio.run(run_scenario(
+                scenario, sessions_dir, HistoryManager(token_budget=budget, keep_recent_turns=keep_turns), chat_mode, reply_tokens
+            ))
+            print_curve(scenario["name"], full, budgeted)
+            totals[0] += sum(full)
+            totals[1] += sum(budgeted)
+
+    if totals[0]:
+        print(f"\n📊 All scenarios: {totals[0]} -> {totals[1]} prompt tokens ({1 - totals[1] / totals[0]:.0%} fewer)")
+
+if __name__ == "__main__":
+    main()
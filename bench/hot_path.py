@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the non-LLM hot path, with JSON results and a compare command
+
+Times the code every turn runs besides the LLM call: response parsing and
+action validation (on realistic and adversarially large responses), the
+DataManager field update and data status, the StageManager context, the
+flat prompt build at 5/50/500 history turns, the widget field check, and a
+full app turn (prompt build, stub LLM, commands, stage update, flush and
+history save). Each benchmark is timed with timeit: the loop count is
+calibrated to about 0.2s, then --repeat rounds run every benchmark once in
+turn, so a burst of load on the machine hits one round of all benchmarks
+rather than every run of one. The best and median run are kept, per call in
+microseconds. Sessions live in a temporary directory, so the data/ files
+are never touched.
+
+A run writes bench/results/hot_path-<timestamp>.json (or --output=PATH).
+compare checks a new run against a baseline and exits 1 when a benchmark's
+best time got slower by more than --threshold percent (default 10).
+
+Usage:
+    python bench/hot_path.py
+    python bench/hot_path.py --filter=parse_response --repeat=9 --output=/tmp/base.json
+    python bench/hot_path.py compare /tmp/base.json bench/results/hot_path-20250101-120000.json
+    python bench/hot_path.py compare /tmp/base.json /tmp/new.json --threshold=5
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_parser
+from session import Session
+from data_manager import DataManager
+from stage_manager import StageManager
+from simple_agent import SimpleAgent
+from llm_backends import StubBackend
+from widget_handler import is_widget_field
+from app import execute_system_commands
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 10.0  # Percent slower that counts as a regression
+HISTORY_TURNS = (5, 50, 500)
+
+# A questionnaire turn in dual language mode: three updates and the next question
+REALISTIC_RESPONSE = """<english>Thanks, Poyraz! I've noted that you're 34, weigh 72 kg and are 178 cm tall. How would you describe your gender?</english>
+<turkish>Teşekkürler Poyraz! 34 yaşında, 72 kg ve 178 cm olduğunu not ettim. Cinsiyetini nasıl tanımlarsın?</turkish>
+
+<system_message>
+<update>"age":"34"</update>
+<update>"weight":"72"</update>
+<update>"height":"178"</update>
+<asking>gender</asking>
+</system_message>"""
+
+RECOMMENDATIONS_RESPONSE = """Here are your personalized wellness recommendations, based on everything you shared.
+
+<system_message>
+<recommendations>
+<action>drink_water</action>
+<action>movement_break</action>
+<action>Mindfulness Break</action>
+<action>sleep</action>
+</recommendations>
+</system_message>"""
+
+def adversarial_response():
+    """A ~300 KB response: long text, thousands of tags, unclosed tags and a stray close tag"""
+    text = "Let me think about that. " * 4000 + "<english>" * 200 + "</turkish>" * 200
+    commands = [f'<update>"field_{i}":"value {i}"</update>' for i in range(2000)]
+    commands += ['<update>"unclosed":"' + "x" * 5000, "<asking>" + "a" * 5000]
+    commands += [f"<action>not_an_action_{i}</action>" for i in range(200)]
+    return f"{text}\n\n<system_message>\n" + "\n".join(commands) + "\n</system_message></system_message>"
+
+def history(turns):
+    """Alternating user/assistant history entries, as SimpleAgent stores them"""
+    entries = []
+    for turn in range(turns):
+        entries.append({"role": "user", "message": f"My answer number {turn} is about average, I think."})
+        entries.append({"role": "assistant", "message": "Thanks! Could you tell me your stress level?",
+                        "asking": "stress_level", "updated": []})
+    return entries
+
+class Workspace:
+    """Sessions, managers and agents the benchmarks run against"""
+
+    def __init__(self, directory):
+        half = {"age": 34, "weight": 72.0, "height": 178.0, "gender": "Male", "has_children": "No",
+                "sleep_quality": "Sometimes"}
+        self.session = Session.create(profile={"name": "Poyraz", "user_type": "returning"}, data=half,
+                                      sessions_dir=directory)
+        self.data_manager = DataManager(session=self.session)
+        self.stage_manager = StageManager(data_manager=self.data_manager, session=self.session)
+        self.full_data = dict(self.data_manager.load_data(), stress_level="Low", mood_level="Good",
+                              activity_level="Active", sugar_intake="Low", water_intake="8 glasses",
+                              smoking_status="Never", supplement_usage="None")
+
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            self.agent = SimpleAgent(backend=StubBackend(), session=self.session)
+
+        # App turn: the user answers the age question of a fresh record
+        self.turn_session = Session.create(data={}, sessions_dir=directory)
+        self.turn_data_manager = DataManager(session=self.turn_session)
+        self.turn_stage_manager = StageManager(data_manager=self.turn_data_manager, session=self.turn_session)
+        self.turn_stage_manager.current_stage = "QUESTIONNAIRE"
+        self.turn_agent = self.agent.fork(self.turn_session)
+        self.turn_start = self.turn_data_manager.load_data()
+        self.turn_history = history(5) + [{"role": "assistant", "message": "Thanks! Could you tell me your age?",
+                                           "asking": "age", "updated": []}]
+
+    def app_turn(self):
+        """One questionnaire turn the way app.main runs it, without the terminal"""
+        self.turn_data_manager.save_data(self.turn_start)
+        self.turn_agent.conversation_history[:] = self.turn_history
+
+        stage_context = self.turn_stage_manager.get_current_stage_context()
+        profile_and_data_context = self.turn_stage_manager.get_profile_and_data_context()
+        response = self.turn_agent.ask("34", stage_context, profile_and_data_context)
+        execute_system_commands(response["system_commands"], self.turn_data_manager, False, show_widgets=False)
+        self.turn_stage_manager.update_stage(response)
+        self.turn_data_manager.flush()
+        self.turn_data_manager.save_conversation_turn(
+            user_input="34",
+            assistant_response=response["user_message"],
+            system_commands=response["system_commands"],
+            current_stage=self.turn_stage_manager.get_current_stage()
+        )
+
+def benchmarks(workspace):
+    """{name: zero-argument callable}, in report order"""
+    adversarial = adversarial_response()
+    long_action = "drink " * 2000
+    data_manager = workspace.data_manager
+    stage_manager = workspace.stage_manager
+
+    cases = {
+        "parse_response/realistic": lambda: text_parser.parse_response(REALISTIC_RESPONSE),
+        "parse_response/recommendations": lambda: text_parser.parse_response(RECOMMENDATIONS_RESPONSE),
+        "parse_response/adversarial_300kb": lambda: text_parser.parse_response(adversarial),
+        "validate_any_action/exact": lambda: text_parser.validate_any_action("drink_water"),
+        "validate_any_action/partial": lambda: text_parser.validate_any_action("Mindfulness Break"),
+        "validate_any_action/invalid": lambda: text_parser.validate_any_action("go_skydiving"),
+        "validate_any_action/long_12kb": lambda: text_parser.validate_any_action(long_action),
+        "DataManager.update_field/numeric": lambda: data_manager.update_field("weight", "72kg"),
+        "DataManager.update_field/text": lambda: data_manager.update_field("mood_level", "Good"),
+        "DataManager.get_data_status/partial": lambda: data_manager.get_data_status(),
+        "DataManager.get_data_status/complete": lambda: data_manager.get_data_status(workspace.full_data),
+        "StageManager.get_profile_and_data_context/questionnaire": lambda: stage_manager.get_profile_and_data_context(),
+        "StageManager.get_profile_and_data_context/recommendations": (
+            lambda: stage_manager.get_profile_and_data_context(workspace.full_data, "RECOMMENDATIONS")
+        ),
+    }
+
+    stage_context = stage_manager.get_current_stage_context("QUESTIONNAIRE")
+    profile_and_data_context = stage_manager.get_profile_and_data_context()
+    for turns in HISTORY_TURNS:
+        agent = workspace.agent.fork()
+        agent.conversation_history = history(turns)
+        cases[f"SimpleAgent._build_full_prompt/{turns}_turns"] = (
+            lambda agent=agent: agent._build_full_prompt("I'd say medium", stage_context, profile_and_data_context)
+        )
+
+    cases["widget_handler.is_widget_field/widget"] = lambda: is_widget_field("sleep_quality")
+    cases["widget_handler.is_widget_field/free_text"] = lambda: is_widget_field("age")
+    cases["app_turn/stub_llm"] = workspace.app_turn
+    return cases
+
+def measure(cases, repeat):
+    """{name: best and median microseconds per call} over `repeat` interleaved rounds of calibrated runs"""
+    timers = {name: timeit.Timer(func) for name, func in cases.items()}
+    loops = {name: timer.autorange()[0] for name, timer in timers.items()}  # Enough loops for about 0.2s
+    runs = {name: [] for name in cases}
+    for _ in range(repeat):
+        for name, timer in timers.items():
+            runs[name].append(timer.timeit(loops[name]) / loops[name] * 1_000_000)
+    return {
+        name: {"best_us": round(min(times), 3), "median_us": round(statistics.median(times), 3),
+               "loops": loops[name], "repeat": repeat}
+        for name, times in runs.items()
+    }
+
+def git_commit():
+    """Short hash of HEAD, None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(name_filter=None, repeat=DEFAULT_REPEAT, output=None):
+    """Run the benchmarks and write the results file, returns its path"""
+    with tempfile.TemporaryDirectory() as directory:
+        workspace = Workspace(directory)
+        cases = {name: func for name, func in benchmarks(workspace).items() if not name_filter or name_filter in name}
+
+        print(f"⏱️  Hot path benchmarks - {len(cases)} cases, best/median of {repeat} runs (µs per call)")
+        # validate_any_action prints for partial and invalid matches - timed, but not shown
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            results = measure(cases, repeat)
+        for name, result in results.items():
+            print(f"  {name:<58} {result['best_us']:>12.2f} {result['median_us']:>12.2f}")
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"hot_path-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+    return output
+
+def compare(baseline_file, new_file, threshold=DEFAULT_THRESHOLD):
+    """Print best-time changes between two result files, returns the number of regressions"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(new_file, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"📊 {baseline_file} ({baseline.get('commit')}) -> {new_file} ({new.get('commit')}), "
+          f"regression threshold {threshold:g}%")
+    print(f"  {'benchmark':<58} {'base µs':>12} {'new µs':>12} {'change':>8}")
+    regressions = 0
+    for name, result in new["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"  {name:<58} {'-':>12} {result['best_us']:>12.2f}      new")
+            continue
+        change = (result["best_us"] / base["best_us"] - 1) * 100 if base["best_us"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  ❌ regression"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  ✅ faster"
+        print(f"  {name:<58} {base['best_us']:>12.2f} {result['best_us']:>12.2f} {change:>+7.1f}%{flag}")
+    for name in baseline["results"]:
+        if name not in new["results"]:
+            print(f"  {name:<58} {baseline['results'][name]['best_us']:>12.2f} {'-':>12}  removed")
+
+    print(f"\n{'❌' if regressions else '✅'} {regressions} regression(s) above {threshold:g}%")
+    return regressions
+
+def main():
+    """Run the benchmarks, or compare two result files"""
+    name_filter = None
+    repeat = DEFAULT_REPEAT
+    output = None
+    threshold = DEFAULT_THRESHOLD
+    for arg in sys.argv[1:]:
+        if arg.startswith("--filter="):
+            name_filter = arg.split("=", 1)[1]
+        elif arg.startswith("--repeat="):
+            repeat = int(arg.split("=")[1])
+        elif arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        elif arg.startswith("--threshold="):
+            threshold = float(arg.split("=")[1])
+
+    files = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if files and files[0] == "compare":
+        if len(files) != 3:
+            print("Usage: python bench/hot_path.py compare BASELINE.json NEW.json [--threshold=10]")
+            sys.exit(2)
+        sys.exit(1 if compare(files[1], files[2], threshold) else 0)
+
+    run(name_filter, repeat, output)
+
+if __name__ == "__main__":
+    main()
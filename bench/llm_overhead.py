@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Per-turn LLM call overhead: asyncio.run per turn vs the shared LLM loop
+
+Starts a local OpenAI-compatible stub endpoint (no API key or network
+needed) and runs the same number of sequential turns through:
+
+    before  - a fresh event loop per turn (asyncio.run), as SimpleAgent used to
+    after   - SimpleAgent on the long-lived LLM loop with the pooled client
+
+The stub answers instantly by default, so the timings are pure client-side
+overhead (loop setup, TCP connects, request handling). The number of TCP
+connections the stub accepted shows whether keep-alive connections were reused.
+
+Usage:
+    python bench/llm_overhead.py
+    python bench/llm_overhead.py --turns=200 --latency=20
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STUB_REPLY = "Thanks! Could you tell me your age?\n\n<system_message>\n<asking>age</asking>\n</system_message>"
+PROMPT = "CONVERSATION STAGE: Questionnaire\n\nUser: hello\nAssistant: "
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """Minimal /v1/chat/completions endpoint with HTTP/1.1 keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubCompletionHandler.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_REPLY},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_endpoint(latency):
+    """Serve the stub endpoint on a free local port, returns its base URL"""
+    StubCompletionHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def run_before(base_url, turns):
+    """Old path: one client, a new event loop per turn"""
+    import openai
+    import semantic_kernel as sk
+    from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
+
+    kernel = sk.Kernel()
+    kernel.add_service(OpenAIChatCompletion(
+        ai_model_id="gpt-4.1",
+        service_id="openai",
+        async_client=openai.AsyncOpenAI(api_key="stub", base_url=base_url)
+    ))
+
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        asyncio.run(kernel.invoke_prompt(prompt=PROMPT))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def run_after(base_url, turns):
+    """New path: SimpleAgent on the shared LLM loop and pooled client"""
+    from simple_agent import SimpleAgent
+
+    agent = SimpleAgent()
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        agent._ask_with_semantic_kernel(PROMPT)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def report(label, timings, connections):
+    """Print one result line (the first turn is reported separately as warm-up)"""
+    steady = sorted(timings[1:]) or timings
+    p95 = steady[min(len(steady) - 1, int(len(steady) * 0.95))]
+    print(f"{label:<8} first {timings[0]:8.2f} ms | mean {statistics.mean(steady):7.2f} ms | "
+          f"p50 {statistics.median(steady):7.2f} ms | p95 {p95:7.2f} ms | connections {connections}")
+
+def main():
+    """Parse flags and run both variants against the same stub endpoint"""
+    turns = 100
+    latency = 0.0
+    for arg in sys.argv:
+        if arg.startswith("--turns="):
+            turns = int(arg.split("=")[1])
+        elif arg.startswith("--latency="):
+            latency = float(arg.split("=")[1]) / 1000
+
+    base_url = start_stub_endpoint(latency)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    print(f"⏱️  {turns} sequential turns against {base_url} (stub latency {latency * 1000:.0f} ms)")
+
+    timings = run_before(base_url, turns)
+    report("before", timings, StubCompletionHandler.connections)
+
+    StubCompletionHandler.connections = 0
+    timings = run_after(base_url, turns)
+    report("after", timings, StubCompletionHandler.connections)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrent simulated users against the conversation engine or the server
+
+Every simulated user runs one conversation, answering each question from
+the per-field inputs of a data/test.json scenario after a think time. The LLM
+is the stub responder with a sampled latency, so the test measures the
+app itself and how it holds up as concurrency ramps: each step of --users
+runs that many users at once and reports throughput, p50/p95/p99 turn
+latency (request to events, think time excluded), error rates, and the
+CPU time and RSS growth per session of the process.
+
+    engine   ConversationEngine objects driven in this process (default)
+    server   the HTTP API of server.py, served on a local port in this process
+             and called over keep-alive connections
+
+Delays (--think, --llm-latency) are given in seconds as a number or a
+distribution: "uniform:0.5-2", "normal:1,0.2", "lognormal:0.8,0.5" (median,
+sigma) or "exp:1" (mean). CPU and memory are those of the whole process, so
+in server mode they include the load generator - and every user holds both
+ends of its connection, so the open file limit (ulimit -n) must be well above
+twice the largest --users step. Sessions are created in a temporary
+directory, so the data/ files are never touched.
+
+Usage:
+    python bench/load_test.py
+    python bench/load_test.py --users=1,10,50,100 --think=exp:2 --llm-latency=lognormal:0.8,0.5
+    python bench/load_test.py --mode=server --scenario=all --output=/tmp/load.json
+    python bench/load_test.py --users=25 --local-extraction --widget-chain
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simple_agent import SimpleAgent
+from session import Session
+from conversation_engine import ConversationEngine
+from server import SessionRegistry, AssistantServer, MAX_BODY_SIZE
+from llm_backends import StubBackend
+from metrics import percentile
+
+DEFAULT_USERS = "1,5,10,25,50"
+DEFAULT_THINK = "uniform:0.5-1.5"
+DEFAULT_LATENCY = "lognormal:0.5,0.4"
+MAX_TURNS = 60  # A conversation still open after this many turns counts as incomplete
+RSS_SAMPLE_INTERVAL = 0.05  # Seconds between memory samples
+USAGE = ("Usage: python bench/load_test.py [--mode=engine|server] [--users=1,5,10] [--scenario=NAME|all] "
+         "[--think=SPEC] [--llm-latency=SPEC] [--seed=N] [--output=FILE] [--local-extraction] [--widget-chain] "
+         "[--offline-recommendations]")
+
+# Engine options enabled by flags of the same name
+ENGINE_FLAGS = {
+    "--local-extraction": "local_extraction",
+    "--widget-chain": "widget_chain",
+    "--offline-recommendations": "offline_recommendations"
+}
+
+class Distribution:
+    """Random delay in seconds parsed from a spec ("1.5", "uniform:a-b", "normal:m,s", "lognormal:median,sigma", "exp:mean")"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", kind
+        values = [float(value) for value in args.replace("-", ",").split(",")]
+        samplers = {
+            "fixed": lambda: values[0],
+            "uniform": lambda: random.uniform(values[0], values[1]),
+            "normal": lambda: random.gauss(values[0], values[1]),
+            "lognormal": lambda: values[0] * random.lognormvariate(0, values[1]),
+            "exp": lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+        }
+        if kind not in samplers:
+            raise ValueError(f"Unknown distribution: {spec}")
+        self._sample = samplers[kind]
+
+    def sample(self):
+        """One delay, never negative"""
+        return max(0.0, self._sample())
+
+    def __str__(self):
+        return self.spec
+
+class SampledLatencyStub(StubBackend):
+    """Stub responder whose latency is drawn from a Distribution on every call"""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.distribution = latency
+
+    async def _simulate_latency(self):
+        delay = self.distribution.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class EngineClient:
+    """One conversation on a ConversationEngine in this process"""
+
+    def __init__(self, agent, sessions_dir, options):
+        self.agent = agent
+        self.sessions_dir = sessions_dir
+        self.options = options
+        self.engine = None
+
+    async def start(self, scenario):
+        session = Session.create(data=scenario.get("existing_data"), sessions_dir=self.sessions_dir)
+        self.engine = ConversationEngine(self.agent.fork(session), session, **self.options)
+        return await self.engine.start()
+
+    async def submit(self, text):
+        return await self.engine.submit(text)
+
+    async def close(self):
+        if self.engine is not None:
+            self.engine.close()
+
+class HttpClient:
+    """One conversation over the server's HTTP API, on one keep-alive connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.session_id = None
+        self.reader = None
+        self.writer = None
+
+    async def start(self, scenario):
+        payload = await self._request("POST", "/sessions", {"data": scenario.get("existing_data")})
+        self.session_id = payload["session_id"]
+        return payload["events"]
+
+    async def submit(self, text):
+        return (await self._request("POST", f"/sessions/{self.session_id}/messages", {"text": text}))["events"]
+
+    async def _request(self, method, path, body):
+        """Send one request and read the JSON response (raises on a non-2xx status)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=MAX_BODY_SIZE)
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.writer.write((
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n"
+        ).encode("latin-1") + data)
+        await self.writer.drain()
+
+        status_line = (await self.reader.readline()).split()
+        if len(status_line) < 2:
+            raise ConnectionError("Connection closed by the server")
+        status = int(status_line[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        payload = json.loads(await self.reader.readexactly(length))
+        if status >= 300:
+            raise RuntimeError(f"HTTP {status}: {payload.get('error')}")
+        return payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class StepStats:
+    """Counters and turn latencies of one concurrency step"""
+
+    def __init__(self):
+        self.latencies = []  # Milliseconds per turn
+        self.turns = 0
+        self.error_turns = 0  # Turns that raised or returned an error event
+        self.completed = 0
+        self.incomplete = 0  # Conversations that failed or hit MAX_TURNS
+        self.errors = {}  # Message -> count, to show what went wrong
+
+    def error(self, message):
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+async def simulate_user(client, scenario, think, stats, start_delay):
+    """Run one conversation: answer every question from the scenario inputs after a think time"""
+    await asyncio.sleep(start_delay)
+    inputs = {field: str(value) for field, value in scenario.get("inputs", {}).items()}
+    used = set()
+    try:
+        events = await timed_turn(stats, client.start(scenario))
+        for _ in range(MAX_TURNS):
+            if any(event["type"] == "complete" for event in events):
+                stats.completed += 1
+                return
+            waiting = next((event for event in reversed(events) if event["type"] in ("widget", "input_needed")), None)
+            field = waiting.get("field") if waiting else None
+            if field in inputs and field not in used:
+                text = inputs[field]
+                used.add(field)
+            else:
+                text = "1" if waiting and waiting["type"] == "widget" else "yes"  # First option or a plain answer
+
+            await asyncio.sleep(think.sample())
+            events = await timed_turn(stats, client.submit(text))
+        stats.incomplete += 1
+        stats.error(f"not complete after {MAX_TURNS} turns")
+    except Exception as e:
+        stats.incomplete += 1
+        stats.error(f"{type(e).__name__}: {e}")
+    finally:
+        await client.close()
+
+async def timed_turn(stats, request):
+    """Await one turn, recording its latency and any error event"""
+    start = time.perf_counter()
+    try:
+        events = await request
+    except Exception:
+        stats.turns += 1
+        stats.error_turns += 1
+        raise
+    stats.latencies.append((time.perf_counter() - start) * 1000)
+    stats.turns += 1
+    errors = [event for event in events if event["type"] == "error"]
+    if errors:
+        stats.error_turns += 1
+        stats.error(errors[0].get("message", "error event"))
+    return events
+
+def rss_bytes():
+    """Resident set size of this process, None where /proc is not available"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+async def sample_peak_rss(peak):
+    """Keep peak[0] at the highest RSS seen until cancelled"""
+    while True:
+        rss = rss_bytes()
+        if rss is not None and rss > peak[0]:
+            peak[0] = rss
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+async def run_step(users, make_client, scenarios, think):
+    """Run `users` concurrent conversations, returns the step report"""
+    stats = StepStats()
+    clients = [make_client() for _ in range(users)]  # Kept until the end, so sessions count in the RSS
+    rss_before = rss_bytes()
+    peak = [rss_before or 0]
+    sampler = asyncio.create_task(sample_peak_rss(peak))
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+
+    # Users arrive spread over one think time instead of all in the same instant
+    await asyncio.gather(*(
+        simulate_user(client, scenarios[index % len(scenarios)], think, stats, random.uniform(0, think.sample()))
+        for index, client in enumerate(clients)
+    ))
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    sampler.cancel()
+    latencies = stats.latencies or [0.0]
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "sessions": stats.completed,
+        "incomplete": stats.incomplete,
+        "turns": stats.turns,
+        "turns_per_s": round(stats.turns / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "error_rate": round(stats.error_turns / stats.turns, 4) if stats.turns else 0.0,
+        "cpu_ms_per_session": round(cpu * 1000 / users, 1),
+        "rss_mb_per_session": round((peak[0] - rss_before) / users / 2 ** 20, 3) if rss_before else None,
+        "errors": stats.errors
+    }
+
+def print_step(report):
+    """One table row"""
+    rss = f"{report['rss_mb_per_session']:.2f}" if report["rss_mb_per_session"] is not None else "-"
+    print(f"  {report['users']:>5} {report['sessions']:>8} {report['incomplete']:>10} {report['turns']:>6} "
+          f"{report['turns_per_s']:>8.1f} {report['p50_ms']:>8.1f} {report['p95_ms']:>8.1f} {report['p99_ms']:>8.1f} "
+          f"{report['error_rate']:>7.1%} {report['cpu_ms_per_session']:>11.1f} {rss:>8}")
+    for message, count in report["errors"].items():
+        print(f"        ⚠️  {count}x {message}")
+
+async def run(mode, steps, scenarios, think, latency, options):
+    """Run every concurrency step against one agent (and server), returns the step reports"""
+    agent = SimpleAgent(backend=SampledLatencyStub(latency))
+    reports = []
+    with tempfile.TemporaryDirectory() as sessions_dir:
+        listener = None
+        sweeper = None
+        if mode == "server":
+            registry = SessionRegistry(agent, sessions_dir=sessions_dir, **options)
+            listener = await asyncio.start_server(AssistantServer(registry).handle_connection, "127.0.0.1", 0,
+                                                  limit=MAX_BODY_SIZE)
+            sweeper = asyncio.create_task(registry.sweep_forever())  # As serve() does
+            port = listener.sockets[0].getsockname()[1]
+            make_client = lambda: HttpClient("127.0.0.1", port)
+        elif mode == "engine":
+            make_client = lambda: EngineClient(agent, sessions_dir, options)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+
+        print(f"🚦 Load test - {mode}, think {think}s, stub LLM latency {latency}s, "
+              f"scenarios: {', '.join(sorted({s['name'] for s in scenarios}))}")
+        print(f"  {'users':>5} {'sessions':>8} {'incomplete':>10} {'turns':>6} {'turns/s':>8} {'p50 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'cpu ms/sess':>11} {'MB/sess':>8}")
+        try:
+            for users in steps:
+                report = await run_step(users, make_client, scenarios, think)
+                reports.append(report)
+                print_step(report)
+        finally:
+            if listener is not None:
+                sweeper.cancel()
+                listener.close()
+                await listener.wait_closed()
+    print("  (cpu ms/sess and MB/sess are the CPU time and RSS growth of the process per session)")
+    return reports
+
+def usage_error(message):
+    """Print what is wrong with the command line and the usage, then exit"""
+    print(f"❌ {message}")
+    print(USAGE)
+    sys.exit(2)
+
+def main():
+    """Parse flags and ramp through the concurrency steps"""
+    if "--help" in sys.argv[1:] or "-h" in sys.argv[1:]:
+        print(__doc__.strip())
+        return
+
+    mode = "engine"
+    users = DEFAULT_USERS
+    scenario_name = None
+    think = DEFAULT_THINK
+    latency = DEFAULT_LATENCY
+    output = None
+    seed = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--mode="):
+            mode = arg.split("=")[1]
+        elif arg.startswith("--users="):
+            users = arg.split("=")[1]
+        elif arg.startswith("--scenario="):
+            scenario_name = arg.split("=", 1)[1]
+        elif arg.startswith("--think="):
+            think = arg.split("=", 1)[1]
+        elif arg.startswith("--llm-latency="):
+            latency = arg.split("=", 1)[1]
+        elif arg.startswith("--seed="):
+            seed = arg.split("=")[1]
+        elif arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        elif arg not in ENGINE_FLAGS:
+            usage_error(f"Unknown argument: {arg}")
+    options = {option: True for flag, option in ENGINE_FLAGS.items() if flag in sys.argv}
+
+    if mode not in ("engine", "server"):
+        usage_error(f"Unknown mode: {mode}")
+    try:
+        steps = [int(step) for step in users.split(",")]
+        think_distribution, latency_distribution = Distribution(think), Distribution(latency)
+        if seed is not None:
+            random.seed(int(seed))
+    except ValueError as e:
+        usage_error(f"Invalid value: {e}")
+
+    with open("data/test.json", "r") as f:
+        scenarios = json.load(f).get("test_scenarios", [])
+    if scenario_name != "all":
+        scenarios = [s for s in scenarios if s["name"] == scenario_name] if scenario_name else scenarios[:1]
+    if not scenarios:
+        print(f"❌ Scenario not found: {scenario_name}")
+        sys.exit(1)
+
+    reports = asyncio.run(run(mode, steps, scenarios, think_distribution, latency_distribution, options))
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "think": think, "llm_latency": latency, "options": options,
+                       "scenarios": [s["name"] for s in scenarios], "steps": reports}, f, indent=2)
+        print(f"💾 Results written to {output}")
+
+if __name__ == "__main__":
+    main()
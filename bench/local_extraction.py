@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+LLM calls per scenario with and without the local fast paths
+
+Runs every scenario in data/test.json through ConversationEngine with the
+local stub LLM: as before, with local_extraction (age, weight and height
+answers recorded without an LLM call), with widget_chain (consecutive
+widget fields asked without LLM calls) and with both, and counts the LLM
+calls of each run. Sessions are created in a temporary directory, so the
+data/ files are never touched.
+
+Usage:
+    python bench/local_extraction.py
+    python bench/local_extraction.py "Type Conversion Edge Cases"
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simple_agent import SimpleAgent
+from session import Session
+from conversation_engine import ConversationEngine
+from llm_backends import StubBackend
+from numeric_extractor import NUMERIC_FIELDS
+
+MAX_SUBMITS = 60
+
+# Column name -> engine options
+MODES = {
+    "llm": {},
+    "extract": {"local_extraction": True},
+    "chain": {"widget_chain": True},
+    "both": {"local_extraction": True, "widget_chain": True}
+}
+
+async def run_scenario(scenario, sessions_dir, options):
+    """Drive one scenario to completion, returns (LLM calls, final data)"""
+    backend = StubBackend()
+    agent = SimpleAgent(backend=backend)
+    session = Session.create(data=scenario.get("existing_data"), sessions_dir=sessions_dir)
+    engine = ConversationEngine(agent.fork(session), session, **options)
+    inputs = scenario.get("inputs", {})
+
+    events = await engine.start()
+    for _ in range(MAX_SUBMITS):
+        if engine.is_complete():
+            break
+        if engine.pending_widget:
+            text = inputs.get(engine.pending_widget, "1")
+        else:
+            asking = next((e["field"] for e in reversed(events) if e["type"] == "input_needed"), None)
+            text = inputs.get(asking, "ok")
+        events = await engine.submit(text)
+
+    return backend.calls, engine.data_manager.load_data()
+
+def main():
+    """Compare the modes for every selected scenario"""
+    names = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+
+    with open("data/test.json", "r") as f:
+        scenarios = json.load(f).get("test_scenarios", [])
+    if names:
+        scenarios = [s for s in scenarios if s["name"] in names]
+
+    print("🔢 LLM calls per scenario (stub LLM): LLM only, local extraction, widget chain, both")
+    print(f"  {'scenario':<32} " + " ".join(f"{mode:>7}" for mode in MODES) + "  numeric values (both)")
+    totals = dict.fromkeys(MODES, 0)
+    with tempfile.TemporaryDirectory() as sessions_dir:
+        for scenario in scenarios:
+            calls = {}
+            for mode, options in MODES.items():
+                calls[mode], data = asyncio.run(run_scenario(scenario, sessions_dir, options))
+                totals[mode] += calls[mode]
+            values = ", ".join(f"{field}={data[field]}" for field in NUMERIC_FIELDS)
+            print(f"  {scenario['name']:<32} " + " ".join(f"{calls[mode]:>7}" for mode in MODES) + f"  {values}")
+
+    if totals["llm"]:
+        print(f"\n📊 All scenarios: {totals['llm']} LLM calls, " + ", ".join(
+            f"{mode} {totals[mode]} ({1 - totals[mode] / totals['llm']:.0%} fewer)" for mode in list(MODES)[1:]
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Async conversation engine - the app.main turn loop without the terminal
+
+Drives GREETING -> QUESTIONNAIRE -> RECOMMENDATIONS for one session. Input
+goes in through submit(), and each call returns the events produced until
+the conversation needs the user again (free text or a widget selection).
+
+Passing an emit callback streams the turn instead: events are emitted as
+they happen, including "assistant_delta" text chunks, and updates and
+widgets are handled as soon as their tags arrive.
+
+A widget_answer callback (field, question, options) -> answer answers
+widgets in-process (e.g. the test harness): the answer is applied right
+away instead of waiting for the next submit(). Returning None leaves the
+widget pending for the caller.
+"""
+
+from stage_manager import StageManager
+from data_manager import DataManager
+from session import Session
+from widget_handler import get_widget_prompt, resolve_widget_choice
+from widget_handler import is_widget_field, next_chained_widget, widget_chain_response
+from app import execute_system_commands, apply_update, handle_final_recommendations
+from rule_engine import offline_response
+from numeric_extractor import fast_path_response
+from prefetch import WidgetPrefetch
+
+class ConversationEngine:
+    """One conversation session driven by awaited LLM calls"""
+
+    def __init__(self, agent, session=None, debug_mode=False, storage=None, offline_recommendations=False, widget_answer=None,
+                 local_extraction=False, widget_chain=False, prefetcher=None, routes_file=None):
+        self.agent = agent
+        self.session = session or Session.default()
+        self.data_manager = DataManager(session=self.session, storage=storage)
+        self.stage_manager = StageManager(debug_mode=debug_mode, data_manager=self.data_manager, session=self.session,
+                                          routes_file=routes_file)
+        if agent.history_manager is not None:
+            # History compaction reads this session's data record
+            agent.history_manager = agent.history_manager.bind(self.data_manager)
+        self.debug_mode = debug_mode
+        self.offline_recommendations = offline_recommendations  # Rule engine answers the recommendation turn
+        self.local_extraction = local_extraction  # Numeric answers are recorded without an LLM call
+        self.widget_chain = widget_chain  # Consecutive widget fields are asked without LLM calls
+        # Speculative next-turn calls while a widget waits for the client
+        self.prefetch = WidgetPrefetch(prefetcher, agent, self.stage_manager, self.data_manager, widget_chain,
+                                       offline_recommendations) if prefetcher else None
+        self.widget_answer = widget_answer
+        self.system_messages_history = []
+        self.pending_widget = None  # Field waiting for a widget selection
+        self._pending_turn = None  # Turn finished once the widget is answered
+        self.last_asking = self.session.last_asking
+        self._emit = None
+
+        # A session reloaded from disk may be waiting on a widget
+        if self.session.pending_widget:
+            self.pending_widget = self.session.pending_widget["field"]
+            self._pending_turn = tuple(self.session.pending_widget["turn"])
+
+    def is_complete(self):
+        """Check if the conversation has finished"""
+        return self.stage_manager.is_complete()
+
+    def close(self):
+        """Write out the session's pending data and log lines"""
+        self.data_manager.close()
+
+    async def start(self, emit=None):
+        """Run the opening turn(s) and return the resulting events"""
+        self._emit = emit
+        return await self._advance("")
+
+    async def submit(self, text, emit=None):
+        """Feed user input (free text or widget answer) and return the resulting events"""
+        self._emit = emit
+        if self.is_complete():
+            return self._collect([{"type": "error", "message": "Conversation already complete"}])
+
+        if self.pending_widget:
+            return await self._answer_widget(text)
+
+        if not text or not text.strip():
+            return self._collect([{"type": "error", "message": "Empty message"}, self._input_needed_event()])
+
+        return await self._advance(text.strip())
+
+    def _collect(self, new_events, events=None):
+        """Add events to the result list and push them to the emit callback"""
+        events = events if events is not None else []
+        for event in new_events:
+            events.append(event)
+            if self._emit:
+                self._emit(event)
+        return events
+
+    async def _answer_widget(self, text):
+        """Apply a widget selection, finish the deferred turn and continue"""
+        field = self.pending_widget
+        selection = resolve_widget_choice(field, text)
+
+        if selection is None:
+            return self._collect([{"type": "error", "message": f"Invalid option for {field}"},
+                                  self._widget_event(field) or self._input_needed_event()])
+
+        english_value, turkish_display = selection
+        result = self.data_manager.update_field(field, english_value)
+        if self.prefetch is not None:
+            self.prefetch.chosen(field, english_value)
+
+        user_input, response, command_results = self._pending_turn
+        command_results.append(f"WIDGET_UPDATE: {result}")
+        command_results.append(f"WIDGET_COMPLETED: {turkish_display}")
+        self.pending_widget = None
+        self._pending_turn = None
+
+        events = self._collect(self._finish_turn(user_input, response, command_results))
+
+        # Widget selection becomes the next user input, as in app.main
+        self._collect([{"type": "user_message", "text": turkish_display}], events)
+        events.extend(await self._advance(turkish_display, after_widget=True))
+        return events
+
+    async def _callback_widget_answer(self, widget_event):
+        """Answer a widget through the widget_answer callback, if there is one"""
+        if self.widget_answer is None:
+            return []
+        answer = self.widget_answer(widget_event["field"], widget_event["question"], widget_event["options"])
+        if answer is None:
+            return []
+        return await self._answer_widget(str(answer))
+
+    async def _advance(self, user_input, after_widget=False):
+        """Run LLM turns until user input is needed or the conversation ends"""
+        events = []
+
+        while not self.stage_manager.is_complete():
+            if self.stage_manager.needs_user_input() and not user_input:
+                return self._collect([self._input_needed_event()], events)
+            elif not self.stage_manager.needs_user_input():
+                # Automatic transition (recommendations) needs no user input
+                user_input = ""
+
+            stage_context = self.stage_manager.get_current_stage_context()
+            profile_and_data_context = self.stage_manager.get_profile_and_data_context()
+
+            route = self.stage_manager.get_route(self.last_asking)
+            local_raw, local_source = self._local_response(user_input, after_widget)
+            if self.offline_recommendations and self.stage_manager.get_current_stage() == "RECOMMENDATIONS":
+                raw_response = offline_response(self.data_manager.eligible_actions(), self.agent.language_mode)
+                response, streamed_results, early_widget = self.agent.respond_locally(user_input, raw_response), [], None
+                remaining_commands = response["system_commands"]
+            elif local_raw is not None:
+                response = self.agent.respond_locally(user_input, local_raw, source=local_source)
+                streamed_results, early_widget = [], None
+                remaining_commands = response["system_commands"]
+            elif self._emit:
+                response, streamed_results, early_widget = await self._ask_streaming(
+                    user_input, stage_context, profile_and_data_context, route
+                )
+                remaining_commands = dict(response["system_commands"], updates=[])
+            else:
+                response, streamed_results, early_widget = (
+                    await self.agent.ask_async(user_input, stage_context, profile_and_data_context, route=route), [], None
+                )
+                remaining_commands = response["system_commands"]
+            self._collect([{"type": "assistant_message", "text": response["user_message"]}], events)
+
+            command_results = streamed_results + execute_system_commands(
+                remaining_commands, self.data_manager, self.debug_mode, show_widgets=False
+            )
+            self.last_asking = response["system_commands"]["asking"]
+
+            pending = [r for r in command_results if r.startswith("WIDGET_PENDING: ")]
+            widget_event = None
+            if pending:
+                field = pending[0].split("WIDGET_PENDING: ")[1]
+                command_results.remove(pending[0])
+                widget_event = self._widget_event(field)
+            if widget_event is not None:
+                # Stage update and history wait until the widget is answered
+                self.pending_widget = field
+                self._pending_turn = (user_input, response, command_results)
+                self.data_manager.flush()
+                # Persisted so the widget survives the engine being evicted and reloaded
+                self.session.last_asking = self.last_asking
+                self.session.pending_widget = {"field": field, "turn": list(self._pending_turn)}
+                self.session.save_state()
+                if self.prefetch is not None:
+                    self.prefetch.opened(field)
+                if field == early_widget:
+                    events.append(widget_event)  # Already emitted while streaming
+                else:
+                    self._collect([widget_event], events)
+                return events + await self._callback_widget_answer(events[-1])
+
+            self._collect(self._finish_turn(user_input, response, command_results), events)
+            user_input = ""
+            after_widget = False
+
+        if self.stage_manager.get_current_stage() == "RECOMMENDATIONS":
+            handle_final_recommendations(self.agent, self.data_manager, self.system_messages_history, self.debug_mode)
+        # A finished session writes nothing more
+        self.close()
+        return self._collect([{"type": "complete", "data": self.data_manager.load_data()}], events)
+
+    def _local_response(self, user_input, after_widget=False):
+        """(raw response, source) for a turn answered without the LLM, (None, None) when the LLM is needed
+        
+        Widget chain mode asks the next widget field right after a widget
+        answer; local extraction records numeric answers.
+        """
+        if not user_input or self.stage_manager.get_current_stage() != "QUESTIONNAIRE":
+            return None, None
+        data = self.data_manager.load_data()
+        chained_field = next_chained_widget(data) if self.widget_chain and after_widget else None
+        if chained_field:
+            return widget_chain_response(chained_field, self.agent.language_mode), "widget_chain"
+        if self.local_extraction:
+            return fast_path_response(self.last_asking, user_input, data, self.agent.language_mode), "local_extractor"
+        return None, None
+
+    async def _ask_streaming(self, user_input, stage_context, profile_and_data_context, route=None):
+        """Stream one LLM turn, acting on updates and widgets as soon as their tags close"""
+        streamed_results = []
+        early_widget = []
+
+        def on_text(text):
+            self._emit({"type": "assistant_delta", "text": text})
+
+        def on_event(event):
+            if event["type"] == "update":
+                streamed_results.append(apply_update(event, self.data_manager, self.debug_mode))
+            elif event["type"] == "asking" and is_widget_field(event["field"]):
+                # Let the client open the widget while the model finishes its trailing text
+                widget_event = self._widget_event(event["field"])
+                if widget_event is not None:
+                    early_widget.append(event["field"])
+                    self._emit(widget_event)
+
+        response = await self.agent.ask_stream_async(
+            user_input, stage_context, profile_and_data_context, on_text=on_text, on_event=on_event, route=route
+        )
+        return response, streamed_results, early_widget[0] if early_widget else None
+
+    def _finish_turn(self, user_input, response, command_results):
+        """Record the turn, update the stage and return follow-up events"""
+        self.system_messages_history.append({
+            "user_input": user_input,
+            "system_commands": response["system_commands"],
+            "command_results": command_results
+        })
+
+        # Saved with the stage by update_stage
+        self.session.last_asking = self.last_asking
+        self.session.pending_widget = None
+        self.stage_manager.update_stage(response)
+        self.data_manager.flush()
+
+        self.data_manager.save_conversation_turn(
+            user_input=user_input,
+            assistant_response=response["user_message"],
+            system_commands=response["system_commands"],
+            current_stage=self.stage_manager.get_current_stage()
+        )
+
+        events = []
+        if response["system_commands"]["recommendations"]:
+            events.append({"type": "recommendations", "actions": response["system_commands"]["recommendations"]})
+        return events
+
+    def _input_needed_event(self):
+        """Event asking the client for free text input"""
+        return {
+            "type": "input_needed",
+            "stage": self.stage_manager.get_current_stage(),
+            "field": self.last_asking
+        }
+
+    def _widget_event(self, field):
+        """Event describing the widget the client should show
+        
+        None when the field has no options configured - like the CLI, the
+        engine then asks for it as free text (an input_needed event).
+        """
+        prompt = get_widget_prompt(field)
+        if prompt is None:
+            return None
+        question_text, options = prompt
+        return {
+            "type": "widget",
+            "field": field,
+            "question": question_text,
+            "options": options
+        }
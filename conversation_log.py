@@ -0,0 +1,182 @@
+"""
+Append-only JSONL conversation log
+
+Each conversation turn is one JSON line appended to the log, so saving a turn
+costs the same at turn 1 and turn 1000 (conversation_history.json was read
+and rewritten in full on every turn). Every app/server session starts with a
+session header line, so earlier sessions are kept instead of overwritten:
+
+    {"type": "session", "session_id": "...", "session_start": "..."}
+    {"type": "turn", "turn_number": 1, "timestamp": "...", "user_input": "...", ...}
+
+fsync policy:
+    none      leave flushing to the OS (fastest, a crash may lose recent turns)
+    interval  fsync at most once per FSYNC_INTERVAL seconds (default)
+    always    fsync after every line
+
+The file is opened for each append and closed again, so a session waiting
+for its user holds no file descriptor; close() syncs lines the interval
+policy has not synced yet.
+
+When the log grows past max_bytes it is rotated (log -> log.1 -> log.2 ...)
+and the new file repeats the current session header with "continued": true.
+
+read_history() rebuilds the {"session_start", "turns"} shape of the legacy
+conversation_history.json for the latest session.
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+
+FSYNC_POLICIES = ("none", "interval", "always")
+FSYNC_INTERVAL = 1.0
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+class ConversationLog:
+    """Writer for one append-only turn log file"""
+
+    def __init__(self, path, fsync="interval", max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, legacy_file=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync} (use {', '.join(FSYNC_POLICIES)})")
+
+        self.path = path
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.legacy_file = legacy_file  # conversation_history.json imported when a resumed session has no log yet
+        self.header = None
+        self.turn_count = None
+        self._unsynced = False  # Lines written since the last fsync
+        self._last_sync = 0.0
+
+    def start_session(self, session_id=None):
+        """Begin a new session - turns are numbered from 1 again"""
+        self.header = {
+            "type": "session",
+            "session_id": session_id,
+            "session_start": datetime.now().isoformat()
+        }
+        self.turn_count = 0
+        self._write(self.header)
+
+    def append_turn(self, turn):
+        """Append one turn, numbering it within the current session"""
+        if self.turn_count is None:
+            self._resume()
+
+        self.turn_count += 1
+        record = {"type": "turn", "turn_number": self.turn_count}
+        record.update({key: value for key, value in turn.items() if key != "turn_number"})
+        self._write(record)
+        return record
+
+    def close(self):
+        """Sync the lines written since the last fsync (the file itself is never left open)"""
+        if self._unsynced and self.fsync != "none" and os.path.exists(self.path):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                os.fsync(f.fileno())
+            self._last_sync = time.monotonic()
+        self._unsynced = False
+
+    def _resume(self):
+        """Continue the latest session found on disk (or the legacy JSON history)"""
+        if not os.path.exists(self.path) and self.legacy_file and os.path.exists(self.legacy_file):
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            self.header = {"type": "session", "session_id": None, "session_start": legacy.get("session_start")}
+            self._write(self.header)
+            for turn in legacy.get("turns", []):
+                self._write({"type": "turn", **turn})
+            self.turn_count = len(legacy.get("turns", []))
+            return
+
+        history = read_history(self.path)
+        if history["session_start"] is None:
+            self.start_session()
+            return
+        self.header = {"type": "session", "session_id": history.get("session_id"), "session_start": history["session_start"]}
+        # Number on from the last turn (early turns may have been rotated away)
+        self.turn_count = history["turns"][-1].get("turn_number", len(history["turns"])) if history["turns"] else 0
+
+    def _write(self, record):
+        """Append one line, rotating first if the file is too large"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        size = os.path.getsize(self.path) if self.max_bytes and os.path.exists(self.path) else 0
+        if size and size + len(line) > self.max_bytes:
+            self._rotate()
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()  # Readers in other processes see every complete line
+
+            now = time.monotonic()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_sync >= FSYNC_INTERVAL):
+                os.fsync(f.fileno())
+                self._last_sync = now
+                self._unsynced = False
+            else:
+                self._unsynced = True
+
+    def _rotate(self):
+        """Shift log -> log.1 -> log.2 ... and continue the session in a fresh file"""
+        self.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+        if self.header is not None:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({**self.header, "continued": True}, ensure_ascii=False) + "\n")
+
+def _read_records(path):
+    """Parse the JSON lines of a log file, skipping a torn last line"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def read_history(path, legacy_file=None):
+    """Return the latest session as {"session_id", "session_start", "turns"}
+
+    Follows rotated files back while the session header says "continued".
+    Falls back to the legacy conversation_history.json when there is no log.
+    """
+    if not os.path.exists(path):
+        if legacy_file and os.path.exists(legacy_file):
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            return {"session_id": None, "session_start": legacy.get("session_start"), "turns": legacy.get("turns", [])}
+        return {"session_id": None, "session_start": None, "turns": []}
+
+    turns = []
+    current, index = path, 0
+    while True:
+        records = _read_records(current)
+        start = max((i for i, record in enumerate(records) if record.get("type") == "session"), default=None)
+        session_turns = [_turn(record) for record in records[(start or 0):] if record.get("type") == "turn"]
+        turns = session_turns + turns
+
+        if start is None:
+            return {"session_id": None, "session_start": None, "turns": turns}
+
+        header = records[start]
+        index += 1
+        if not header.get("continued") or not os.path.exists(f"{path}.{index}"):
+            return {"session_id": header.get("session_id"), "session_start": header.get("session_start"), "turns": turns}
+        current = f"{path}.{index}"
+
+def _turn(record):
+    """Strip the log record type to get the legacy turn shape"""
+    return {key: value for key, value in record.items() if key != "type"}
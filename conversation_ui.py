@@ -8,6 +8,42 @@ def print_agent_message(message):
         indented_lines.append(f"    {line}")
     print('\n'.join(indented_lines))
 
+class AgentMessageStream:
+    """Print an agent message incrementally with the same layout as print_agent_message"""
+    
+    def __init__(self, on_first_text=None):
+        self.on_first_text = on_first_text  # e.g. stop the thinking animation
+        self.started = False
+        self.at_line_start = True
+    
+    def write(self, text):
+        """Print a chunk of the message, indenting every new line"""
+        import sys
+        
+        if not self.started:
+            if self.on_first_text:
+                self.on_first_text()
+            print()
+            print("🤖 Assistant:")
+            self.started = True
+        
+        for char in text:
+            if self.at_line_start:
+                sys.stdout.write("    ")
+                self.at_line_start = False
+            sys.stdout.write(char)
+            if char == "\n":
+                self.at_line_start = True
+        sys.stdout.flush()
+    
+    def finish(self, message=""):
+        """End the message - prints the full message if nothing was streamed"""
+        if not self.started:
+            print_agent_message(message)
+            return
+        if not self.at_line_start:
+            print()
+
 def print_user_message(message):
     """Print user message aligned to the right"""
     terminal_width = 80
@@ -1,21 +1,120 @@
+import os
 import json
+from conversation_log import ConversationLog, read_history
+from rule_engine import get_rule_engine
+from numeric_extractor import NUMERIC_FIELDS, to_number
+
+def build_recommendation_record(data, actions_list, user_message):
+    """Recommendation record as saved to recommendations.json"""
+    from datetime import datetime
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "user_data": data,
+        "recommendation_message": user_message,
+        "top_4_actions": actions_list
+    }
 
 class DataManager:
     """Simple data manager for basic JSON operations"""
     
-    def __init__(self, data_file="data/data.json"):
+    def __init__(self, data_file="data/data.json", history_file="data/conversation_history.json",
+                 recommendations_file="data/recommendations.json", session=None, write_back=True,
+                 log_file="data/conversation_log.jsonl", log_fsync="interval", storage=None):
+        # A session supplies its own files so conversations never share state
+        if session is not None:
+            data_file = session.data_file
+            history_file = session.history_file
+            recommendations_file = session.recommendations_file
+            log_file = session.log_file
+        
+        self.session = session
+        self.session_id = session.session_id if session is not None else "default"
         self.data_file = data_file
-        self.session_initialized = False  # Track if this session has been initialized
+        self.history_file = history_file
+        self.recommendations_file = recommendations_file
+        self.log_file = log_file
+        # history_file is the legacy JSON history, read only when no log exists yet
+        self.history_log = ConversationLog(log_file, fsync=log_fsync, legacy_file=history_file)
+        # Track if this session has been initialized (resumed sessions append to their history)
+        self.session_initialized = session.resumed if session is not None else False
+        
+        # Write-back cache: the record is read once, changes are written by flush()
+        # (write_back=False writes every change straight to the file, as before)
+        self.write_back = write_back
+        self._data = None
+        self._dirty = False
+        
+        # Optional storage backend (e.g. SQLite) - None keeps everything in the JSON files
+        self.storage = storage
+        if storage is not None:
+            # One user per session directory, the default session belongs to the default user
+            self.user_id = "default" if session is None or session.directory is None else session.session_id
+            storage.ensure_session(self.session_id, self.user_id)
     
     def load_data(self):
-        """Load data from JSON file"""
-        with open(self.data_file, 'r') as f:
-            return json.load(f)
+        """Load data from JSON file (from memory once loaded in write-back mode)"""
+        if self.write_back and self._data is not None:
+            return dict(self._data)
+        
+        if self.storage is not None:
+            data = self.storage.load_fields(self.session_id)
+            if not data:
+                # First use of the session in the database: seed it from the JSON record
+                with open(self.data_file, 'r') as f:
+                    data = json.load(f)
+                self.storage.save_fields(self.session_id, data)
+        else:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        
+        if self.write_back:
+            self._data = data
+            return dict(data)
+        return data
     
     def save_data(self, data):
-        """Save data to JSON file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        """Save data to JSON file (deferred until flush() in write-back mode)"""
+        if self.write_back:
+            self._data = dict(data)
+            self._dirty = True
+        elif self.storage is not None:
+            self.storage.save_fields(self.session_id, data)
+        else:
+            with open(self.data_file, 'w') as f:
+                json.dump(data, f, indent=2)
+    
+    def flush(self):
+        """Write pending changes once, through a temp file and an atomic rename"""
+        if not self._dirty:
+            return False
+        
+        if self.storage is not None:
+            self.storage.save_fields(self.session_id, self._data)
+        else:
+            temp_path = f"{self.data_file}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self._data, f, indent=2)
+            os.replace(temp_path, self.data_file)
+        self._dirty = False
+        return True
+    
+    def close(self):
+        """Flush pending changes and sync the conversation log"""
+        self.flush()
+        self.history_log.close()
+    
+    def load_profile(self, profile_file):
+        """Load the user's profile from storage, seeding it from profile_file on first use"""
+        profile = self.storage.load_profile(self.user_id)
+        if profile is None:
+            try:
+                with open(profile_file, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            except FileNotFoundError:
+                profile = {"name": None, "user_type": "new"}
+            self.storage.save_profile(self.user_id, profile)
+        return profile
     
     def update_field(self, field, value):
         """Update a single field in data.json"""
@@ -28,13 +127,12 @@ class DataManager:
         if field not in data:
             return f"Error: Field '{field}' not found"
         
-        # Type conversion for numeric fields - simple, no error handling
-        if field == "age":
-            data[field] = int(value)
-        elif field == "weight":
-            data[field] = float(value)
-        elif field == "height":
-            data[field] = float(value)
+        # Type conversion for numeric fields - units and number words are converted locally
+        if field in NUMERIC_FIELDS:
+            number = to_number(field, value)
+            if number is None:
+                return f"Error: Could not read a number for '{field}' from '{value}'"
+            data[field] = number
         else:
             # All other fields as strings
             data[field] = value
@@ -42,9 +140,10 @@ class DataManager:
         self.save_data(data)
         return f"Updated {field} to {data[field]}"
     
-    def get_data_status(self):
-        """Get current data status formatted for LLM"""
-        data = self.load_data()
+    def get_data_status(self, data=None):
+        """Get current data status formatted for LLM (of the given record, or the session's)"""
+        if data is None:
+            data = self.load_data()
         
         # Separate filled and missing data
         filled = {key: value for key, value in data.items() if value is not None}
@@ -112,56 +211,49 @@ class DataManager:
         return "Obese"
     
     
+    def eligible_actions(self, data=None):
+        """Rank the actions.json recommendations the data (default: the session's) qualifies for"""
+        if data is None:
+            data = self.load_data()
+        return get_rule_engine().evaluate(data, self._calculate_bmi(data))
+    
     def save_recommendations(self, actions_list, user_message):
         """Save simplified recommendations to JSON file with top 4 actions"""
-        from datetime import datetime
-        
         data = self.load_data()
         
         # Create simple recommendation record
-        recommendation_record = {
-            "timestamp": datetime.now().isoformat(),
-            "user_data": data,
-            "recommendation_message": user_message,
-            "top_4_actions": actions_list
-        }
+        recommendation_record = build_recommendation_record(data, actions_list, user_message)
+        
+        if self.storage is not None:
+            self.storage.save_recommendation(self.session_id, recommendation_record, self.user_id)
+            return recommendation_record
         
         # Save to recommendations.json
-        with open("data/recommendations.json", 'w', encoding='utf-8') as f:
+        with open(self.recommendations_file, 'w', encoding='utf-8') as f:
             json.dump(recommendation_record, f, indent=2, ensure_ascii=False)
         
         return recommendation_record
     
     def save_conversation_turn(self, user_input, assistant_response, system_commands, current_stage):
-        """Save a conversation turn to conversation_history.json"""
+        """Append a conversation turn to the conversation log"""
         from datetime import datetime
-        import os
         
-        history_file = "data/conversation_history.json"
+        if self.storage is not None:
+            return self.storage.append_turn(self.session_id, {
+                "timestamp": datetime.now().isoformat(),
+                "user_input": user_input,
+                "assistant_response": assistant_response,
+                "system_commands": system_commands,
+                "stage": current_stage
+            })
         
-        # Check if this is the first turn of a new session
+        # First turn of a new session starts a new session in the log (earlier ones are kept)
         if not self.session_initialized:
-            # Start fresh conversation history for new session
-            history = {
-                "session_start": datetime.now().isoformat(),
-                "turns": []
-            }
+            self.history_log.start_session(self.session.session_id if self.session is not None else None)
             self.session_initialized = True
-        else:
-            # Load existing history from current session
-            if os.path.exists(history_file):
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-            else:
-                # Fallback if file doesn't exist
-                history = {
-                    "session_start": datetime.now().isoformat(),
-                    "turns": []
-                }
         
         # Create new turn
         turn = {
-            "turn_number": len(history["turns"]) + 1,
             "timestamp": datetime.now().isoformat(),
             "user_input": user_input,
             "assistant_response": assistant_response,
@@ -169,11 +261,15 @@ class DataManager:
             "stage": current_stage
         }
         
-        # Add turn to history
-        history["turns"].append(turn)
-        
-        # Save updated history
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
-        
-        return turn
\ No newline at end of file
+        return self.history_log.append_turn(turn)
+    
+    def load_conversation_history(self):
+        """Return the current session's turns in the conversation_history.json shape"""
+        if self.storage is not None:
+            turns = self.storage.load_turns(self.session_id)
+            return {
+                "session_id": self.session_id,
+                "session_start": turns[0]["timestamp"] if turns else None,
+                "turns": turns
+            }
+        return read_history(self.log_file, legacy_file=self.history_file)
\ No newline at end of file
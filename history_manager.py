@@ -0,0 +1,119 @@
+"""
+Token-budgeted conversation history for SimpleAgent prompts
+
+Without a budget every prompt re-sends the whole conversation, so prompt
+size grows with every turn. HistoryManager keeps the most recent turns
+verbatim and compacts older ones:
+
+1. Turns whose fields are already captured in the data record are dropped
+   (the CURRENT DATA STATUS section already carries those values).
+2. If the history is still over budget, the oldest remaining turns are
+   dropped too.
+
+Dropped turns are replaced by a one-line summary. Token counts use a local
+estimate, so compaction works offline and for every backend.
+"""
+
+import re
+
+# Rough size of an English/Turkish token for the local estimate
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate the token count of a text without a provider tokenizer"""
+    if not text:
+        return 0
+    # Words and punctuation each cost at least one token, long words cost more
+    pieces = re.findall(r'\w+|[^\w\s]', text)
+    return sum(max(1, -(-len(piece) // CHARS_PER_TOKEN)) for piece in pieces)
+
+def group_turns(history):
+    """Group user/assistant history entries into turns"""
+    turns = []
+    for entry in history:
+        if entry["role"] == "user" or not turns:
+            turns.append([entry])
+        else:
+            turns[-1].append(entry)
+    return turns
+
+class HistoryManager:
+    """Selects which history entries go into the prompt under a token budget"""
+
+    def __init__(self, token_budget=1500, keep_recent_turns=4, data_manager=None):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.data_manager = data_manager
+
+    def bind(self, data_manager):
+        """Return a manager with the same settings reading another session's data"""
+        return HistoryManager(self.token_budget, self.keep_recent_turns, data_manager)
+
+    def select(self, history):
+        """Return (entries to send verbatim, summary line or None)"""
+        turns = group_turns(history)
+        if len(turns) <= self.keep_recent_turns:
+            return history, None
+
+        # Fields each turn collected: its updates plus the question it answered
+        collected = []
+        previous_asking = None
+        for turn in turns:
+            collected.append(self._turn_fields(turn, previous_asking))
+            previous_asking = self._turn_asking(turn)
+
+        split = len(turns) - self.keep_recent_turns
+        filled = self._filled_fields()
+
+        # Drop older turns that only collected fields the data record already holds
+        kept = [index for index in range(split) if not (collected[index] and set(collected[index]) <= filled)]
+
+        # Still over budget: drop the oldest remaining turns
+        recent_tokens = self._tokens(turns[split:])
+        while kept and self._tokens(turns[index] for index in kept) + recent_tokens > self.token_budget:
+            kept.pop(0)
+
+        dropped = [index for index in range(split) if index not in kept]
+        if not dropped:
+            return history, None
+
+        entries = [entry for index in kept for entry in turns[index]]
+        entries.extend(entry for turn in turns[split:] for entry in turn)
+
+        covered = []
+        for index in dropped:
+            covered.extend(field for field in collected[index] if field in filled and field not in covered)
+        return entries, self._summary(len(dropped), covered)
+
+    def _filled_fields(self):
+        """Fields with a value in the session's data record"""
+        if self.data_manager is None:
+            return set()
+        return {key for key, value in self.data_manager.load_data().items() if value is not None}
+
+    def _turn_fields(self, turn, previous_asking):
+        """Fields a turn collected: updates it made plus the question it answered"""
+        fields = []
+        for entry in turn:
+            fields.extend(entry.get("updated", []))
+        if previous_asking and turn[0]["role"] == "user" and turn[0]["message"]:
+            fields.append(previous_asking)
+        return fields
+
+    def _turn_asking(self, turn):
+        """Field the assistant asked for at the end of a turn"""
+        for entry in reversed(turn):
+            if entry.get("asking"):
+                return entry["asking"]
+        return None
+
+    def _tokens(self, turns):
+        """Estimated tokens of turns as formatted in the prompt"""
+        return sum(estimate_tokens(entry["message"]) + 2 for turn in turns for entry in turn)
+
+    def _summary(self, dropped_count, covered):
+        """One-line stand-in for the dropped turns"""
+        summary = f"[{dropped_count} earlier turns omitted"
+        if covered:
+            summary += f" - they collected {', '.join(covered)}, see CURRENT DATA STATUS"
+        return summary + "]"
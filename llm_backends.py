@@ -0,0 +1,290 @@
+"""
+Local LLM backends for SimpleAgent
+
+A backend answers a prompt with a raw response string, exactly like the
+OpenAI service would (user message followed by a <system_message> block).
+Backends implement complete(prompt, model=None) and stream(prompt,
+model=None), both async; model is the one the call was routed to. The
+prompt is either the flat prompt string or a list of role/content chat
+messages (SimpleAgent chat mode).
+
+    stub    deterministic scripted responder driven by the data status
+    record  calls the OpenAI service and writes every response to a cassette
+    replay  answers from a cassette (prompt hash -> raw response), no API calls
+
+A cassette is a JSONL file of {"key", "response", "prompt_tail"} lines keyed
+by prompt_key(prompt, model) with the routed model of each call (the
+backend's model when none is given); later lines win, so re-recording is an
+append.
+"""
+
+import os
+import re
+import json
+import asyncio
+import hashlib
+import random
+import threading
+from abc import ABC, abstractmethod
+from numeric_extractor import NUMERIC_FIELDS
+from widget_handler import get_widget_registry
+
+# Fallback recommendations used by the stub responder
+STUB_ACTIONS = ["regular_checkup", "drink_water", "movement_break", "healthy_eating"]
+
+CASSETTE_FILE = "data/llm_cassette.jsonl"
+PROMPT_TAIL_CHARS = 200  # End of the prompt kept in the cassette to make misses easy to trace
+
+def _field_label(field):
+    """Human readable label for a data field"""
+    return field.replace("_", " ")
+
+def prompt_text(prompt):
+    """Flatten chat messages into the flat prompt layout (strings pass through)"""
+    if isinstance(prompt, str):
+        return prompt
+
+    lines = []
+    for message in prompt:
+        if message["role"] == "system":
+            lines.append(message["content"])
+        else:
+            lines.append(f"{message['role'].capitalize()}: {message['content']}")
+    return "\n\n".join(lines)
+
+def _missing_fields_from_prompt(prompt):
+    """Read the MISSING FIELDS section of the data status embedded in a prompt"""
+    if "=== MISSING FIELDS ===" not in prompt:
+        return []
+
+    section = prompt.split("=== MISSING FIELDS ===", 1)[1]
+    section = section.split("\n\n", 1)[0]
+    return [match.lower() for match in re.findall(r'• ([A-Za-z_]+): null', section)]
+
+def _last_exchange_from_prompt(prompt):
+    """Return (last assistant message, latest user input) from the prompt tail"""
+    lines = [line.strip() for line in prompt.splitlines()]
+
+    user_index = None
+    for index in range(len(lines) - 1, -1, -1):
+        if lines[index].startswith("User:"):
+            user_index = index
+            break
+    if user_index is None:
+        return "", ""
+    user_input = lines[user_index][len("User:"):].strip()
+
+    last_assistant = ""
+    for line in reversed(lines[:user_index]):
+        if line.startswith("Assistant: "):
+            last_assistant = line[len("Assistant: "):]
+            break
+
+    return last_assistant, user_input
+
+def _asked_field(last_assistant, missing):
+    """Missing field the last assistant message asked for - the stub's own question or a widget's question text"""
+    registry = get_widget_registry()
+    for field in missing:
+        spec = registry.get(field)
+        if f"tell me your {_field_label(field)}?" in last_assistant:
+            return field
+        if spec is not None and spec["question_text_en"] in last_assistant:
+            return field
+    return None
+
+class LocalBackend(ABC):
+    """Answers from respond(prompt, model) with simulated latency and chunked streaming"""
+
+    name = "local"
+
+    def __init__(self, latency=0.0, jitter=0.0, chunk_size=8, chunk_interval=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        self.calls = 0
+
+    async def complete(self, prompt, model=None):
+        """Return a scripted response for the prompt"""
+        self.calls += 1
+        await self._simulate_latency()
+        return self.respond(prompt, model)
+
+    async def stream(self, prompt, model=None):
+        """Yield the scripted response in small chunks, like a streaming API"""
+        self.calls += 1
+        await self._simulate_latency()
+
+        response = self.respond(prompt, model)
+        for start in range(0, len(response), self.chunk_size):
+            if self.chunk_interval > 0 and start:
+                await asyncio.sleep(self.chunk_interval)
+            yield response[start:start + self.chunk_size]
+
+    async def _simulate_latency(self):
+        """Simulate provider latency without blocking the event loop"""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @abstractmethod
+    def respond(self, prompt, model=None):
+        """Return the raw response for a prompt sent to model (every subclass implements it)"""
+
+class StubBackend(LocalBackend):
+    """Deterministic scripted responder that follows the data status in the prompt"""
+
+    name = "stub"
+
+    def respond(self, prompt, model=None):
+        """Build the scripted response synchronously (the same for every model)"""
+        prompt = prompt_text(prompt)
+        if "COMPLETION STAGE" in prompt:
+            return self._recommendations_response()
+        if "CONVERSATION STAGE: Initial greeting" in prompt:
+            return "Welcome! Let's go through a few quick health questions together.\n\n<system_message></system_message>"
+        return self._questionnaire_response(prompt)
+
+    def _questionnaire_response(self, prompt):
+        """Record the answer to the previous question and ask the next missing field"""
+        missing = _missing_fields_from_prompt(prompt)
+        last_assistant, user_input = _last_exchange_from_prompt(prompt)
+
+        commands = []
+        answered = _asked_field(last_assistant, missing)
+
+        if answered and user_input:
+            value = user_input
+            if answered in NUMERIC_FIELDS:
+                number = re.search(r'\d+(?:[.,]\d+)?', user_input)
+                value = number.group(0).replace(",", ".") if number else None
+            if value:
+                commands.append(f'<update>"{answered}":"{value}"</update>')
+                missing = [field for field in missing if field != answered]
+
+        if missing:
+            next_field = missing[0]
+            commands.append(f"<asking>{next_field}</asking>")
+            message = f"Thanks! Could you tell me your {_field_label(next_field)}?"
+        else:
+            message = "Perfect, that completes our health assessment!"
+
+        return f"{message}\n\n<system_message>\n" + "\n".join(commands) + "\n</system_message>"
+
+    def _recommendations_response(self):
+        """Return a fixed set of recommendations"""
+        actions = "\n".join(f"<action>{action}</action>" for action in STUB_ACTIONS)
+        return (
+            "Here are your personalized wellness recommendations.\n\n"
+            f"<system_message>\n<recommendations>\n{actions}\n</recommendations>\n</system_message>"
+        )
+
+def prompt_key(prompt, model=None):
+    """Stable hash of a prompt (flat string or chat messages) for one model"""
+    payload = json.dumps({"model": model, "prompt": prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CassetteMissError(LookupError):
+    """Replay was asked for a prompt that was never recorded"""
+
+class Cassette:
+    """Recorded raw responses by prompt key, backed by an append-only JSONL file"""
+
+    def __init__(self, path=CASSETTE_FILE):
+        self.path = path
+        self.responses = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line of an interrupted recording
+                    self.responses[record["key"]] = record["response"]
+
+    def get(self, key):
+        """Return the recorded response, or None"""
+        return self.responses.get(key)
+
+    def record(self, key, prompt, response):
+        """Store a response (appends a line unless the same response is already recorded)"""
+        with self.lock:
+            if self.responses.get(key) == response:
+                return
+            self.responses[key] = response
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            record = {"key": key, "response": response, "prompt_tail": prompt_text(prompt)[-PROMPT_TAIL_CHARS:]}
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+class RecordBackend:
+    """Passes every call through to the OpenAI service and records the response
+
+    SimpleAgent hands its semantic kernel calls in as service (an object with
+    complete/stream); a source backend can be recorded instead.
+    """
+
+    name = "record"
+
+    def __init__(self, cassette, model=None, source=None):
+        self.cassette = cassette
+        self.model = model
+        self.source = source
+
+    @property
+    def wraps_service(self):
+        """True when SimpleAgent must set up the OpenAI service for this backend"""
+        return self.source is None
+
+    async def complete(self, prompt, service=None, model=None):
+        """Return the service response and record it under the model the call was routed to"""
+        response = await (self.source or service).complete(prompt)
+        self.cassette.record(prompt_key(prompt, model or self.model), prompt, response)
+        return response
+
+    async def stream(self, prompt, service=None, model=None):
+        """Pass the service chunks through and record the joined response"""
+        chunks = []
+        async for chunk in (self.source or service).stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self.cassette.record(prompt_key(prompt, model or self.model), prompt, "".join(chunks))
+
+class ReplayBackend(LocalBackend):
+    """Answers from a cassette with configurable artificial latency"""
+
+    name = "replay"
+
+    def __init__(self, cassette, model=None, latency=0.0, jitter=0.0, chunk_size=8, chunk_interval=0.0):
+        super().__init__(latency=latency, jitter=jitter, chunk_size=chunk_size, chunk_interval=chunk_interval)
+        self.cassette = cassette
+        self.model = model
+
+    def respond(self, prompt, model=None):
+        """Return the response recorded for the prompt on model"""
+        key = prompt_key(prompt, model or self.model)
+        response = self.cassette.get(key)
+        if response is None:
+            raise CassetteMissError(f"No recorded response for prompt {key[:12]} in {self.cassette.path} "
+                                    f"(prompt ends with: {prompt_text(prompt)[-80:]!r}) - re-record with --llm=record")
+        return response
+
+def create_backend(name, latency=0.0, jitter=0.0, cassette=CASSETTE_FILE, model=None):
+    """Create a backend by name - 'openai' returns None (use semantic kernel)"""
+    if name in (None, "", "openai"):
+        return None
+    if name == "stub":
+        return StubBackend(latency=latency, jitter=jitter)
+    if name == "record":
+        return RecordBackend(Cassette(cassette), model=model)
+    if name == "replay":
+        if not os.path.exists(cassette):
+            raise ValueError(f"Cassette not found: {cassette} (record one with --llm=record)")
+        return ReplayBackend(Cassette(cassette), model=model, latency=latency, jitter=jitter)
+    raise ValueError(f"Unknown LLM backend: {name}")
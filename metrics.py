@@ -0,0 +1,133 @@
+"""
+Per-turn latency and token metrics
+
+Every turn of app.main records how long each step took (prompt build, LLM
+call, time to first token, parse, command execution, widget wait and
+persistence) together with prompt/completion token counts and the model
+name - and, with model routing, the route and the estimated cost of the
+call. Records are appended to a JSONL sidecar next to the conversation
+history (data/metrics.jsonl, or metrics.jsonl in a session directory).
+"""
+
+import json
+import math
+import time
+from contextlib import contextmanager
+
+# Timings reported in the summary, in turn order
+TIMING_NAMES = [
+    "prompt_build_ms", "llm_ms", "ttft_ms", "parse_ms",
+    "command_execution_ms", "widget_wait_ms", "persistence_ms", "turn_ms"
+]
+TOKEN_NAMES = ["prompt_tokens", "completion_tokens", "cached_tokens"]
+
+def token_cost(price, prompt_tokens, completion_tokens, cached_tokens=0):
+    """USD cost of a call at a price of {"input", "cached_input", "output"} USD per million tokens"""
+    uncached = prompt_tokens - cached_tokens
+    cached_price = price.get("cached_input", price["input"])
+    return (uncached * price["input"] + cached_tokens * cached_price + completion_tokens * price["output"]) / 1_000_000
+
+class TurnMetrics:
+    """Timings and token counts of a single conversation turn"""
+
+    def __init__(self, turn_number, stage):
+        self.record = {"turn_number": turn_number, "stage": stage}
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name):
+        """Time a block and add it to <name>_ms"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        """Add milliseconds to a timing (a step may run more than once per turn)"""
+        key = f"{name}_ms"
+        self.record[key] = self.record.get(key, 0.0) + ms
+
+    def update(self, values):
+        """Merge values reported by another component (e.g. SimpleAgent.last_metrics)"""
+        self.record.update({key: value for key, value in (values or {}).items() if value is not None})
+
+    def finish(self):
+        """Close the turn and return its record"""
+        self.record["turn_ms"] = (time.perf_counter() - self.start_time) * 1000
+        # Costs are fractions of a cent, everything else is milliseconds
+        return {key: round(value, 6 if key == "cost_usd" else 2) if isinstance(value, float) else value
+                for key, value in self.record.items()}
+
+class MetricsLog:
+    """Append-only JSONL file of turn records"""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []  # Records of this run, used for the summary
+
+    def append(self, record):
+        """Write one turn record"""
+        self.records.append(record)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def summarize(records):
+    """Return {metric: {"count", "p50", "p95", "total"}} over turn records"""
+    summary = {}
+    for name in TIMING_NAMES + TOKEN_NAMES:
+        values = [record[name] for record in records if isinstance(record.get(name), (int, float))]
+        if values:
+            summary[name] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "total": sum(values)
+            }
+    return summary
+
+def print_summary(records):
+    """Print a p50/p95 table of the session's turns"""
+    summary = summarize(records)
+    if not summary:
+        print("\n📊 No turn metrics recorded")
+        return
+
+    models = sorted({record["model"] for record in records if record.get("model")})
+    print(f"\n📊 Turn metrics - {len(records)} turns" + (f" ({', '.join(models)})" if models else ""))
+    print(f"    {'metric':<22} {'p50':>10} {'p95':>10} {'total':>10}")
+    for name, stats in summary.items():
+        print(f"    {name:<22} {stats['p50']:>10.1f} {stats['p95']:>10.1f} {stats['total']:>10.1f}")
+
+    routes = summarize_routes(records)
+    if routes:
+        print(f"\n📍 Model routes")
+        print(f"    {'route':<28} {'model':<14} {'turns':>5} {'llm p50':>9} {'llm p95':>9} {'cost $':>10}")
+        for label, stats in routes.items():
+            print(f"    {label:<28} {stats['model']:<14} {stats['turns']:>5} {stats['llm_p50']:>9.1f} "
+                  f"{stats['llm_p95']:>9.1f} {stats['cost_usd']:>10.5f}")
+
+def summarize_routes(records):
+    """Return {route: {"model", "turns", "llm_p50", "llm_p95", "cost_usd"}} over the routed LLM turns"""
+    by_route = {}
+    for record in records:
+        if record.get("route"):
+            by_route.setdefault(record["route"], []).append(record)
+
+    routes = {}
+    for label, route_records in by_route.items():
+        llm_ms = [record.get("llm_ms", 0.0) for record in route_records]
+        routes[label] = {
+            "model": ", ".join(sorted({record.get("route_model", "") for record in route_records})),
+            "turns": len(route_records),
+            "llm_p50": percentile(llm_ms, 50),
+            "llm_p95": percentile(llm_ms, 95),
+            "cost_usd": sum(record.get("cost_usd", 0.0) for record in route_records)
+        }
+    return routes
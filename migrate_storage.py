@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Import the JSON data files into the SQLite storage
+
+Copies the default session (data/profile.json, data/data.json, the
+conversation log or data/conversation_history.json, data/recommendations.json)
+and every session directory under data/sessions/ into the database. Running
+it again is safe: turns and recommendations already in the database are
+not imported twice, and field values and profiles are overwritten with the
+JSON contents.
+
+Usage:
+    python migrate_storage.py
+    python migrate_storage.py --db=data/simple_assistant.db
+"""
+
+import os
+import sys
+import json
+
+from session import Session, SESSIONS_DIR
+from storage import SQLiteStorage, DEFAULT_DB_FILE, DEFAULT_USER_ID
+from conversation_log import read_history
+
+def _load_json(path):
+    """Load a JSON file, None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def migrate_session(storage, session, user_id):
+    """Import one session's files, returns a count per kind of record"""
+    counts = {"profiles": 0, "fields": 0, "turns": 0, "recommendations": 0}
+    storage.ensure_session(session.session_id, user_id)
+
+    profile = _load_json(session.profile_file)
+    if profile is not None:
+        storage.save_profile(user_id, profile)
+        counts["profiles"] += 1
+
+    data = _load_json(session.data_file)
+    if data is not None:
+        storage.save_fields(session.session_id, data)
+        counts["fields"] += len(data)
+
+    if not storage.load_turns(session.session_id):
+        for turn in read_history(session.log_file, legacy_file=session.history_file)["turns"]:
+            storage.append_turn(session.session_id, {
+                "timestamp": turn.get("timestamp") or "",
+                "user_input": turn.get("user_input"),
+                "assistant_response": turn.get("assistant_response"),
+                "system_commands": turn.get("system_commands"),
+                "stage": turn.get("stage")
+            })
+            counts["turns"] += 1
+
+    record = _load_json(session.recommendations_file)
+    if record:
+        latest = storage.load_recommendation(session.session_id)
+        if latest is None or latest["timestamp"] != record.get("timestamp"):
+            storage.save_recommendation(session.session_id, {
+                "timestamp": record.get("timestamp") or "",
+                "user_data": record.get("user_data", {}),
+                "recommendation_message": record.get("recommendation_message"),
+                "top_4_actions": record.get("top_4_actions", [])
+            }, user_id)
+            counts["recommendations"] += 1
+
+    return counts
+
+def main():
+    """Parse flags and migrate every session"""
+    db_file = DEFAULT_DB_FILE
+    sessions_dir = SESSIONS_DIR
+    for arg in sys.argv:
+        if arg.startswith("--db="):
+            db_file = arg.split("=")[1]
+        elif arg.startswith("--sessions-dir="):
+            sessions_dir = arg.split("=")[1]
+
+    storage = SQLiteStorage(db_file)
+    sessions = [(Session.default(), DEFAULT_USER_ID)]
+    if os.path.isdir(sessions_dir):
+        for session_id in sorted(os.listdir(sessions_dir)):
+            if Session.exists(session_id, sessions_dir):
+                sessions.append((Session.load(session_id, sessions_dir), session_id))
+
+    print(f"🗄️  Migrating {len(sessions)} session(s) into {db_file}")
+    for session, user_id in sessions:
+        counts = migrate_session(storage, session, user_id)
+        summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+        print(f"  • {session.session_id}: {summary}")
+
+    storage.close()
+    print("✅ Migration complete")
+
+if __name__ == "__main__":
+    main()
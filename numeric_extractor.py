@@ -0,0 +1,215 @@
+"""
+Local extraction of the numeric fields (age, weight, height)
+
+Answers like "28", "72kg", "1,75 m", "5'9", "5′9″", "150 lbs" or "yetmiş
+iki kilo" are read without the LLM. extract_numeric returns the value in the
+unit DataManager stores (years, kg, cm) - or None when the answer is not one
+unambiguous quantity of the right kind (two numbers, a wrong unit, a
+question, "not sure", a decade like "in my 30s", out of range...), in which
+case the LLM handles the turn as before.
+
+With --local-extraction the answer to a numeric question is recorded and
+the next question asked without an LLM call: local_response builds the raw
+response in the LLM format (templated text plus <update> and <asking>).
+"""
+
+import re
+import math
+from widget_handler import get_widget_prompt
+
+# Fields stored as numbers by DataManager.update_field
+NUMERIC_FIELDS = ("age", "weight", "height")
+
+MAX_ANSWER_CHARS = 80  # Longer answers are left to the LLM
+POUND_KG = 0.45359237
+FOOT_CM = 30.48
+INCH_CM = 2.54
+
+# Plausible values per field, in the stored unit
+RANGES = {"age": (1, 120), "weight": (20, 350), "height": (50, 250)}
+
+# Answers that are not a plain statement of the value
+UNCERTAIN = ("?", "not sure", "don't know", "dont know", "no idea", "between",
+             "bilmiyorum", "emin değilim", "emin degilim", "arası", "arasi", "tahmin")
+
+# Decades are a range, not a value: "30s", "late 20's", "thirties", "40'lı", "otuzlu yaşlar"
+# (matched in normalized text, where digits, apostrophes and suffixes are split by spaces)
+DECADE_PATTERN = re.compile(
+    r"\d0 (?:['’] )?(?:s|l[ıiuü]|l[ae]r\w*)\b"
+    r"|\b(?:twent|thirt|fort|fift|sixt|sevent|eight|ninet)ies\b"
+    r"|(?:yirmi|otuz|kırk|kirk|elli|altmış|altmis|yetmiş|yetmis|seksen|doksan)l[ıiuüae]"
+)
+
+# Turkish number words (with the spellings typed without Turkish letters)
+ONES = {
+    "sıfır": 0, "sifir": 0, "bir": 1, "iki": 2, "üç": 3, "uc": 3, "dört": 4, "dort": 4,
+    "beş": 5, "bes": 5, "altı": 6, "alti": 6, "yedi": 7, "sekiz": 8, "dokuz": 9
+}
+TENS = {
+    "on": 10, "yirmi": 20, "otuz": 30, "kırk": 40, "kirk": 40, "elli": 50,
+    "altmış": 60, "altmis": 60, "yetmiş": 70, "yetmis": 70, "seksen": 80, "doksan": 90
+}
+HUNDRED = ("yüz", "yuz")
+HALF = ("buçuk", "bucuk")
+
+# Unit words, matched at the start of the word so Turkish suffixes pass ("kiloyum", "yaşındayım")
+UNITS = [
+    ("years", r"years?|yrs?|yo\b|yaş\w*|yas\w*"),
+    ("kg", r"kg\w*|kilo\w*"),
+    ("lb", r"lbs?\b|pounds?|libre\w*"),
+    ("cm", r"cm\w*|santim\w*|centimet\w*"),
+    ("m", r"m\b|metre\w*|meters?|metres?"),
+    ("ft", r"ft\b|feet|foot|'|′|’"),
+    ("in", r"in\b|inch\w*|inç\w*|\"|''|″|”"),
+]
+UNIT_PATTERN = "|".join(f"(?P<{name}>{pattern})" for name, pattern in UNITS)
+QUANTITY_PATTERN = re.compile(rf"(?P<number>\d+(?:[.,]\d+)?)\s*(?:{UNIT_PATTERN})?")
+
+FIELD_UNITS = {"age": ("years",), "weight": ("kg", "lb"), "height": ("cm", "m", "ft", "in")}
+
+# Templated local replies
+LABELS_TR = {"age": "yaşınızı", "weight": "kilonuzu", "height": "boyunuzu"}
+QUESTIONS_TR = {"age": "Kaç yaşındasınız?", "weight": "Kilonuz kaç?", "height": "Boyunuz kaç cm?"}
+DISPLAY_UNITS = {"age": "", "weight": " kg", "height": " cm"}
+
+def _normalize(text):
+    """Lower-case text with Turkish number word runs replaced by digits"""
+    words = re.findall(r"\d+(?:[.,]\d+)?|[^\W\d_]+|\S", text.replace("İ", "i").lower())
+
+    output = []
+    number = None  # [value, magnitude of its last word] of the run being read
+    for index, word in enumerate(words):
+        following = words[index + 1] if index + 1 < len(words) else None
+        if word == "on" and number is None and following not in ONES:
+            output.append(word)  # English "on", not a lone Turkish ten
+        elif word in HALF and number is not None:
+            number = [number[0] + 0.5, -1]
+        elif word in HUNDRED and number is not None and number[1] == 0:
+            number = [number[0] * 100, 2]  # "iki yüz"
+        elif word in ONES or word in TENS or word in HUNDRED:
+            value, magnitude = (ONES[word], 0) if word in ONES else (TENS[word], 1) if word in TENS else (100, 2)
+            if number is not None and magnitude < number[1]:
+                number = [number[0] + value, magnitude]  # "yetmiş iki"
+                continue
+            if number is not None:
+                output.append(_format_number(number[0]))  # "bir yetmiş beş" is two numbers
+            number = [value, magnitude]
+        else:
+            if number is not None:
+                output.append(_format_number(number[0]))
+                number = None
+            output.append(word)
+    if number is not None:
+        output.append(_format_number(number[0]))
+    return " ".join(output)
+
+def _format_number(value):
+    return str(int(value)) if value == int(value) else str(value)
+
+def _quantities(text):
+    """Return [(number, unit or None)] found in normalized text"""
+    quantities = []
+    for match in QUANTITY_PATTERN.finditer(text):
+        unit = next((name for name, _ in UNITS if match.group(name)), None)
+        quantities.append((float(match.group("number").replace(",", ".")), unit))
+    return quantities
+
+def _combine_height(quantities):
+    """Merge feet+inches and metres+centimetres pairs ("5'9", "bir yetmiş beş") into cm"""
+    if len(quantities) != 2:
+        return quantities
+    (first, first_unit), (second, second_unit) = quantities
+    if first_unit == "ft" and second_unit in ("in", None) and second < 12:
+        return [(first * FOOT_CM + second * INCH_CM, "cm")]
+    if first_unit in ("m", None) and second_unit in ("cm", None) and first in (1, 2) and second < 100:
+        return [(first * 100 + second, "cm")]
+    return quantities
+
+def _to_stored_unit(field, number, unit):
+    """Convert to years/kg/cm, None if the unit does not fit the field"""
+    if unit is not None and unit not in FIELD_UNITS[field]:
+        return None
+    if field == "age":
+        return int(number) if number == int(number) else None
+    if field == "weight":
+        return round(number * POUND_KG, 1) if unit == "lb" else number
+    if unit == "ft":
+        return number * FOOT_CM
+    if unit == "in":
+        return number * INCH_CM
+    if unit == "m" or (unit is None and number < 3):
+        return number * 100 if number < 3 else None
+    return number
+
+def extract_numeric(field, text):
+    """Value of a numeric field in an answer, None unless it is unambiguous"""
+    if field not in NUMERIC_FIELDS or not text or len(text) > MAX_ANSWER_CHARS:
+        return None
+    normalized = _normalize(text.strip())
+    if any(marker in normalized for marker in UNCERTAIN) or DECADE_PATTERN.search(normalized):
+        return None
+
+    quantities = _quantities(normalized)
+    if field == "height":
+        quantities = _combine_height(quantities)
+    if len(quantities) != 1:
+        return None
+
+    value = _to_stored_unit(field, *quantities[0])
+    if value is None:
+        return None
+    low, high = RANGES[field]
+    if not low <= value <= high:
+        return None
+    return round(value, 2) if isinstance(value, float) else value
+
+def to_number(field, value):
+    """Convert a stored or LLM-sent value ("72", "72kg", "5'9") for a numeric field, None if unreadable
+    
+    Plain numbers get the same checks as extract_numeric: "inf", "nan" and
+    negative values are rejected, and one outside RANGES is read like an
+    answer ("1.75" is a height in metres, "9999" is rejected).
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is not None:
+        if not math.isfinite(number) or number < 0:
+            return None
+        low, high = RANGES[field]
+        if low <= number <= high:
+            return int(number) if field == "age" else number
+    extracted = extract_numeric(field, str(value))
+    return float(extracted) if extracted is not None and field != "age" else extracted
+
+def local_response(field, value, data, language_mode=False):
+    """Raw response recording a numeric answer and asking the next missing field, in the LLM response format"""
+    missing = [key for key, current in data.items() if current is None and key != field]
+    next_field = missing[0] if missing else None
+    display = f"{_format_number(value)}{DISPLAY_UNITS[field]}"
+
+    english = f"Got it, I've recorded your {field}: {display}."
+    turkish = f"Teşekkürler, {LABELS_TR[field]} kaydettim: {display}."
+    if next_field is None:
+        english += " That completes our health assessment!"
+        turkish += " Sağlık değerlendirmemiz tamamlandı!"
+    else:
+        english += f" Could you tell me your {next_field.replace('_', ' ')}?"
+        widget = get_widget_prompt(next_field)
+        turkish += " " + (QUESTIONS_TR.get(next_field) or (widget[0] if widget else next_field.replace("_", " ") + "?"))
+
+    message = f"<english>{english}</english>\n<turkish>{turkish}</turkish>" if language_mode else english
+    commands = [f'<update>"{field}":"{_format_number(value)}"</update>']
+    if next_field is not None:
+        commands.append(f"<asking>{next_field}</asking>")
+    return f"{message}\n\n<system_message>\n" + "\n".join(commands) + "\n</system_message>"
+
+def fast_path_response(asking, user_input, data, language_mode=False):
+    """Local raw response for an answer to a numeric question, None when the LLM is needed"""
+    if asking not in NUMERIC_FIELDS or data.get(asking) is not None:
+        return None
+    value = extract_numeric(asking, user_input)
+    if value is None:
+        return None
+    return local_response(asking, value, data, language_mode)
@@ -0,0 +1,243 @@
+"""
+Speculative prefetch of the next LLM turn while a widget is open
+
+A widget has a small closed set of options, and the turn after it is fully
+determined by the choice: the selection becomes the user input and the
+field is recorded in the data status. So while the user is still looking at
+the widget, the next turn's request is built for the likely options and sent
+in the background on the LLM loop (on the model the turn is routed to). When
+the user picks, SimpleAgent commits the speculative call whose prompt and
+model match the real ones exactly and cancels the rest - a changed prompt
+simply misses and the turn runs as usual.
+
+Options are tried in order of how often they were picked before
+(data/widget_frequencies.json, written every few seconds and by
+Prefetcher.flush()), at most top_k per widget, and at most budget
+speculative calls are sent per BUDGET_WINDOW seconds, so a long-running
+server keeps prefetching at a bounded rate. Prefetcher.stats() reports hits,
+misses, wasted calls and the LLM time saved.
+"""
+
+import os
+import copy
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from collections import deque
+
+from llm_backends import prompt_key
+from simple_agent import get_llm_loop
+from widget_handler import get_widget_registry, next_chained_widget
+
+FREQUENCIES_FILE = "data/widget_frequencies.json"
+DEFAULT_BUDGET = 100  # Speculative LLM calls per BUDGET_WINDOW
+BUDGET_WINDOW = 60.0  # Seconds
+FLUSH_INTERVAL = 5.0  # Seconds between writes of the frequencies file
+
+class OptionFrequencies:
+    """How often each widget option was picked, persisted as JSON"""
+
+    def __init__(self, path=FREQUENCIES_FILE):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.counts = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.counts = {}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def rank(self, field, values):
+        """Option values, most picked first (ties keep the widget order)"""
+        counts = self.counts.get(field, {})
+        return sorted(values, key=lambda value: -counts.get(value, 0))
+
+    def record(self, field, value):
+        """Count a pick - the file is written at most every FLUSH_INTERVAL seconds"""
+        field_counts = self.counts.setdefault(field, {})
+        field_counts[value] = field_counts.get(value, 0) + 1
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write pending counts through a unique temp file and an atomic rename"""
+        if not self._dirty:
+            return False
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".",
+                                         prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.counts, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        return True
+
+async def _fetch(agent, prompt, route):
+    """One speculative completion on an agent fork, with its usage and timing"""
+    start = time.perf_counter()
+    response = await agent._complete_async(prompt, route)
+    return response, agent.last_usage, agent.last_cache, time.perf_counter() - start
+
+class Speculation:
+    """The speculative calls launched for one open widget"""
+
+    def __init__(self, prefetcher):
+        self.prefetcher = prefetcher
+        self.launched_at = time.perf_counter()
+        self.futures = {}  # prompt key (with the model) -> concurrent future of _fetch
+
+    def take(self, prompt, model=None):
+        """Return the future for this prompt and model (None on a miss) and cancel every other call"""
+        future = self.futures.pop(prompt_key(prompt, model), None) if prompt is not None else None
+        for other in self.futures.values():
+            other.cancel()
+        self.prefetcher._count(hit=future is not None, wasted=len(self.futures))
+        self.futures = {}
+        return future
+
+    def cancel(self):
+        """Drop all calls (the next turn needs no LLM call)"""
+        self.take(None)
+
+    def saved_ms(self, duration):
+        """LLM time already spent before the real request: the whole call or the time since launch"""
+        ms = min(duration, time.perf_counter() - self.launched_at) * 1000
+        self.prefetcher._add_saved(ms)
+        return ms
+
+class Prefetcher:
+    """Budget, option ranking and counters shared by every conversation of the process"""
+
+    def __init__(self, top_k=None, budget=DEFAULT_BUDGET, frequencies=None, window=BUDGET_WINDOW):
+        self.top_k = top_k  # None tries every option
+        self.budget = budget
+        self.window = window
+        self._launch_times = deque()  # Monotonic time of every call launched in the current window
+        self.frequencies = frequencies or OptionFrequencies()
+        self.counters = {"widgets": 0, "launched": 0, "hits": 0, "misses": 0, "wasted": 0, "over_budget": 0}
+        self.saved_ms = 0.0
+        self._lock = threading.Lock()
+
+    def launch(self, agent, requests):
+        """Send [(value, prompt, route)] in the background, returns the Speculation to attach to the agent
+
+        None when the window's budget is spent - the widget then counts as neither a hit nor a miss.
+        """
+        with self._lock:
+            self.counters["widgets"] += 1
+            now = time.monotonic()
+            while self._launch_times and now - self._launch_times[0] >= self.window:
+                self._launch_times.popleft()
+            allowed = max(0, self.budget - len(self._launch_times)) if self.budget is not None else len(requests)
+            self.counters["over_budget"] += max(0, len(requests) - allowed)
+            requests = requests[:allowed]
+            self.counters["launched"] += len(requests)
+            self._launch_times.extend([now] * len(requests))
+        if not requests:
+            return None
+
+        speculation = Speculation(self)
+        loop = get_llm_loop().loop
+        for _, prompt, route in requests:
+            fork = agent.fork()  # Own usage and cache fields, shares the LLM client
+            key = prompt_key(prompt, agent._routed(route)[0])
+            speculation.futures[key] = asyncio.run_coroutine_threadsafe(_fetch(fork, prompt, route), loop)
+        return speculation
+
+    def flush(self):
+        """Write the pick counts that are still pending (call at shutdown)"""
+        self.frequencies.flush()
+
+    def _count(self, hit, wasted):
+        with self._lock:
+            self.counters["hits" if hit else "misses"] += 1
+            self.counters["wasted"] += wasted
+
+    def _add_saved(self, ms):
+        with self._lock:
+            self.saved_ms += ms
+
+    def stats(self):
+        """Counters plus the hit rate of the widgets that were prefetched"""
+        with self._lock:
+            stats = dict(self.counters, saved_ms=round(self.saved_ms, 1))
+        stats["hit_rate"] = _hit_rate(stats)
+        return stats
+
+    def summary(self):
+        """One-line description of the counters"""
+        return format_stats(self.stats())
+
+def _hit_rate(stats):
+    """Share of the prefetched widgets whose choice matched a speculative call"""
+    taken = stats["hits"] + stats["misses"]
+    return round(stats["hits"] / taken, 3) if taken else 0.0
+
+def format_stats(stats):
+    """One-line description of stats() counters (e.g. summed over several processes)"""
+    return (f"{stats['launched']} speculative calls for {stats['widgets']} widgets, {stats['hits']} hits, "
+            f"{stats['misses']} misses (hit rate {_hit_rate(stats):.0%}), {stats['wasted']} wasted, "
+            f"{stats['over_budget']} over budget, {stats['saved_ms'] / 1000:.1f}s LLM time saved")
+
+class WidgetPrefetch:
+    """Prefetch hooks of one conversation (app.main or a ConversationEngine)"""
+
+    def __init__(self, prefetcher, agent, stage_manager, data_manager, widget_chain=False, offline_recommendations=False):
+        self.prefetcher = prefetcher
+        self.agent = agent
+        self.stage_manager = stage_manager
+        self.data_manager = data_manager
+        self.widget_chain = widget_chain
+        self.offline_recommendations = offline_recommendations
+
+    def opened(self, field):
+        """A widget is shown - start the next turn for its likely options"""
+        spec = get_widget_registry().get(field)
+        if spec is None or not spec["has_options"]:
+            return
+        data = self.data_manager.load_data()
+        values = self.prefetcher.frequencies.rank(field, spec["values"])[:self.prefetcher.top_k]
+
+        requests = []
+        for value in values:
+            request = self._next_request(field, dict(data, **{field: value}), spec["display_by_value"][value])
+            if request is not None:
+                requests.append((value, *request))
+        if requests:
+            self.agent.speculation = self.prefetcher.launch(self.agent, requests)
+
+    def chosen(self, field, value):
+        """The user picked an option"""
+        self.prefetcher.frequencies.record(field, value)
+
+    def _next_request(self, field, data, display):
+        """(prompt, route) the next turn sends if the widget is answered this way, None if it needs no LLM call"""
+        stage = self.stage_manager.next_stage(data)
+        if stage == "QUESTIONNAIRE" and self.widget_chain and next_chained_widget(data):
+            return None
+        if stage == "RECOMMENDATIONS" and self.offline_recommendations:
+            return None
+
+        builder = copy.copy(self.agent)
+        builder.prompt_mode = False  # Speculative prompts are not printed
+        prompt = builder._build_request(
+            "" if stage == "RECOMMENDATIONS" else display,
+            self.stage_manager.get_current_stage_context(stage),
+            self.stage_manager.get_profile_and_data_context(data, stage)
+        )
+        return prompt, self.stage_manager.get_route(field, stage)
+
+def create_prefetcher(mode, budget=DEFAULT_BUDGET):
+    """Create a prefetcher - None/'off' returns None, 'all' tries every option, a number the top-k options"""
+    if mode in (None, "", "off"):
+        return None
+    if mode == "all":
+        return Prefetcher(None, budget)
+    return Prefetcher(int(mode), budget)
@@ -0,0 +1,83 @@
+"""
+Shared cache for prompt templates and other small config files
+
+Files are read once and kept in memory for every session in the process.
+A file is re-read only when its mtime (or size) changes, and the stat that
+detects the change runs at most once per CHECK_INTERVAL seconds per file,
+so the turn hot path does no file I/O at all.
+"""
+
+import os
+import json
+import time
+import threading
+
+PROMPTS_DIR = "prompts"
+CHECK_INTERVAL = 1.0  # Seconds between mtime checks of one file
+
+def read_text(path):
+    """Loader for text templates"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+def read_json(path):
+    """Loader for JSON files"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class FileCache:
+    """Loaded-once file contents, reloaded when the file changes on disk"""
+
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.entries = {}  # (path, loader) -> [value, file signature, last check time]
+        self.lock = threading.RLock()  # Loaders may read other cached files
+        self.loads = 0  # Number of actual file reads, for diagnostics
+
+    def get(self, path, loader=read_text):
+        """Return loader(path), from memory unless the file changed since it was loaded"""
+        key = (path, loader)
+        now = time.monotonic()
+
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[0]
+
+        with self.lock:
+            entry = self.entries.get(key)
+            signature = self._signature(path)
+            if entry is not None and entry[1] == signature:
+                entry[2] = now
+                return entry[0]
+
+            value = loader(path)
+            self.loads += 1
+            self.entries[key] = [value, signature, now]
+            return value
+
+    def invalidate(self, path=None):
+        """Forget one file (or everything) so the next get() reloads it"""
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == path]:
+                    del self.entries[key]
+
+    def _signature(self, path):
+        """mtime and size identify a version of the file (raises FileNotFoundError)"""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+# One cache for the whole process, shared by all sessions
+shared_cache = FileCache()
+
+def get_prompt(name):
+    """Return the prompts/<name>.txt template"""
+    return shared_cache.get(os.path.join(PROMPTS_DIR, f"{name}.txt"), read_text)
+
+def preload_prompts():
+    """Load every template at startup so the first turns do no file I/O either"""
+    for filename in sorted(os.listdir(PROMPTS_DIR)):
+        if filename.endswith(".txt"):
+            get_prompt(filename[:-len(".txt")])
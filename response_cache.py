@@ -0,0 +1,238 @@
+"""
+Two-tier cache of raw LLM responses
+
+Evaluation runs and the opening turns of every conversation send the same
+prompts again and again. ResponseCache answers a repeated request without
+an LLM call:
+
+    memory   LRU of the most recent responses in this process
+    disk     SQLite file shared by every process (and run), with a TTL and
+             a size limit - the least recently used responses go first
+
+Entries are keyed on the model, the normalized prompt (flat string or chat
+messages) and the settings that change the answer. A response sampled at
+temperature > 0 is one of many possible answers, so such requests bypass the
+cache unless it was created with force=True. The provider default temperature
+(None) counts as > 0 - SimpleAgent warns when that leaves its default calls
+uncached.
+
+The memory tier is read on the caller's thread; get_async() and put_async()
+run the SQLite tier in a worker thread, so disk I/O never holds up the other
+sessions on the shared LLM event loop.
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_FILE = "data/llm_cache.db"
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_TTL = 7 * 24 * 3600  # Seconds
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key          TEXT PRIMARY KEY,
+    response     TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    accessed_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+"""
+
+SQL_SELECT = "SELECT response, created_at FROM responses WHERE key = ?"
+SQL_TOUCH = "UPDATE responses SET accessed_at = ? WHERE key = ?"
+SQL_UPSERT = """
+INSERT INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET response = excluded.response, size = excluded.size,
+    created_at = excluded.created_at, accessed_at = excluded.accessed_at
+"""
+SQL_DELETE = "DELETE FROM responses WHERE key = ?"
+SQL_DELETE_EXPIRED = "DELETE FROM responses WHERE created_at < ?"
+SQL_TOTAL_SIZE = "SELECT COALESCE(SUM(size), 0) FROM responses"
+SQL_LEAST_RECENT = "SELECT key, size FROM responses ORDER BY accessed_at"
+
+def normalize_prompt(prompt):
+    """Prompt with line endings and trailing whitespace made uniform (chat messages per message)"""
+    if isinstance(prompt, str):
+        lines = prompt.replace("\r\n", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).strip()
+    return [{"role": message["role"], "content": normalize_prompt(message["content"])} for message in prompt]
+
+def cache_key(model, prompt, settings=None):
+    """Stable hash of model, normalized prompt and settings"""
+    payload = json.dumps(
+        {"model": model, "prompt": normalize_prompt(prompt), "settings": settings or {}},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """In-memory LRU in front of an on-disk SQLite store"""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, memory_entries=DEFAULT_MEMORY_ENTRIES, ttl=DEFAULT_TTL,
+                 max_bytes=DEFAULT_MAX_BYTES, force=False):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.force = force  # Cache sampled (temperature > 0) responses too
+        self.counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0,
+            "stores": 0, "expired": 0, "evicted": 0
+        }
+        self._memory = OrderedDict()  # key -> (response, created_at)
+        self._lock = threading.Lock()  # Memory tier and counters - sessions share the cache across threads
+        self._disk_lock = threading.Lock()  # SQLite connection, held only by disk reads and writes
+
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")  # Parallel test processes share the file
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def caches(self, temperature):
+        """Check if requests at this temperature (None: the provider default) can be cached"""
+        return self.force or (temperature is not None and temperature <= 0)
+
+    def accepts(self, temperature):
+        """Check if a request at this temperature may use the cache (counts bypasses)"""
+        if self.caches(temperature):
+            return True
+        with self._lock:
+            self.counters["bypassed"] += 1
+        return False
+
+    def get(self, key):
+        """Return (response, "memory" or "disk"), or (None, None) on a miss"""
+        entry = self._get_memory(key)
+        return entry if entry is not None else self._get_disk(key)
+
+    async def get_async(self, key):
+        """get() with the disk lookup in a worker thread"""
+        entry = self._get_memory(key)
+        return entry if entry is not None else await asyncio.to_thread(self._get_disk, key)
+
+    def put(self, key, response):
+        """Store a response in both tiers, evicting expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+        self._put_disk(key, response, now)
+
+    async def put_async(self, key, response):
+        """put() with the disk write in a worker thread"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+        await asyncio.to_thread(self._put_disk, key, response, now)
+
+    def _get_memory(self, key):
+        """(response, "memory") from the memory tier, None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[0], "memory"
+            self._memory.pop(key, None)
+        return None
+
+    def _get_disk(self, key):
+        """(response, "disk") from the SQLite tier, (None, None) on a miss"""
+        now = time.time()
+        expired = False
+        with self._disk_lock:
+            row = self._connection.execute(SQL_SELECT, (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._connection.execute(SQL_DELETE, (key,))
+                self._connection.commit()
+                expired = True
+                row = None
+            elif row is not None:
+                self._connection.execute(SQL_TOUCH, (now, key))
+                self._connection.commit()
+
+        with self._lock:
+            self.counters["expired"] += expired
+            if row is None:
+                self.counters["misses"] += 1
+                return None, None
+            self._remember(key, row[0], row[1])
+            self.counters["disk_hits"] += 1
+            return row[0], "disk"
+
+    def _put_disk(self, key, response, now):
+        """Write a response to the SQLite tier (skipped when it alone exceeds max_bytes)"""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._disk_lock:
+            self._connection.execute(SQL_UPSERT, (key, response, size, now, now))
+            expired = self._connection.execute(SQL_DELETE_EXPIRED, (now - self.ttl,)).rowcount
+            evicted = self._evict()
+            self._connection.commit()
+        with self._lock:
+            self.counters["expired"] += expired
+            self.counters["evicted"] += evicted
+            self.counters["stores"] += 1
+
+    def _remember(self, key, response, created_at):
+        """Add to the memory tier, dropping its least recently used entry when full"""
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Delete least recently used disk entries until the store fits max_bytes, returns how many"""
+        excess = self._connection.execute(SQL_TOTAL_SIZE).fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return 0
+        victims = []
+        for key, size in self._connection.execute(SQL_LEAST_RECENT):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._connection.executemany(SQL_DELETE, victims)
+        return len(victims)
+
+    def stats(self):
+        """Hit/miss counters plus the hit rate of the requests that used the cache"""
+        with self._lock:
+            stats = dict(self.counters, memory_entries=len(self._memory))
+        stats["hit_rate"] = _hit_rate(stats)
+        return stats
+
+    def summary(self):
+        """One-line description of the counters"""
+        return format_stats(self.stats())
+
+    def close(self):
+        """Close the disk store"""
+        with self._disk_lock:
+            self._connection.close()
+
+def _hit_rate(stats):
+    """Share of the cache lookups that were answered from either tier"""
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    return round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+
+def format_stats(stats):
+    """One-line description of stats() counters (e.g. summed over several processes)"""
+    return (f"{stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, {stats['misses']} misses "
+            f"(hit rate {_hit_rate(stats):.0%}), {stats['bypassed']} bypassed, {stats['evicted']} evicted")
+
+def create_response_cache(mode, path=DEFAULT_CACHE_FILE):
+    """Create a cache by mode - None/'off' returns None, 'on' caches temperature 0, 'force' caches everything"""
+    if mode in (None, "", "off"):
+        return None
+    if mode in ("on", "force"):
+        return ResponseCache(path, force=mode == "force")
+    raise ValueError(f"Unknown response cache mode: {mode}")
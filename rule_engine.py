@@ -0,0 +1,202 @@
+"""
+Rule engine for data/actions.json
+
+Every action in actions.json carries machine-readable "conditions". They
+are compiled once per version of the file into plain Python predicates, so
+checking a user's data record against all actions is a handful of dict
+lookups. All conditions of an action must hold. Supported conditions:
+
+    always_recommend / fallback_recommendation   always true (fallback ranks last)
+    bmi_over_<N>                                  BMI above N
+    bmi_outside: [low, high]                      BMI below low or at/above high
+    age_over: N                                   age above N
+    <field>: value or [values]                    field equals / is one of
+    <field>_not: [values]                         field is answered and not one of
+    <field>_less_than: option                     field is an earlier widget option
+    <field>_low / <field>_high: [values]          field is one of (also usable as an indicator)
+    <group>_indicators: [names]                   any named indicator holds
+
+Conditions the engine cannot evaluate make the action ineligible and are
+listed in RuleEngine.unsupported.
+"""
+
+import re
+from prompt_registry import shared_cache, read_json
+from widget_handler import get_widget_registry
+
+ACTIONS_FILE = "data/actions.json"
+RECOMMENDATION_COUNT = 4
+
+# Same tiers as prompts/recommendation_prompt.txt (unlisted actions rank as medium)
+ACTION_PRIORITY = {
+    "quit_smoking": 0, "mammography": 0, "pap_smear": 0, "take_vitamins": 0, "regular_checkup": 0,
+    "drink_water": 1, "movement_break": 1, "mindfulness_break": 1, "screen_curfew": 1,
+    "journaling": 1, "sugar_free_day": 1, "get_sunlight": 1,
+    "weight_tracking": 2, "healthy_eating": 2
+}
+PRIORITY_NAMES = ["high", "medium", "low"]
+
+# Indicators used by specialist conditions that no reminder defines
+INDICATORS = {
+    "bmi_issues": {"bmi_outside": [18.5, 25]},
+    "weight_management_needed": {"bmi_over_25": True},
+    "water_intake_low": {"water_intake_less_than": "7-8 glasses (1400-1600 ml)"}
+}
+
+FALLBACK_CONDITIONS = ("fallback_recommendation",)
+ALWAYS_CONDITIONS = ("always_recommend", "fallback_recommendation")
+
+class RuleEngine:
+    """Compiled actions.json conditions"""
+
+    def __init__(self, config, option_values=None):
+        self.config = config
+        self.option_values = option_values or {}  # field -> widget option values in order
+        self.unsupported = []
+        self.actions = []
+
+        recommendations = config.get("recommendations", {})
+
+        # Reminder conditions on answer lists double as named indicators
+        self.indicators = {}
+        for items in recommendations.values():
+            for action in items:
+                for key, expected in action.get("conditions", {}).items():
+                    if key.endswith(("_low", "_high")) and isinstance(expected, list):
+                        self.indicators.setdefault(key, self._compile(key, expected))
+        for name, conditions in INDICATORS.items():
+            self.indicators[name] = self._compile_all(conditions)
+
+        for category, items in recommendations.items():
+            for order, action in enumerate(items):
+                conditions = action.get("conditions", {})
+                self.actions.append({
+                    "id": action["id"],
+                    "category": category,
+                    "title": action.get("title_en", action.get("title")),
+                    "title_tr": action.get("title"),
+                    "note": action.get("ai_notes_en", ""),
+                    "priority": ACTION_PRIORITY.get(action["id"], 1),
+                    "fallback": any(key in FALLBACK_CONDITIONS for key in conditions),
+                    "specificity": sum(1 for key in conditions if key not in ALWAYS_CONDITIONS),
+                    "order": order,
+                    "checks": [(key, self._compile(key, expected, action["id"])) for key, expected in conditions.items()]
+                })
+
+    def evaluate(self, data, bmi=None, category="reminders"):
+        """Return the eligible actions of a category, best first
+
+        Ranked by priority tier, then by how many conditions the action
+        needed (more specific first), then by file order. Fallback actions
+        come last.
+        """
+        facts = dict(data, bmi=bmi)
+        eligible = []
+        for action in self.actions:
+            if action["category"] != category:
+                continue
+            if all(check(facts) for _, check in action["checks"]):
+                eligible.append(action)
+
+        eligible.sort(key=lambda action: (action["fallback"], action["priority"], -action["specificity"], action["order"]))
+        return [
+            {
+                "id": action["id"],
+                "title": action["title"],
+                "title_tr": action["title_tr"],
+                "note": action["note"],
+                "priority": PRIORITY_NAMES[action["priority"]],
+                "matched": [key for key, _ in action["checks"]]
+            }
+            for action in eligible
+        ]
+
+    def _compile_all(self, conditions, action_id=None):
+        """Predicate that holds when every condition holds"""
+        checks = [self._compile(key, expected, action_id) for key, expected in conditions.items()]
+        return lambda facts: all(check(facts) for check in checks)
+
+    def _compile(self, key, expected, action_id=None):
+        """Turn one condition into a predicate over the facts dict"""
+        if key in ALWAYS_CONDITIONS:
+            return lambda facts: bool(expected)
+
+        bmi_over = re.fullmatch(r'bmi_over_(\d+(?:\.\d+)?)', key)
+        if bmi_over:
+            threshold = float(bmi_over.group(1))
+            return lambda facts: (facts.get("bmi") is not None and facts["bmi"] > threshold) == bool(expected)
+
+        if key == "bmi_outside":
+            low, high = expected
+            return lambda facts: facts.get("bmi") is not None and (facts["bmi"] < low or facts["bmi"] >= high)
+
+        if key == "age_over":
+            return lambda facts: facts.get("age") is not None and facts["age"] > expected
+
+        if key.endswith("_indicators"):
+            names = [name for name in expected if name in self.indicators]
+            self._unsupported(key, [name for name in expected if name not in self.indicators], action_id)
+            indicators = [self.indicators[name] for name in names]
+            return lambda facts: any(indicator(facts) for indicator in indicators)
+
+        if key in self.option_values or key in ("age", "weight", "height"):
+            return self._match(key, expected)
+
+        for suffix in ("_not", "_less_than", "_low", "_high"):
+            field = key[:-len(suffix)]
+            if key.endswith(suffix) and field in self.option_values:
+                if suffix == "_not":
+                    excluded = frozenset(expected if isinstance(expected, list) else [expected])
+                    return lambda facts: facts.get(field) is not None and facts[field] not in excluded
+                if suffix == "_less_than":
+                    ranks = {value: rank for rank, value in enumerate(self.option_values[field])}
+                    if expected not in ranks:
+                        break
+                    limit = ranks[expected]
+                    return lambda facts: facts.get(field) in ranks and ranks[facts[field]] < limit
+                return self._match(field, expected)
+
+        self._unsupported(key, [key], action_id)
+        return lambda facts: False
+
+    def _match(self, field, expected):
+        """Field equals the value, or is one of the values of a list"""
+        allowed = frozenset(expected if isinstance(expected, list) else [expected])
+        return lambda facts: facts.get(field) in allowed
+
+    def _unsupported(self, key, names, action_id):
+        """Remember conditions that cannot be evaluated from the data record"""
+        for name in names:
+            self.unsupported.append(f"{action_id or 'indicator'}: {name}")
+
+def _build_rule_engine(path):
+    """FileCache loader: compile actions.json against the widget option order"""
+    registry = get_widget_registry()
+    option_values = {field: spec["values"] for field, spec in registry.fields.items() if spec["has_options"]}
+    return RuleEngine(read_json(path), option_values)
+
+def get_rule_engine():
+    """Return the shared rule engine, recompiled only when actions.json changes"""
+    return shared_cache.get(ACTIONS_FILE, _build_rule_engine)
+
+def format_candidates(candidates):
+    """Prompt section listing the eligible actions"""
+    lines = ["ELIGIBLE ACTIONS (checked against the user's data by the rule engine, best first - choose from these):"]
+    for rank, candidate in enumerate(candidates, 1):
+        lines.append(f"{rank}. {candidate['id']} ({candidate['priority']}) - {candidate['note']}")
+    return "\n".join(lines)
+
+def offline_response(candidates, language_mode=False):
+    """Raw response text recommending the top candidates, in the LLM response format"""
+    top = candidates[:RECOMMENDATION_COUNT]
+    english = "Thank you for completing the assessment! Based on your answers, here are your recommendations:\n" + \
+        "\n".join(f"• {candidate['title']}" for candidate in top)
+    if language_mode:
+        turkish = "Değerlendirmeyi tamamladığınız için teşekkürler! Yanıtlarınıza göre önerilerimiz:\n" + \
+            "\n".join(f"• {candidate['title_tr']}" for candidate in top)
+        message = f"<english>{english}</english>\n<turkish>{turkish}</turkish>"
+    else:
+        message = english
+
+    actions = "\n".join(f"<action>{candidate['id']}</action>" for candidate in top)
+    return f"{message}\n\n<system_message>\n<recommendations>\n{actions}\n</recommendations>\n</system_message>"
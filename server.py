@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Async multi-session server for Simple Assistant
+
+Hosts many concurrent conversations in one process on a single asyncio
+event loop. Each session runs the same GREETING -> QUESTIONNAIRE ->
+RECOMMENDATIONS flow as app.py through ConversationEngine, and awaits the
+LLM instead of blocking the interpreter.
+
+HTTP API (JSON):
+    GET  /health                      -> server status (and response cache / prefetch counters)
+    POST /sessions                    -> create session ({"profile": {...}, "data": {...}} optional),
+                                         returns greeting events
+    GET  /sessions/<id>               -> session stage and data
+    POST /sessions/<id>/messages      -> {"text": "..."} returns events
+WebSocket:
+    GET  /ws[?session_id=<id>]        -> send {"text": "..."}, receive {"events": [...]} frames
+                                         streamed as they happen (incl. assistant_delta)
+
+Usage:
+    python server.py --llm=stub                 # local stub LLM, no API key needed
+    python server.py --port=8765 --model=gpt-4.1
+    python server.py --llm=stub --offline-recommendations  # rule engine picks the recommendations
+    python server.py --temperature=0 --response-cache      # repeated prompts answered from the cache
+    python server.py --model-routes                        # per-stage models from data/model_routes.json
+    python server.py --session-ttl=300                     # unload sessions idle for 5 minutes
+"""
+
+import sys
+import json
+import time
+import base64
+import asyncio
+import hashlib
+from urllib.parse import urlsplit, parse_qs
+
+from simple_agent import SimpleAgent
+from session import Session, SESSIONS_DIR
+from conversation_engine import ConversationEngine
+from llm_backends import create_backend, CASSETTE_FILE
+from history_manager import HistoryManager
+from storage import create_storage, DEFAULT_DB_FILE
+from response_cache import create_response_cache, DEFAULT_CACHE_FILE
+from prefetch import create_prefetcher, DEFAULT_BUDGET
+from stage_manager import ROUTES_FILE
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY_SIZE = 64 * 1024
+SESSION_TTL = 30 * 60  # Seconds an idle session stays in memory (it is reloaded from disk when used again)
+SWEEP_INTERVAL = 10  # Seconds between eviction sweeps
+
+class SessionRegistry:
+    """Maps session ids to conversation engines, one lock per session
+
+    Finished sessions and sessions idle for longer than session_ttl are
+    evicted (their files closed) by sweep_forever(), which serve() runs;
+    get() loads an evicted session back from disk, including a widget it
+    was waiting on.
+    """
+
+    def __init__(self, agent, sessions_dir=SESSIONS_DIR, debug_mode=False, storage=None, offline_recommendations=False,
+                 local_extraction=False, widget_chain=False, prefetcher=None, routes_file=None, session_ttl=SESSION_TTL):
+        self.agent = agent
+        self.sessions_dir = sessions_dir
+        self.storage = storage
+        self.debug_mode = debug_mode
+        self.offline_recommendations = offline_recommendations
+        self.local_extraction = local_extraction
+        self.widget_chain = widget_chain
+        self.prefetcher = prefetcher  # Shared by all sessions (one budget and one set of counters)
+        self.routes_file = routes_file
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.locks = {}
+        self.last_used = {}  # Session id -> monotonic time of the last get()
+
+    def create(self, profile=None, data=None):
+        """Create a new session with its own data files"""
+        session = Session.create(profile=profile, data=data, sessions_dir=self.sessions_dir)
+        return session.session_id, self._register(session)
+
+    def get(self, session_id):
+        """Return (engine, lock) for a session id, loading it from disk if needed"""
+        if session_id and session_id not in self.sessions and Session.exists(session_id, self.sessions_dir):
+            self._register(Session.load(session_id, self.sessions_dir, storage=self.storage))
+        if session_id in self.sessions:
+            self.last_used[session_id] = time.monotonic()
+        return self.sessions.get(session_id), self.locks.get(session_id)
+
+    def evict_idle(self, now=None):
+        """Evict finished sessions and those idle past the TTL, returns how many were evicted"""
+        now = time.monotonic() if now is None else now
+        expired = [
+            session_id for session_id, engine in self.sessions.items()
+            if not self.locks[session_id].locked()  # A request is running (or waiting) on it
+            and (engine.is_complete() or now - self.last_used[session_id] > self.session_ttl)
+        ]
+        for session_id in expired:
+            self.evict(session_id)
+        return len(expired)
+
+    async def sweep_forever(self, interval=SWEEP_INTERVAL):
+        """Evict finished and idle sessions every interval seconds (until cancelled)"""
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if self.debug_mode and evicted:
+                print(f"[DEBUG] - Evicted {evicted} sessions, {len(self.sessions)} in memory")
+
+    def evict(self, session_id):
+        """Drop a session from memory and close its files"""
+        engine = self.sessions.pop(session_id)
+        del self.locks[session_id]
+        del self.last_used[session_id]
+        engine.close()
+
+    def _register(self, session):
+        """Build the engine for a session - the agent fork shares the LLM client"""
+        engine = ConversationEngine(self.agent.fork(session), session, debug_mode=self.debug_mode, storage=self.storage,
+                                    offline_recommendations=self.offline_recommendations,
+                                    local_extraction=self.local_extraction, widget_chain=self.widget_chain,
+                                    prefetcher=self.prefetcher, routes_file=self.routes_file)
+        self.sessions[session.session_id] = engine
+        self.locks[session.session_id] = asyncio.Lock()
+        self.last_used[session.session_id] = time.monotonic()
+        return engine
+
+class AssistantServer:
+    """Minimal HTTP/1.1 + WebSocket server built on asyncio streams"""
+
+    def __init__(self, registry, debug_mode=False):
+        self.registry = registry
+        self.debug_mode = debug_mode
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP requests on one connection (keep-alive) or upgrade to WebSocket"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(reader, writer, path, headers)
+                    break
+
+                status, payload = await self._route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._send_json(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            if self.debug_mode:
+                print(f"[DEBUG] - Connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Read one HTTP request, returns (method, path, headers, body) or None"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            return None
+        method, path = parts[0].upper(), parts[1]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY_SIZE:
+            raise ConnectionError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        return method, path, headers, body
+
+    async def _route(self, method, path, body):
+        """Dispatch an HTTP request, returns (status, payload)"""
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+
+        if method == "GET" and parts == ["health"]:
+            health = {"status": "ok", "sessions": len(self.registry.sessions)}
+            if self.registry.agent.response_cache is not None:
+                health["response_cache"] = self.registry.agent.response_cache.stats()
+            if self.registry.prefetcher is not None:
+                health["prefetch"] = self.registry.prefetcher.stats()
+            return 200, health
+
+        if method == "POST" and parts == ["sessions"]:
+            try:
+                options = json.loads(body or b"{}")
+                session_id, engine = self.registry.create(options.get("profile"), options.get("data"))
+            except (ValueError, AttributeError):
+                return 400, {"error": "Body must be a JSON object with optional 'profile' and 'data'"}
+            _, lock = self.registry.get(session_id)
+            async with lock:
+                events = await engine.start()
+            return 201, {"session_id": session_id, "events": events}
+
+        if len(parts) >= 2 and parts[0] == "sessions":
+            engine, lock = self.registry.get(parts[1])
+            if engine is None:
+                return 404, {"error": f"Unknown session: {parts[1]}"}
+
+            if method == "GET" and len(parts) == 2:
+                return 200, self._session_state(parts[1], engine)
+
+            if method == "POST" and parts[2:] == ["messages"]:
+                try:
+                    text = json.loads(body or b"{}").get("text", "")
+                except (ValueError, AttributeError):
+                    return 400, {"error": "Body must be a JSON object with a 'text' field"}
+                async with lock:
+                    events = await engine.submit(str(text))
+                return 200, {"session_id": parts[1], "events": events}
+
+        return 404, {"error": f"No route for {method} {path}"}
+
+    def _session_state(self, session_id, engine):
+        """Summarize a session for GET /sessions/<id>"""
+        return {
+            "session_id": session_id,
+            "stage": engine.stage_manager.get_current_stage(),
+            "complete": engine.is_complete(),
+            "pending_widget": engine.pending_widget,
+            "profile": engine.stage_manager._load_profile_data(),
+            "data": engine.data_manager.load_data()
+        }
+
+    async def _send_json(self, writer, status, payload, keep_alive=True):
+        """Write a JSON HTTP response"""
+        reasons = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found"}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _handle_websocket(self, reader, writer, path, headers):
+        """Complete the WebSocket handshake and run the session message loop"""
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+
+        # Resume an existing session or start a new one
+        session_id = parse_qs(urlsplit(path).query).get("session_id", [None])[0]
+        engine, lock = self.registry.get(session_id)
+        if engine is None:
+            session_id, engine = self.registry.create()
+            _, lock = self.registry.get(session_id)
+            async with lock:
+                events = await engine.start()
+        else:
+            events = [{"type": "resumed", **self._session_state(session_id, engine)}]
+        await self._send_ws_json(writer, {"session_id": session_id, "events": events})
+
+        while True:
+            message = await self._read_ws_message(reader, writer)
+            if message is None:
+                break
+
+            try:
+                text = json.loads(message).get("text", "")
+            except (ValueError, AttributeError):
+                text = message  # Plain text frames are accepted as the message itself
+
+            # Stream events to the client as the engine produces them
+            def emit(event):
+                writer.write(self._ws_frame(0x1, json.dumps(
+                    {"session_id": session_id, "events": [event]}, ensure_ascii=False
+                ).encode("utf-8")))
+
+            # Looked up per message: an idle session may have been evicted (and reloaded) meanwhile
+            engine, lock = self.registry.get(session_id)
+            async with lock:
+                await engine.submit(str(text), emit=emit)
+            await writer.drain()
+
+        await self._send_ws_frame(writer, 0x8, b"")
+
+    async def _read_ws_message(self, reader, writer):
+        """Read one (possibly fragmented) text message, answering pings; None on close"""
+        fragments = []
+        while True:
+            header = await reader.readexactly(2)
+            fin = header[0] & 0x80
+            opcode = header[0] & 0x0F
+            masked = header[1] & 0x80
+            length = header[1] & 0x7F
+
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), "big")
+            if length > MAX_BODY_SIZE:
+                return None
+
+            mask = await reader.readexactly(4) if masked else b""
+            payload = await reader.readexactly(length)
+            if masked:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            if opcode == 0x8:  # Close
+                return None
+            if opcode == 0x9:  # Ping
+                await self._send_ws_frame(writer, 0xA, payload)
+                continue
+            if opcode == 0xA:  # Pong
+                continue
+
+            fragments.append(payload)
+            if fin:
+                return b"".join(fragments).decode("utf-8")
+
+    async def _send_ws_json(self, writer, payload):
+        """Send a JSON text frame"""
+        await self._send_ws_frame(writer, 0x1, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    async def _send_ws_frame(self, writer, opcode, payload):
+        """Send a single unmasked frame (server to client)"""
+        writer.write(self._ws_frame(opcode, payload))
+        await writer.drain()
+
+    def _ws_frame(self, opcode, payload):
+        """Encode a single unmasked frame"""
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        return header + payload
+
+async def serve(host, port, registry, debug_mode=False):
+    """Start the server and run until cancelled"""
+    server = AssistantServer(registry, debug_mode)
+    listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_BODY_SIZE)
+
+    print(f"🌐 Simple Assistant server listening on http://{host}:{port} (WebSocket: ws://{host}:{port}/ws)")
+    sweeper = asyncio.create_task(registry.sweep_forever())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        sweeper.cancel()
+
+def main():
+    """Parse command line flags and run the server"""
+    debug_mode = "--debug" in sys.argv
+    language_mode = "--language" in sys.argv
+    chat_mode = "--chat-messages" in sys.argv
+    offline_recommendations = "--offline-recommendations" in sys.argv
+    local_extraction = "--local-extraction" in sys.argv
+    widget_chain = "--widget-chain" in sys.argv
+
+    host = "127.0.0.1"
+    port = 8765
+    model = "gpt-4.1"
+    llm = "openai"
+    llm_latency = 0.0
+    cassette_file = CASSETTE_FILE
+    history_budget = None
+    storage_name = "json"
+    db_file = DEFAULT_DB_FILE
+    temperature = None
+    response_cache_mode = "on" if "--response-cache" in sys.argv else None
+    response_cache_file = DEFAULT_CACHE_FILE
+    prefetch_mode = "all" if "--prefetch" in sys.argv else None
+    prefetch_budget = DEFAULT_BUDGET
+    routes_file = ROUTES_FILE if "--model-routes" in sys.argv else None
+    session_ttl = SESSION_TTL
+    for arg in sys.argv:
+        if arg.startswith("--host="):
+            host = arg.split("=")[1]
+        elif arg.startswith("--port="):
+            port = int(arg.split("=")[1])
+        elif arg.startswith("--model="):
+            model = arg.split("=")[1]
+        elif arg.startswith("--llm="):
+            llm = arg.split("=")[1]
+        elif arg.startswith("--llm-latency="):
+            llm_latency = float(arg.split("=")[1])
+        elif arg.startswith("--cassette="):
+            cassette_file = arg.split("=")[1]
+        elif arg.startswith("--history-budget="):
+            history_budget = int(arg.split("=")[1])
+        elif arg.startswith("--storage="):
+            storage_name = arg.split("=")[1]
+        elif arg.startswith("--db="):
+            db_file = arg.split("=")[1]
+        elif arg.startswith("--temperature="):
+            temperature = float(arg.split("=")[1])
+        elif arg.startswith("--response-cache="):
+            response_cache_mode = arg.split("=")[1]
+        elif arg.startswith("--response-cache-file="):
+            response_cache_file = arg.split("=")[1]
+        elif arg.startswith("--prefetch="):
+            prefetch_mode = arg.split("=")[1]
+        elif arg.startswith("--prefetch-budget="):
+            prefetch_budget = int(arg.split("=")[1])
+        elif arg.startswith("--model-routes="):
+            routes_file = arg.split("=")[1]
+        elif arg.startswith("--session-ttl="):
+            session_ttl = float(arg.split("=")[1])
+
+    agent = SimpleAgent(
+        debug_mode=debug_mode,
+        language_mode=language_mode,
+        model=model,
+        backend=create_backend(llm, latency=llm_latency, cassette=cassette_file, model=model),
+        chat_mode=chat_mode,
+        history_manager=HistoryManager(token_budget=history_budget) if history_budget else None,
+        temperature=temperature,
+        response_cache=create_response_cache(response_cache_mode, response_cache_file)
+    )
+    registry = SessionRegistry(agent, debug_mode=debug_mode, storage=create_storage(storage_name, db_file),
+                               offline_recommendations=offline_recommendations, local_extraction=local_extraction,
+                               widget_chain=widget_chain, prefetcher=create_prefetcher(prefetch_mode, prefetch_budget),
+                               routes_file=routes_file, session_ttl=session_ttl)
+
+    try:
+        asyncio.run(serve(host, port, registry, debug_mode))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped")
+    finally:
+        if registry.prefetcher is not None:
+            registry.prefetcher.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Session-scoped state for Simple Assistant
+
+A session maps a session id to its own data record, profile, conversation
+history, recommendations and stage. Every session lives in its own
+directory (data/sessions/<session_id>/), so concurrent conversations in
+one process or across processes never write the same file.
+
+The default session keeps using the original data/*.json files, which is
+what app.py and test.py use unless --session is given.
+"""
+
+import os
+import re
+import json
+import uuid
+from conversation_log import read_history
+
+SESSIONS_DIR = "data/sessions"
+TEMPLATE_DATA_FILE = "data/data.json"
+DEFAULT_PROFILE = {"name": None, "user_type": "new"}
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+class Session:
+    """File locations and conversation state for one conversation session"""
+
+    def __init__(self, session_id, directory=None):
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id}")
+
+        self.session_id = session_id
+        self.directory = directory
+
+        if directory is None:
+            # Default session: the original shared data files
+            self.data_file = "data/data.json"
+            self.profile_file = "data/profile.json"
+            self.history_file = "data/conversation_history.json"
+            self.recommendations_file = "data/recommendations.json"
+            self.metrics_file = "data/metrics.jsonl"
+            self.log_file = "data/conversation_log.jsonl"
+            self.state_file = None
+        else:
+            self.data_file = os.path.join(directory, "data.json")
+            self.profile_file = os.path.join(directory, "profile.json")
+            self.history_file = os.path.join(directory, "conversation_history.json")
+            self.recommendations_file = os.path.join(directory, "recommendations.json")
+            self.metrics_file = os.path.join(directory, "metrics.jsonl")
+            self.log_file = os.path.join(directory, "conversation_log.jsonl")
+            self.state_file = os.path.join(directory, "session.json")
+
+        # Conversation state (persisted to session.json for non-default sessions)
+        self.stage = "GREETING"
+        self.conversation_turn = 0
+        self.recommendations_generated = False
+        self.last_asking = None
+        # Widget waiting for an answer: {"field", "turn": [user_input, response, command_results]}
+        self.pending_widget = None
+        self.resumed = False
+
+        # LLM-facing history used by SimpleAgent
+        self.conversation_history = []
+
+    @classmethod
+    def default(cls):
+        """The single shared session backed by data/*.json"""
+        return cls("default")
+
+    @classmethod
+    def create(cls, session_id=None, profile=None, data=None, sessions_dir=SESSIONS_DIR):
+        """Create a new session directory seeded from the data template"""
+        session_id = session_id or uuid.uuid4().hex
+        session = cls(session_id, os.path.join(sessions_dir, session_id))
+        os.makedirs(session.directory, exist_ok=True)
+
+        # Seed the record with the field structure of the template, all null
+        with open(TEMPLATE_DATA_FILE, 'r') as f:
+            record = {key: None for key in json.load(f).keys()}
+        if data:
+            record.update({key: value for key, value in data.items() if key in record})
+
+        _write_json(session.data_file, record)
+        _write_json(session.profile_file, {**DEFAULT_PROFILE, **(profile or {})})
+        session.save_state()
+        return session
+
+    @classmethod
+    def load(cls, session_id, sessions_dir=SESSIONS_DIR, storage=None):
+        """Load an existing session (possibly created by another process)"""
+        session = cls(session_id, os.path.join(sessions_dir, session_id))
+        if not os.path.exists(session.state_file):
+            raise FileNotFoundError(f"Session not found: {session_id}")
+
+        with open(session.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        session.stage = state.get("stage", "GREETING")
+        session.conversation_turn = state.get("conversation_turn", 0)
+        session.recommendations_generated = state.get("recommendations_generated", False)
+        session.last_asking = state.get("last_asking")
+        session.pending_widget = state.get("pending_widget")
+        session.resumed = True
+
+        # Rebuild the LLM history from the saved turns
+        if storage is not None:
+            turns = storage.load_turns(session_id)
+        else:
+            turns = read_history(session.log_file, legacy_file=session.history_file)["turns"]
+        for turn in turns:
+            session.conversation_history.append({"role": "user", "message": turn["user_input"]})
+            commands = turn.get("system_commands") or {}
+            session.conversation_history.append({
+                "role": "assistant",
+                "message": turn["assistant_response"],
+                "asking": commands.get("asking"),
+                "updated": [update["field"] for update in commands.get("updates", [])]
+            })
+
+        return session
+
+    @classmethod
+    def exists(cls, session_id, sessions_dir=SESSIONS_DIR):
+        """Check if a session id has state on disk"""
+        if not SESSION_ID_PATTERN.match(session_id or ""):
+            return False
+        return os.path.exists(os.path.join(sessions_dir, session_id, "session.json"))
+
+    def save_state(self):
+        """Persist stage information (no-op for the default session)"""
+        if self.state_file is None:
+            return
+
+        _write_json(self.state_file, {
+            "session_id": self.session_id,
+            "stage": self.stage,
+            "conversation_turn": self.conversation_turn,
+            "recommendations_generated": self.recommendations_generated,
+            "last_asking": self.last_asking,
+            "pending_widget": self.pending_widget
+        })
+
+def _write_json(path, payload):
+    """Write JSON through a temp file so readers never see a partial file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
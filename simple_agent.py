@@ -1,60 +1,198 @@
 import os
+import copy
+import time
 import textwrap
 import asyncio
+import threading
+from types import SimpleNamespace
+import httpx
+import openai
 import semantic_kernel as sk
 from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
 from semantic_kernel.connectors.ai.open_ai import OpenAIChatPromptExecutionSettings
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.contents import ChatHistory
 from dotenv import load_dotenv
 import text_parser
+from prompt_registry import get_prompt, preload_prompts
+from llm_backends import prompt_text
+from history_manager import estimate_tokens
+from response_cache import cache_key
+from metrics import token_cost
 
 # Load environment variables
 load_dotenv()
 
+# Connection pool shared by every agent (and every session) in the process
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+class LLMLoop:
+    """A long-lived event loop in a background thread that runs every LLM call
+    
+    Keeping one loop alive keeps the pooled HTTP connections alive with it, so
+    turns reuse warm keep-alive connections instead of reconnecting.
+    """
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        self.thread.start()
+    
+    def _is_current(self):
+        """Check if the caller is already running on the LLM loop"""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    def run(self, coro):
+        """Run a coroutine on the LLM loop and block until it finishes (sync callers)"""
+        if self._is_current():
+            raise RuntimeError("LLMLoop.run() cannot block the LLM loop itself, await run_async() instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+    
+    async def run_async(self, coro):
+        """Await a coroutine on the LLM loop from any other event loop"""
+        if self._is_current():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+    
+    async def iterate(self, agen):
+        """Consume an async generator on the LLM loop, yielding its items to the caller's loop"""
+        if self._is_current():
+            async for item in agen:
+                yield item
+            return
+        
+        caller = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+        
+        async def pump():
+            try:
+                async for item in agen:
+                    caller.call_soon_threadsafe(queue.put_nowait, (item, None))
+                caller.call_soon_threadsafe(queue.put_nowait, (done, None))
+            except Exception as e:
+                caller.call_soon_threadsafe(queue.put_nowait, (done, e))
+        
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+_llm_loop = None
+_http_clients = {}
+_shared_lock = threading.Lock()
+_route_lock = threading.Lock()  # Guards the per-model services and settings of routed calls
+
+def get_llm_loop():
+    """Return the process-wide LLM loop, starting it on first use"""
+    global _llm_loop
+    with _shared_lock:
+        if _llm_loop is None:
+            _llm_loop = LLMLoop()
+        return _llm_loop
+
+def get_openai_client(api_key, base_url=None):
+    """Return the shared AsyncOpenAI client (one keep-alive pool per key and endpoint)"""
+    key = (api_key, base_url)
+    with _shared_lock:
+        if key not in _http_clients:
+            _http_clients[key] = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=httpx.AsyncClient(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT)
+            )
+        return _http_clients[key]
+
 class SimpleAgent:
     """Simple agent for basic LLM conversation using Semantic Kernel"""
     
-    def __init__(self, debug_mode=False, prompt_mode=False, language_mode=False, model="gpt-4.1"):
+    def __init__(self, debug_mode=False, prompt_mode=False, language_mode=False, model="gpt-4.1", backend=None, session=None, chat_mode=False, history_manager=None, temperature=None, response_cache=None):
+        # A local backend (e.g. the stub responder) replaces the OpenAI service entirely,
+        # a wrapping backend (record) still calls it
+        self.backend = backend
+        uses_service = backend is None or getattr(backend, "wraps_service", False)
         self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        self.base_url = os.getenv("OPENAI_BASE_URL") or None  # e.g. a local OpenAI-compatible endpoint
+        if not self.api_key and uses_service:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
         print(f"📦 Initializing SimpleAgent with model: {model}")
         self.model = model
-        self.system_prompt = self._load_system_prompt()
-        self.language_prompt = self._load_language_prompt() if language_mode else ""
-        self.conversation_history = []
+        preload_prompts()
+        # Session-owned history lets one process serve many conversations
+        self.conversation_history = session.conversation_history if session is not None else []
         self.debug_mode = debug_mode
+        self.last_stream_timing = None
+        self.last_usage = None
+        self.last_metrics = None
         self.prompt_mode = prompt_mode
         self.language_mode = language_mode
+        # Chat mode sends role-structured messages with a stable prefix (provider prompt caching)
+        self.chat_mode = chat_mode
+        # Optional token budget for the history sent with each prompt (None sends it all)
+        self.history_manager = history_manager
+        # Sampling temperature (None uses the provider default)
+        self.temperature = temperature
+        # Optional cache of raw responses, shared by forks (None always calls the LLM)
+        self.response_cache = response_cache
+        self.last_cache = None
+        if response_cache is not None and not response_cache.caches(temperature):
+            print("⚠️  Response cache: calls at the provider default temperature are not cached - "
+                  "pass --temperature=0 or --response-cache=force (routes with temperature 0 are still cached)")
+        # Speculative calls for the next turn, launched while a widget is open (see prefetch.py)
+        self.speculation = None
+        self.last_prefetch = None
+        # Execution settings per routed (model, temperature, max tokens), shared by forks like the kernel
+        self._route_settings = {}
         
-        # Initialize semantic kernel
-        self.kernel = self._setup_kernel()
+        # Initialize semantic kernel (not needed when a local backend answers)
+        self.kernel = self._setup_kernel() if uses_service else None
         self.execution_settings = self._setup_execution_settings()
         
         if self.debug_mode:
-            print(f"[DEBUG] - Using Semantic Kernel with model: {self.model}")
+            if backend is None:
+                print(f"[DEBUG] - Using Semantic Kernel with model: {self.model}")
+            else:
+                print(f"[DEBUG] - Using local LLM backend: {backend.name}")
     
-    def _load_system_prompt(self):
-        """Load system prompt from file"""
-        with open("prompts/system_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+    def fork(self, session=None):
+        """Create an agent for another conversation that shares this agent's LLM client"""
+        agent = copy.copy(self)
+        agent.conversation_history = session.conversation_history if session is not None else []
+        agent.speculation = None
+        return agent
     
-    def _load_language_prompt(self):
-        """Load language prompt instructions for dual language mode"""
-        with open("prompts/language_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+    @property
+    def system_prompt(self):
+        """System prompt from the shared prompt registry"""
+        return get_prompt("system_prompt")
+    
+    @property
+    def language_prompt(self):
+        """Language prompt instructions for dual language mode"""
+        return get_prompt("language_prompt") if self.language_mode else ""
     
     def _setup_kernel(self):
         """Setup semantic kernel with OpenAI service"""
         kernel = sk.Kernel()
         
-        # Add OpenAI chat completion service
+        # Add OpenAI chat completion service on the shared pooled client
         chat_service = OpenAIChatCompletion(
             ai_model_id=self.model,
-            api_key=self.api_key,
-            service_id="openai"
+            service_id="openai",
+            async_client=get_openai_client(self.api_key, self.base_url)
         )
         kernel.add_service(chat_service)
         
@@ -62,17 +200,69 @@ class SimpleAgent:
     
     def _setup_execution_settings(self):
         """Setup execution settings for semantic kernel"""
-        return OpenAIChatPromptExecutionSettings(
+        settings = OpenAIChatPromptExecutionSettings(
             function_choice_behavior=FunctionChoiceBehavior.Auto()
         )
+        if self.temperature is not None:
+            settings.temperature = self.temperature
+        return settings
+    
+    @property
+    def model_name(self):
+        """Model answering the calls - the backend name for local backends"""
+        return self.model if self.kernel is not None else self.backend.name
+    
+    def _routed(self, route):
+        """(model, temperature, max tokens) of a call - the route's values, falling back to the agent's"""
+        route = route or {}
+        temperature = route["temperature"] if route.get("temperature") is not None else self.temperature
+        return route.get("model") or self.model, temperature, route.get("max_tokens")
+    
+    def _call_settings(self, route):
+        """(service id, execution settings) of a call, None settings when the service defaults apply
+        
+        Every routed model gets one chat service on the shared pooled client,
+        added to the kernel the first time a route sends to it.
+        """
+        if route is None:
+            return "openai", self.execution_settings if self.temperature is not None else None
+        
+        model, temperature, max_tokens = self._routed(route)
+        key = (model, temperature, max_tokens)
+        with _route_lock:
+            if key not in self._route_settings:
+                service_id = "openai" if model == self.model else model
+                if service_id not in self.kernel.services:
+                    self.kernel.add_service(OpenAIChatCompletion(
+                        ai_model_id=model,
+                        service_id=service_id,
+                        async_client=get_openai_client(self.api_key, self.base_url)
+                    ))
+                settings = OpenAIChatPromptExecutionSettings(
+                    service_id=service_id,
+                    function_choice_behavior=FunctionChoiceBehavior.Auto()
+                )
+                if temperature is not None:
+                    settings.temperature = temperature
+                if max_tokens is not None:
+                    settings.max_tokens = max_tokens
+                self._route_settings[key] = (service_id, settings)
+            return self._route_settings[key]
+    
+    def _history_for_prompt(self):
+        """Return (history entries to send, summary of compacted turns or None)"""
+        if self.history_manager is None:
+            return self.conversation_history, None
+        return self.history_manager.select(self.conversation_history)
     
     def _format_conversation_history(self):
         """Format conversation history for prompt"""
         if not self.conversation_history:
             return "The conversation hasn't started yet."
         
-        lines = []
-        for entry in self.conversation_history:
+        entries, summary = self._history_for_prompt()
+        lines = [summary] if summary else []
+        for entry in entries:
             lines.append(f"{entry['role'].capitalize()}: {entry['message']}")
         
         return "\n".join(lines)
@@ -105,18 +295,197 @@ class SimpleAgent:
         
         return full_prompt
     
-    def ask(self, user_input, stage_context, profile_and_data_context):
-        """Ask the agent with user input and stage context"""
-        full_prompt = self._build_full_prompt(user_input, stage_context, profile_and_data_context)
+    def _build_chat_messages(self, user_input, stage_context, profile_and_data_context):
+        """Build role-structured messages ordered from most to least stable
+        
+        The system prompt, language prompt and stage prompt only change at a
+        stage transition and past turns are append-only, so every turn shares
+        the previous turn's prefix. The volatile profile and data status go
+        last, right before the new user input.
+        """
+        static_parts = [self.system_prompt, self.language_prompt if self.language_mode else "", stage_context]
+        messages = [{"role": "system", "content": "\n\n".join(part for part in static_parts if part)}]
+        
+        entries, summary = self._history_for_prompt()
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        for entry in entries:
+            messages.append({"role": entry["role"], "content": entry["message"]})
+        
+        messages.append({"role": "system", "content": profile_and_data_context})
+        messages.append({"role": "user", "content": user_input})
+        
+        if self.prompt_mode:
+            print(f"[PROMPT] - Chat messages being sent to model:")
+            print("=" * 50)
+            for message in messages:
+                print(f"--- {message['role']} ---")
+                print(message["content"])
+            print("=" * 50)
+        
+        return messages
+    
+    def _build_request(self, user_input, stage_context, profile_and_data_context):
+        """Build the LLM request - chat messages in chat mode, otherwise the flat prompt"""
+        if self.chat_mode:
+            return self._build_chat_messages(user_input, stage_context, profile_and_data_context)
+        return self._build_full_prompt(user_input, stage_context, profile_and_data_context)
+    
+    def ask(self, user_input, stage_context, profile_and_data_context, route=None):
+        """Ask the agent with user input and stage context (route: model settings from StageManager.get_route)"""
+        start_time = time.perf_counter()
+        full_prompt = self._build_request(user_input, stage_context, profile_and_data_context)
+        prompt_time = time.perf_counter()
+        
+        # Runs on the shared LLM loop, the sync call just waits for it
+        raw_response = self._ask_with_semantic_kernel(full_prompt, route)
+        llm_time = time.perf_counter()
+        
+        result = self._record_exchange(user_input, raw_response)
+        self._set_metrics(full_prompt, raw_response, prompt_time - start_time, llm_time - prompt_time,
+                          time.perf_counter() - llm_time, route=route)
+        return result
+    
+    async def ask_async(self, user_input, stage_context, profile_and_data_context, route=None):
+        """Ask the agent without blocking the running event loop (server mode)"""
+        start_time = time.perf_counter()
+        full_prompt = self._build_request(user_input, stage_context, profile_and_data_context)
+        prompt_time = time.perf_counter()
         
-        # Use semantic kernel with async-to-sync wrapper
-        raw_response = self._ask_with_semantic_kernel(full_prompt)
+        raw_response = await get_llm_loop().run_async(self._complete_async(full_prompt, route))
+        llm_time = time.perf_counter()
         
-        parsed = text_parser.parse_response(raw_response)
+        result = self._record_exchange(user_input, raw_response)
+        self._set_metrics(full_prompt, raw_response, prompt_time - start_time, llm_time - prompt_time,
+                          time.perf_counter() - llm_time, route=route)
+        return result
+    
+    def ask_stream(self, user_input, stage_context, profile_and_data_context, on_text=None, on_event=None, route=None):
+        """Ask the agent and stream the user-facing text to on_text as tokens arrive
+        
+        System commands are passed to on_event the moment their closing tag
+        arrives. Returns the same parsed dict as ask() once the response is complete.
+        """
+        return get_llm_loop().run(self.ask_stream_async(user_input, stage_context, profile_and_data_context, on_text, on_event,
+                                                        route))
+    
+    async def ask_stream_async(self, user_input, stage_context, profile_and_data_context, on_text=None, on_event=None,
+                               route=None):
+        """Streaming variant of ask_async - the <system_message> block is never passed to on_text"""
+        build_start = time.perf_counter()
+        full_prompt = self._build_request(user_input, stage_context, profile_and_data_context)
+        parser = text_parser.StreamingParser()
+        display_filter = text_parser.StreamDisplayFilter()
+        
+        chunks = []
+        start_time = time.perf_counter()
+        first_token_time = None
+        parse_seconds = 0.0
+        async for chunk in get_llm_loop().iterate(self._stream_async(full_prompt, route)):
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            chunks.append(chunk)
+            
+            parse_start = time.perf_counter()
+            events = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - parse_start
+            for event in events:
+                if event["type"] == "text":
+                    display_text = display_filter.feed(event["text"])
+                    if display_text and on_text:
+                        on_text(display_text)
+                elif on_event:
+                    on_event(event)
+        
+        display_text = display_filter.close()
+        parse_start = time.perf_counter()
+        parsed = parser.close()
+        parse_seconds += time.perf_counter() - parse_start
+        if display_text and on_text:
+            on_text(display_text)
+        
+        # Timing of the last streamed response, reported by the caller in debug mode
+        total_seconds = time.perf_counter() - start_time
+        self.last_stream_timing = {
+            "ttft_ms": (first_token_time - start_time) * 1000 if first_token_time else None,
+            "total_ms": total_seconds * 1000
+        }
+        
+        raw_response = "".join(chunks).strip()
+        result = self._record_exchange(user_input, raw_response, parsed)
+        self._set_metrics(full_prompt, raw_response, start_time - build_start, total_seconds - parse_seconds,
+                          parse_seconds, self.last_stream_timing["ttft_ms"], route)
+        return result
+    
+    def respond_locally(self, user_input, raw_response, source="rule_engine"):
+        """Record a response produced without an LLM call (e.g. rule engine recommendations)"""
+        start_time = time.perf_counter()
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+        result = self._record_exchange(user_input, raw_response)
+        self.last_usage = None
+        self.last_cache = None
+        self.last_prefetch = None
+        self.last_metrics = {
+            "model": source,
+            "llm_ms": 0.0,
+            "parse_ms": (time.perf_counter() - start_time) * 1000,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "token_source": "local"
+        }
+        return result
+    
+    def _set_metrics(self, request, raw_response, prompt_build_seconds, llm_seconds, parse_seconds, ttft_ms=None, route=None):
+        """Keep the step timings and token counts of the last call for the turn metrics
+        
+        Routed calls also report the route, its model and the cost at the
+        model's price (estimated tokens on local backends, so stub runs
+        still price a route table).
+        """
+        metrics = {
+            "model": self.model_name,
+            "prompt_build_ms": prompt_build_seconds * 1000,
+            "llm_ms": llm_seconds * 1000,
+            "ttft_ms": ttft_ms,
+            "parse_ms": parse_seconds * 1000,
+            "response_cache": self.last_cache,
+            "prefetch": self.last_prefetch
+        }
+        
+        if self.last_usage:
+            metrics.update(self.last_usage, token_source="usage")
+        else:
+            # Local backends report no usage - estimate it
+            metrics.update(
+                prompt_tokens=estimate_tokens(prompt_text(request)),
+                completion_tokens=estimate_tokens(raw_response),
+                token_source="estimate"
+            )
+        if route is not None:
+            metrics.update(route=route["label"], route_model=self._routed(route)[0])
+            if self.kernel is not None:
+                metrics["model"] = metrics["route_model"]
+            if route.get("price"):
+                metrics["cost_usd"] = token_cost(route["price"], metrics["prompt_tokens"], metrics["completion_tokens"],
+                                                 metrics.get("cached_tokens", 0))
+        self.last_metrics = metrics
+    
+    def _record_exchange(self, user_input, raw_response, parsed=None):
+        """Parse the raw response and store the exchange in conversation history"""
+        if parsed is None:
+            parsed = text_parser.parse_response(raw_response)
         
         # Store in conversation history
         self.conversation_history.append({"role": "user", "message": user_input})
-        self.conversation_history.append({"role": "assistant", "message": parsed["user_message"]})
+        self.conversation_history.append({
+            "role": "assistant",
+            "message": parsed["user_message"],
+            # Fields touched by the turn let the history manager compact it later
+            "asking": parsed["system_commands"]["asking"],
+            "updated": [update["field"] for update in parsed["system_commands"]["updates"]]
+        })
         
         return {
             "user_message": parsed["user_message"],
@@ -124,19 +493,178 @@ class SimpleAgent:
             "raw_response": raw_response
         }
     
-    def _ask_with_semantic_kernel(self, prompt):
-        """Use semantic kernel to get response (async wrapped in sync)"""
-        async def _async_ask():
-            # Create kernel arguments
-            arguments = KernelArguments()
-            
-            # Invoke the kernel with the prompt directly
-            result = await self.kernel.invoke_prompt(
-                prompt=prompt,
-                arguments=arguments
+    def _cache_key(self, prompt, route=None):
+        """Response cache key for a prompt, None when the call must not use the cache"""
+        self.last_cache = None
+        if self.response_cache is None:
+            return None
+        model, temperature, max_tokens = self._routed(route)
+        if not self.response_cache.accepts(temperature):
+            self.last_cache = "bypass"
+            return None
+        settings = {"temperature": temperature, "backend": self.backend.name if self.backend is not None else "openai"}
+        if max_tokens is not None:
+            settings["max_tokens"] = max_tokens
+        return cache_key(model if self.kernel is not None else self.model_name, prompt, settings)
+    
+    async def _take_prefetched(self, prompt, route=None):
+        """Response of the speculative call for exactly this prompt and model, None if there is none (or it failed)"""
+        speculation, self.speculation = self.speculation, None
+        self.last_prefetch = None
+        if speculation is None:
+            return None
+        
+        future = speculation.take(prompt, self._routed(route)[0])
+        self.last_prefetch = "hit" if future is not None else "miss"
+        if future is None:
+            return None
+        try:
+            response, self.last_usage, self.last_cache, duration = await asyncio.wrap_future(future)
+        except Exception:
+            self.last_prefetch = "failed"
+            return None
+        speculation.saved_ms(duration)
+        return response
+    
+    async def _complete_async(self, prompt, route=None):
+        """Get the raw completion for a prompt (or chat messages) from a prefetch, the cache, the backend or semantic kernel"""
+        self.last_usage = None
+        prefetched = await self._take_prefetched(prompt, route)
+        if prefetched is not None:
+            return prefetched
+        
+        key = self._cache_key(prompt, route)
+        if key is not None:
+            cached, tier = await self.response_cache.get_async(key)
+            self.last_cache = tier or "miss"
+            if cached is not None:
+                return cached
+        
+        # Backends key recordings by the model the call is routed to
+        if self.backend is not None and self.kernel is not None:
+            response = (await self.backend.complete(prompt, service=self._service(route), model=self._routed(route)[0])).strip()
+        elif self.backend is not None:
+            response = (await self.backend.complete(prompt, model=self._routed(route)[0])).strip()
+        else:
+            response = await self._service_complete_async(prompt, route)
+        
+        if key is not None:
+            await self.response_cache.put_async(key, response)
+        return response
+    
+    async def _stream_async(self, prompt, route=None):
+        """Yield raw completion text chunks from a prefetch, the cache, the backend or semantic kernel"""
+        self.last_usage = None
+        prefetched = await self._take_prefetched(prompt, route)
+        if prefetched is not None:
+            yield prefetched
+            return
+        
+        key = self._cache_key(prompt, route)
+        if key is not None:
+            cached, tier = await self.response_cache.get_async(key)
+            self.last_cache = tier or "miss"
+            if cached is not None:
+                yield cached
+                return
+        
+        if self.backend is not None and self.kernel is not None:
+            chunks = self.backend.stream(prompt, service=self._service(route), model=self._routed(route)[0])
+        elif self.backend is not None:
+            chunks = self.backend.stream(prompt, model=self._routed(route)[0])
+        else:
+            chunks = self._service_stream_async(prompt, route)
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        
+        if key is not None:
+            await self.response_cache.put_async(key, "".join(parts).strip())
+    
+    def _service(self, route=None):
+        """This agent's semantic kernel calls, for backends that wrap the OpenAI service"""
+        return SimpleNamespace(complete=lambda prompt: self._service_complete_async(prompt, route),
+                               stream=lambda prompt: self._service_stream_async(prompt, route))
+    
+    async def _service_complete_async(self, prompt, route=None):
+        """Get the raw completion from semantic kernel (on the route's model service)"""
+        service_id, settings = self._call_settings(route)
+        if isinstance(prompt, list):
+            message = await self.kernel.get_service(service_id).get_chat_message_content(
+                self._to_chat_history(prompt), settings or self.execution_settings, kernel=self.kernel
             )
-            
-            return str(result).strip()
+            self._record_usage(message)
+            return str(message).strip()
+        
+        # Create kernel arguments (the execution settings only when they change the defaults)
+        arguments = KernelArguments(settings=settings) if settings is not None else KernelArguments()
+        
+        # Invoke the kernel with the prompt directly
+        result = await self.kernel.invoke_prompt(
+            prompt=prompt,
+            arguments=arguments
+        )
+        if isinstance(result.value, list) and result.value:
+            self._record_usage(result.value[0])
         
-        # Run async function synchronously
-        return asyncio.run(_async_ask())
\ No newline at end of file
+        return str(result).strip()
+    
+    async def _service_stream_async(self, prompt, route=None):
+        """Yield raw completion text chunks from semantic kernel (on the route's model service)"""
+        service_id, settings = self._call_settings(route)
+        if isinstance(prompt, list):
+            stream = self.kernel.get_service(service_id).get_streaming_chat_message_content(
+                self._to_chat_history(prompt), settings or self.execution_settings, kernel=self.kernel
+            )
+            async for message in stream:
+                if message is None:
+                    continue
+                self._record_usage(message)  # Usage arrives with the final chunk
+                text = str(message)
+                if text:
+                    yield text
+            return
+        
+        arguments = KernelArguments(settings=settings) if settings is not None else KernelArguments()
+        async for messages in self.kernel.invoke_prompt_stream(prompt=prompt, arguments=arguments):
+            # Each streamed item is a list of message content chunks
+            if not isinstance(messages, list):
+                continue
+            for message in messages:
+                self._record_usage(message)  # Usage arrives with the final chunk
+            text = "".join(str(message) for message in messages)
+            if text:
+                yield text
+    
+    def _to_chat_history(self, messages):
+        """Convert role/content dicts to a semantic kernel ChatHistory"""
+        chat_history = ChatHistory()
+        for message in messages:
+            if message["role"] == "system":
+                chat_history.add_system_message(message["content"])
+            elif message["role"] == "assistant":
+                chat_history.add_assistant_message(message["content"])
+            else:
+                chat_history.add_user_message(message["content"])
+        return chat_history
+    
+    def _record_usage(self, message):
+        """Keep prompt/completion token usage of the last call, split into cached and uncached"""
+        usage = (message.metadata or {}).get("usage")
+        if usage is None or usage.prompt_tokens is None:
+            return
+        
+        details = usage.prompt_tokens_details
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        self.last_usage = {
+            "prompt_tokens": usage.prompt_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": usage.prompt_tokens - cached,
+            "completion_tokens": usage.completion_tokens
+        }
+    
+    def _ask_with_semantic_kernel(self, prompt, route=None):
+        """Use semantic kernel to get response (async wrapped in sync)"""
+        # Reuse the long-lived loop so pooled connections survive between turns
+        return get_llm_loop().run(self._complete_async(prompt, route))
\ No newline at end of file
@@ -1,54 +1,96 @@
-import json
 from data_manager import DataManager
+from prompt_registry import shared_cache, get_prompt, read_json
+from rule_engine import format_candidates
+from numeric_extractor import NUMERIC_FIELDS
+from widget_handler import is_widget_field
+
+# Per-stage model, max tokens and temperature (plus per asked field type and model prices)
+ROUTES_FILE = "data/model_routes.json"
+
+def field_type(field):
+    """Route type of an asked field: numeric, widget or text"""
+    if field in NUMERIC_FIELDS:
+        return "numeric"
+    return "widget" if is_widget_field(field) else "text"
 
 class StageManager:
     """Manages conversation stages and transitions"""
     
-    def __init__(self, debug_mode=False):
-        self.data_manager = DataManager()
+    def __init__(self, debug_mode=False, data_manager=None, session=None, routes_file=None):
+        self.session = session
+        self.data_manager = data_manager or DataManager(session=session)
         self.debug_mode = debug_mode
+        self.routes_file = routes_file  # None sends every turn to the agent's model
         self.current_stage = "GREETING"
         self.conversation_turn = 0
         self.recommendations_generated = False
+        self.profile_file = session.profile_file if session is not None else "data/profile.json"
+        
+        # Resume the stage of a session loaded from disk
+        if session is not None:
+            self.current_stage = session.stage
+            self.conversation_turn = session.conversation_turn
+            self.recommendations_generated = session.recommendations_generated
         
         
     def get_current_stage(self):
         """Get the current conversation stage"""
         return self.current_stage
         
-    def get_current_stage_context(self):
-        """Get stage-specific context for prompt building"""
-        if self.current_stage == "GREETING":
+    def get_current_stage_context(self, stage=None):
+        """Get stage-specific context for prompt building (of the current stage, or the given one)"""
+        stage = stage or self.current_stage
+        if stage == "GREETING":
             return self._get_greeting_context()
-        elif self.current_stage == "QUESTIONNAIRE":
+        elif stage == "QUESTIONNAIRE":
             return self._get_questionnaire_context()
-        elif self.current_stage == "RECOMMENDATIONS":
+        elif stage == "RECOMMENDATIONS":
             return self._get_recommendations_context()
         else:
-            raise ValueError(f"Unknown stage: {self.current_stage}")
+            raise ValueError(f"Unknown stage: {stage}")
+    
+    def get_route(self, asking=None, stage=None):
+        """Model settings for the next LLM call, None when routing is off
+        
+        The stage's route applies, overridden in the questionnaire by the
+        route of the field being answered (asking) - by field name first,
+        then by type. Returns {"label", "model", "max_tokens", "temperature",
+        "price"}; a missing value falls back to the agent's setting.
+        """
+        if self.routes_file is None:
+            return None
+        table = shared_cache.get(self.routes_file, read_json)
+        stage = stage or self.current_stage
+        
+        route = dict(table.get("stages", {}).get(stage, {}), label=stage)
+        fields = table.get("fields", {})
+        if stage == "QUESTIONNAIRE" and asking:
+            key = asking if asking in fields else field_type(asking)
+            if key in fields:
+                route.update(fields[key], label=f"{stage}/{key}")
+        route["price"] = table.get("prices", {}).get(route.get("model"))
+        return route
     
     def _load_profile_data(self):
-        """Load profile data from profile.json"""
+        """Load profile data from profile.json (cached until the file changes)"""
+        if self.data_manager.storage is not None:
+            return self.data_manager.load_profile(self.profile_file)
         try:
-            with open("data/profile.json", "r") as f:
-                return json.load(f)
+            return dict(shared_cache.get(self.profile_file, read_json))
         except FileNotFoundError:
             return {"name": None, "user_type": "new"}
     
     def _get_greeting_context(self):
         """Load greeting context - single prompt handles both new and returning users"""
-        with open("prompts/greeting_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+        return get_prompt("greeting_prompt")
     
     def _get_questionnaire_context(self):
         """Load questionnaire context"""
-        with open("prompts/questionnaire_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+        return get_prompt("questionnaire_prompt")
     
     def _get_recommendations_context(self):
         """Load recommendations context"""
-        with open("prompts/recommendation_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+        return get_prompt("recommendation_prompt")
     
     def update_stage(self, response):
         """Update stage based on response and data status"""
@@ -82,6 +124,27 @@ class StageManager:
             self.recommendations_generated = True
             if self.debug_mode:
                 print(f"[DEBUG] - Recommendations generated")
+        
+        self._save_session_state()
+    
+    def next_stage(self, data=None):
+        """Stage the next update_stage() moves to if the data record looks like this"""
+        if self.current_stage == "GREETING":
+            return "QUESTIONNAIRE"
+        if self.current_stage == "QUESTIONNAIRE":
+            data = data if data is not None else self.data_manager.load_data()
+            return "RECOMMENDATIONS" if all(value is not None for value in data.values()) else "QUESTIONNAIRE"
+        return self.current_stage
+    
+    def _save_session_state(self):
+        """Mirror the stage into the session so it can be resumed by any process"""
+        if self.session is None:
+            return
+        
+        self.session.stage = self.current_stage
+        self.session.conversation_turn = self.conversation_turn
+        self.session.recommendations_generated = self.recommendations_generated
+        self.session.save_state()
     
     def needs_user_input(self):
         """Determine if current stage requires user input"""
@@ -102,10 +165,14 @@ class StageManager:
         # Conversation is complete only after recommendations have actually been generated
         return self.current_stage == "RECOMMENDATIONS" and self.recommendations_generated
     
-    def get_profile_and_data_context(self):
-        """Get combined profile and data context for prompt building"""
+    def get_profile_and_data_context(self, data=None, stage=None):
+        """Get combined profile and data context for prompt building
+        
+        data and stage default to the session's; prefetch passes the record
+        and stage of a turn that has not happened yet.
+        """
         profile = self._load_profile_data()
-        data_status = self.data_manager.get_data_status()
+        data_status = self.data_manager.get_data_status(data)
         
         context_parts = []
         
@@ -117,4 +184,8 @@ class StageManager:
         # Add data status
         context_parts.append(f"CURRENT DATA STATUS:\n{data_status}")
         
+        # Candidate actions for the recommendation turn, checked locally against the data
+        if (stage or self.current_stage) == "RECOMMENDATIONS":
+            context_parts.append(format_candidates(self.data_manager.eligible_actions(data)))
+        
         return "\n\n".join(context_parts)
\ No newline at end of file
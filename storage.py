@@ -0,0 +1,299 @@
+"""
+Storage backends for DataManager
+
+The JSON files (data/*.json and the JSONL conversation log) stay the
+default storage and need no backend object. SQLiteStorage keeps the same
+information in one SQLite database:
+
+    users            profile per user
+    sessions         session -> user, created/updated timestamps
+    field_values     per-session health data fields
+    turns            conversation turns
+    recommendations  final recommendation records
+
+The database runs in WAL mode so readers never block the writer, and
+connections come from a small pool so concurrent sessions (server mode)
+do not share one connection. All statements are fixed SQL strings with
+parameters, which sqlite3 prepares once per connection and caches.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+DEFAULT_DB_FILE = "data/simple_assistant.db"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_USER_ID = "default"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id     TEXT PRIMARY KEY,
+    profile     TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  TEXT PRIMARY KEY,
+    user_id     TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+
+CREATE TABLE IF NOT EXISTS field_values (
+    session_id  TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    field       TEXT NOT NULL,
+    value       TEXT,
+    updated_at  TEXT NOT NULL,
+    PRIMARY KEY (session_id, field)
+);
+
+CREATE TABLE IF NOT EXISTS turns (
+    turn_id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id         TEXT NOT NULL,
+    turn_number        INTEGER NOT NULL,
+    timestamp          TEXT NOT NULL,
+    user_input         TEXT,
+    assistant_response TEXT,
+    system_commands    TEXT,
+    stage              TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_turns_timestamp ON turns (timestamp);
+
+CREATE TABLE IF NOT EXISTS recommendations (
+    recommendation_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id             TEXT NOT NULL,
+    user_id                TEXT NOT NULL,
+    timestamp              TEXT NOT NULL,
+    user_data              TEXT NOT NULL,
+    recommendation_message TEXT,
+    top_4_actions          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recommendations_session ON recommendations (session_id);
+CREATE INDEX IF NOT EXISTS idx_recommendations_user ON recommendations (user_id);
+CREATE INDEX IF NOT EXISTS idx_recommendations_timestamp ON recommendations (timestamp);
+"""
+
+# One row per turn number - databases created before the unique index may hold
+# duplicates from racing writers, which are renumbered in insertion order first
+SQL_HAS_TURN_INDEX = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_turns_session_turn'"
+SQL_RENUMBER_DUPLICATE_TURNS = """
+UPDATE turns SET turn_number = (
+    SELECT COUNT(*) FROM turns AS earlier
+    WHERE earlier.session_id = turns.session_id AND earlier.turn_id <= turns.turn_id
+)
+WHERE session_id IN (SELECT session_id FROM turns GROUP BY session_id, turn_number HAVING COUNT(*) > 1)
+"""
+TURN_INDEX_SCHEMA = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_turns_session_turn ON turns (session_id, turn_number);
+DROP INDEX IF EXISTS idx_turns_session;
+"""
+
+# Prepared statements (cached per connection by sqlite3)
+SQL_UPSERT_USER = """
+INSERT INTO users (user_id, profile, created_at, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET profile = excluded.profile, updated_at = excluded.updated_at
+"""
+SQL_SELECT_USER = "SELECT profile FROM users WHERE user_id = ?"
+SQL_INSERT_SESSION = """
+INSERT INTO sessions (session_id, user_id, created_at, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (session_id) DO NOTHING
+"""
+SQL_TOUCH_SESSION = "UPDATE sessions SET updated_at = ? WHERE session_id = ?"
+SQL_SELECT_SESSION_USER = "SELECT user_id FROM sessions WHERE session_id = ?"
+SQL_SELECT_FIELDS = "SELECT field, value FROM field_values WHERE session_id = ? ORDER BY position"
+SQL_UPSERT_FIELD = """
+INSERT INTO field_values (session_id, position, field, value, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (session_id, field) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+"""
+SQL_MAX_TURN = "SELECT COALESCE(MAX(turn_number), 0) FROM turns WHERE session_id = ?"
+SQL_INSERT_TURN = """
+INSERT INTO turns (session_id, turn_number, timestamp, user_input, assistant_response, system_commands, stage)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_TURNS = """
+SELECT turn_number, timestamp, user_input, assistant_response, system_commands, stage
+FROM turns WHERE session_id = ? ORDER BY turn_number
+"""
+SQL_INSERT_RECOMMENDATION = """
+INSERT INTO recommendations (session_id, user_id, timestamp, user_data, recommendation_message, top_4_actions)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_LATEST_RECOMMENDATION = """
+SELECT timestamp, user_data, recommendation_message, top_4_actions FROM recommendations
+WHERE session_id = ? ORDER BY timestamp DESC, recommendation_id DESC LIMIT 1
+"""
+
+def _now():
+    return datetime.now().isoformat()
+
+class SQLiteStorage:
+    """Profiles, field values, turns and recommendations in a SQLite database"""
+
+    name = "sqlite"
+
+    def __init__(self, path=DEFAULT_DB_FILE, pool_size=DEFAULT_POOL_SIZE):
+        self.path = path
+        self._pool = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.pool_size = pool_size
+
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+            if connection.execute(SQL_HAS_TURN_INDEX).fetchone() is None:
+                connection.execute(SQL_RENUMBER_DUPLICATE_TURNS)
+                connection.executescript(TURN_INDEX_SCHEMA)
+
+    def _connect(self):
+        """Open one pooled connection configured for concurrent use"""
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a connection; commits on success, rolls back on error"""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            connection = self._connect() if create else self._pool.get()
+
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            self._pool.put(connection)
+
+    def close(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+    # Users and sessions
+
+    def ensure_session(self, session_id, user_id=DEFAULT_USER_ID):
+        """Register a session for a user (no-op if it exists)"""
+        now = _now()
+        with self._connection() as connection:
+            connection.execute(SQL_INSERT_SESSION, (session_id, user_id, now, now))
+
+    def session_user(self, session_id):
+        """User id that owns a session"""
+        with self._connection() as connection:
+            row = connection.execute(SQL_SELECT_SESSION_USER, (session_id,)).fetchone()
+        return row[0] if row else DEFAULT_USER_ID
+
+    def save_profile(self, user_id, profile):
+        """Store a user's profile"""
+        now = _now()
+        with self._connection() as connection:
+            connection.execute(SQL_UPSERT_USER, (user_id, json.dumps(profile, ensure_ascii=False), now, now))
+
+    def load_profile(self, user_id):
+        """Return a user's profile, or None"""
+        with self._connection() as connection:
+            row = connection.execute(SQL_SELECT_USER, (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Field values
+
+    def load_fields(self, session_id):
+        """Return the session's data record in field order (empty dict if none)"""
+        with self._connection() as connection:
+            rows = connection.execute(SQL_SELECT_FIELDS, (session_id,)).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def save_fields(self, session_id, data):
+        """Store the session's data record in one transaction"""
+        now = _now()
+        rows = [
+            (session_id, position, field, json.dumps(value, ensure_ascii=False), now)
+            for position, (field, value) in enumerate(data.items())
+        ]
+        with self._connection() as connection:
+            connection.executemany(SQL_UPSERT_FIELD, rows)
+            connection.execute(SQL_TOUCH_SESSION, (now, session_id))
+
+    # Turns
+
+    def append_turn(self, session_id, turn):
+        """Append a turn, numbering it after the session's last turn"""
+        with self._connection() as connection:
+            # Take the write lock before reading MAX(turn_number) so concurrent appends cannot reuse it
+            connection.execute("BEGIN IMMEDIATE")
+            turn_number = connection.execute(SQL_MAX_TURN, (session_id,)).fetchone()[0] + 1
+            connection.execute(SQL_INSERT_TURN, (
+                session_id, turn_number, turn["timestamp"], turn["user_input"], turn["assistant_response"],
+                json.dumps(turn["system_commands"], ensure_ascii=False), turn["stage"]
+            ))
+            connection.execute(SQL_TOUCH_SESSION, (turn["timestamp"], session_id))
+        return {"turn_number": turn_number, **turn}
+
+    def load_turns(self, session_id):
+        """Return the session's turns in the conversation_history.json shape"""
+        with self._connection() as connection:
+            rows = connection.execute(SQL_SELECT_TURNS, (session_id,)).fetchall()
+        return [
+            {
+                "turn_number": turn_number,
+                "timestamp": timestamp,
+                "user_input": user_input,
+                "assistant_response": assistant_response,
+                "system_commands": json.loads(system_commands) if system_commands else None,
+                "stage": stage
+            }
+            for turn_number, timestamp, user_input, assistant_response, system_commands, stage in rows
+        ]
+
+    # Recommendations
+
+    def save_recommendation(self, session_id, record, user_id=None):
+        """Store a recommendation record"""
+        user_id = user_id or self.session_user(session_id)
+        with self._connection() as connection:
+            connection.execute(SQL_INSERT_RECOMMENDATION, (
+                session_id, user_id, record["timestamp"],
+                json.dumps(record["user_data"], ensure_ascii=False),
+                record["recommendation_message"],
+                json.dumps(record["top_4_actions"], ensure_ascii=False)
+            ))
+
+    def load_recommendation(self, session_id):
+        """Return the session's latest recommendation record, or None"""
+        with self._connection() as connection:
+            row = connection.execute(SQL_SELECT_LATEST_RECOMMENDATION, (session_id,)).fetchone()
+        if row is None:
+            return None
+        timestamp, user_data, message, actions = row
+        return {
+            "timestamp": timestamp,
+            "user_data": json.loads(user_data),
+            "recommendation_message": message,
+            "top_4_actions": json.loads(actions)
+        }
+
+def create_storage(name, path=DEFAULT_DB_FILE):
+    """Create a storage backend by name - 'json' returns None (use the JSON files)"""
+    if name in (None, "", "json"):
+        return None
+    if name == "sqlite":
+        return SQLiteStorage(path)
+    raise ValueError(f"Unknown storage backend: {name}")
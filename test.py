@@ -4,12 +4,20 @@ Simple test runner - Just pipe inputs to the existing app
 No code changes needed to the main system
 """
 
+import io
 import json
+import asyncio
 import sys
 import os
+import time
+import shutil
+import contextlib
 import subprocess
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import tempfile
+from conversation_log import read_history
+from session import Session
 
 def load_test_scenarios():
     """Load test scenarios from test.json"""
@@ -22,8 +30,12 @@ def load_test_scenarios():
         data = json.load(f)
     return data.get("test_scenarios", [])
 
-def setup_test_data(scenario):
-    """Setup test data - reset data.json and apply existing_data"""
+def setup_test_data(scenario, workspace=None):
+    """Setup test data - reset data.json and apply existing_data
+    
+    With a workspace directory the data goes into a new session there
+    instead of data/data.json. Returns (start data, session or None).
+    """
     existing_data = scenario.get("existing_data", {})
     
     # Load current data.json to get the field structure
@@ -37,15 +49,22 @@ def setup_test_data(scenario):
     clean_data.update(existing_data)
     
     # Save the clean starting state
-    with open("data/data.json", 'w') as f:
-        json.dump(clean_data, f, indent=2)
+    session = None
+    if workspace is None:
+        with open("data/data.json", 'w') as f:
+            json.dump(clean_data, f, indent=2)
+    else:
+        # Same profile as the shared run, so prompts match
+        with open(Session.default().profile_file, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        session = Session.create("scenario", profile=profile, data=clean_data, sessions_dir=workspace)
     
     if existing_data:
         print(f"    📋 Pre-filled {len(existing_data)} fields: {list(existing_data.keys())}")
     else:
         print(f"    📋 Starting with clean slate (all fields null)")
     
-    return clean_data
+    return clean_data, session
 
 
 # Test configuration constants
@@ -55,6 +74,7 @@ FALLBACK_INPUTS = {
     "RECOMMENDATIONS": "thank you"
 }
 INPUT_PROCESSING_DELAY = 0.5
+LOCAL_BACKENDS = ("stub", "replay")  # No API calls - inputs are sent without the processing delay
 MAX_INPUTS = 30
 
 class InputResponder:
@@ -92,6 +112,8 @@ class TestRunner:
         self.verbose = verbose
         self.extra_flags = extra_flags or []
         self.responder = InputResponder(scenario)
+        local_backend = any(f"--llm={name}" in self.extra_flags for name in LOCAL_BACKENDS)
+        self.input_delay = 0.0 if local_backend else INPUT_PROCESSING_DELAY
         self.conversation_completed = False
         self.all_stdout = ""
     
@@ -185,7 +207,7 @@ class TestRunner:
             process.stdin.write(f"{input_to_send}\n")
             process.stdin.flush()
             self.responder.input_count += 1
-            time.sleep(INPUT_PROCESSING_DELAY)
+            time.sleep(self.input_delay)
             return True
         except BrokenPipeError:
             if self.verbose:
@@ -234,12 +256,158 @@ def run_app_with_intelligent_inputs(scenario, verbose=False, extra_flags=None):
     runner = TestRunner(scenario, verbose, extra_flags)
     return runner.run()
 
-def evaluate_test(scenario):
+# One agent per test process, forked per scenario (shares the LLM client)
+_test_agents = {}
+# One prefetcher per test process (one budget and one set of counters for the suite)
+_test_prefetchers = {}
+
+def _flag_value(flags, prefix, default=None):
+    """Value of a --name=value flag"""
+    for flag in flags:
+        if flag.startswith(prefix):
+            return flag.split("=", 1)[1]
+    return default
+
+def create_test_agent(extra_flags):
+    """SimpleAgent configured from the app.py flags the suite was given"""
+    from simple_agent import SimpleAgent
+    from llm_backends import create_backend, CASSETTE_FILE
+    from history_manager import HistoryManager
+    from response_cache import create_response_cache, DEFAULT_CACHE_FILE
+    
+    key = tuple(extra_flags)
+    if key not in _test_agents:
+        model = _flag_value(extra_flags, "--model=", "gpt-4.1")
+        history_budget = _flag_value(extra_flags, "--history-budget=")
+        temperature = _flag_value(extra_flags, "--temperature=")
+        response_cache_mode = _flag_value(extra_flags, "--response-cache=", "on" if "--response-cache" in extra_flags else None)
+        backend = create_backend(
+            _flag_value(extra_flags, "--llm=", "openai"),
+            latency=float(_flag_value(extra_flags, "--llm-latency=", 0.0)),
+            cassette=_flag_value(extra_flags, "--cassette=", CASSETTE_FILE),
+            model=model
+        )
+        _test_agents[key] = SimpleAgent(
+            debug_mode="--debug" in extra_flags,
+            prompt_mode="--full-prompt" in extra_flags,
+            language_mode="--language" in extra_flags,
+            model=model,
+            backend=backend,
+            chat_mode="--chat-messages" in extra_flags,
+            history_manager=HistoryManager(token_budget=int(history_budget)) if history_budget else None,
+            temperature=float(temperature) if temperature is not None else None,
+            response_cache=create_response_cache(response_cache_mode, _flag_value(extra_flags, "--response-cache-file=", DEFAULT_CACHE_FILE))
+        )
+    return _test_agents[key]
+
+def create_test_prefetcher(extra_flags):
+    """Prefetcher configured from --prefetch[=K] and --prefetch-budget=, None when prefetch is off"""
+    from prefetch import create_prefetcher, DEFAULT_BUDGET
+    
+    mode = _flag_value(extra_flags, "--prefetch=", "all" if "--prefetch" in extra_flags else None)
+    budget = int(_flag_value(extra_flags, "--prefetch-budget=", DEFAULT_BUDGET))
+    if (mode, budget) not in _test_prefetchers:
+        _test_prefetchers[(mode, budget)] = create_prefetcher(mode, budget)
+    return _test_prefetchers[(mode, budget)]
+
+class InProcessRunner:
+    """Drives ConversationEngine directly: turn in, events out
+    
+    No subprocess, no stdout markers and no sleeps - the next input is
+    chosen from the events of the previous turn, and widgets are answered
+    through the engine's widget_answer callback.
+    """
+    
+    def __init__(self, scenario, session, verbose=False, extra_flags=None):
+        self.scenario = scenario
+        self.session = session
+        self.verbose = verbose
+        self.extra_flags = extra_flags or []
+        self.responder = InputResponder(scenario)
+        self.transcript = []
+    
+    def run(self):
+        """Run the conversation, returning (transcript, errors, return code) like TestRunner.run"""
+        try:
+            asyncio.run(self._run())
+            return "\n".join(self.transcript) + "\n", "", 0
+        except Exception as e:
+            return "\n".join(self.transcript) + "\n", f"Test failed: {e}", 1
+    
+    async def _run(self):
+        """Feed inputs until the conversation completes or MAX_INPUTS is reached"""
+        from conversation_engine import ConversationEngine
+        from stage_manager import ROUTES_FILE
+        
+        agent = create_test_agent(self.extra_flags).fork(self.session)
+        engine = ConversationEngine(
+            agent, self.session, debug_mode="--debug" in self.extra_flags,
+            offline_recommendations="--offline-recommendations" in self.extra_flags,
+            local_extraction="--local-extraction" in self.extra_flags,
+            widget_chain="--widget-chain" in self.extra_flags,
+            prefetcher=create_test_prefetcher(self.extra_flags),
+            routes_file=_flag_value(self.extra_flags, "--model-routes=", ROUTES_FILE if "--model-routes" in self.extra_flags else None),
+            widget_answer=self._answer_widget
+        )
+        
+        # With --stream every LLM turn is streamed; the deltas go to the callback, the other events are returned too
+        emit = (lambda event: None) if "--stream" in self.extra_flags else None
+        try:
+            events = await engine.start(emit=emit)
+            while True:
+                self._record_events(events)
+                if engine.is_complete() or self.responder.input_count >= MAX_INPUTS:
+                    return
+                
+                # The last event says what the conversation is waiting for
+                waiting = next((event for event in reversed(events) if event["type"] in ("input_needed", "widget")), None)
+                if waiting is None:
+                    return
+                stage = waiting.get("stage", "QUESTIONNAIRE")
+                events = await engine.submit(self._next_input(stage, waiting.get("field") or "NONE"), emit=emit)
+        finally:
+            engine.close()
+    
+    def _answer_widget(self, field, question, options):
+        """widget_answer callback - pick the scenario's option for the field"""
+        return self._next_input("QUESTIONNAIRE", field)
+    
+    def _next_input(self, stage, field):
+        """Choose and log the next input"""
+        input_to_send, message = self.responder.select_input_for_field(stage, field)
+        self.responder.input_count += 1
+        
+        if self.verbose:
+            print(f"\n[TEST INPUT] {message}")
+            print(f"[TEST INPUT] 📤 Sending: {input_to_send}")
+        else:
+            print(f"    {message}")
+            print(f"    📤 Input {self.responder.input_count}: {input_to_send}")
+        self.transcript.append(f"👤 User: {input_to_send}")
+        return input_to_send
+    
+    def _record_events(self, events):
+        """Add the conversation events to the transcript (shown in verbose mode)"""
+        for event in events:
+            if event["type"] == "assistant_message":
+                line = f"🤖 Assistant: {event['text']}"
+            elif event["type"] == "recommendations":
+                line = f"📋 Recommendations: {', '.join(event['actions'])}"
+            elif event["type"] == "error":
+                line = f"⚠️ {event['message']}"
+            else:
+                continue
+            self.transcript.append(line)
+            if self.verbose:
+                print(line)
+
+def evaluate_test(scenario, session=None):
     """Evaluate test result - compare actual vs expected"""
-    if not os.path.exists("data/data.json"):
+    session = session or Session.default()
+    if not os.path.exists(session.data_file):
         return False, [{"error": "No final data found"}], {}
     
-    with open("data/data.json", 'r') as f:
+    with open(session.data_file, 'r') as f:
         final_data = json.load(f)
     
     expected_data = scenario.get("expected_result", {})
@@ -280,38 +448,38 @@ def print_test_summary(test_num, scenario, test_passed, mismatches, final_data,
     
     print(f"    Data: {pre_filled}→{filled_fields}/{total_fields} fields")
 
-def _load_session_files():
+def _load_session_files(session=None):
     """Load recommendations and simplified conversation history from session files"""
+    session = session or Session.default()
+    
     # Load recommendations if available
     recommendations = None
-    if os.path.exists("data/recommendations.json"):
+    if os.path.exists(session.recommendations_file):
         try:
-            with open("data/recommendations.json", 'r', encoding='utf-8') as f:
+            with open(session.recommendations_file, 'r', encoding='utf-8') as f:
                 recommendations = json.load(f)
         except Exception:
             recommendations = None
     
-    # Load and simplify conversation history if available
+    # Load and simplify conversation history (latest session of the log) if available
     simplified_conversation = []
-    if os.path.exists("data/conversation_history.json"):
-        try:
-            with open("data/conversation_history.json", 'r', encoding='utf-8') as f:
-                full_history = json.load(f)
-                turns = full_history.get('turns', [])
-                
-                # Extract just user_input and assistant_response pairs
-                for turn in turns:
-                    if turn.get('user_input') and turn.get('assistant_response'):
-                        simplified_conversation.append({
-                            "user_input": turn['user_input'],
-                            "assistant_response": turn['assistant_response']
-                        })
-        except Exception:
-            simplified_conversation = []
+    try:
+        full_history = read_history(session.log_file, legacy_file=session.history_file)
+        turns = full_history.get('turns', [])
+        
+        # Extract just user_input and assistant_response pairs
+        for turn in turns:
+            if turn.get('user_input') and turn.get('assistant_response'):
+                simplified_conversation.append({
+                    "user_input": turn['user_input'],
+                    "assistant_response": turn['assistant_response']
+                })
+    except Exception:
+        simplified_conversation = []
     
     return recommendations, simplified_conversation
 
-def save_test_result(scenario, final_data, test_passed, mismatches, stdout, stderr):
+def save_test_result(scenario, final_data, test_passed, mismatches, stdout, stderr, session=None):
     """Save test result to .test_results directory"""
     results_dir = "eval/.test_results"
     os.makedirs(results_dir, exist_ok=True)
@@ -319,7 +487,7 @@ def save_test_result(scenario, final_data, test_passed, mismatches, stdout, stde
     test_name = scenario['name'].replace(' ', '_').lower()
     
     # Load session files
-    recommendations, simplified_conversation = _load_session_files()
+    recommendations, simplified_conversation = _load_session_files(session)
     
     test_result = {
         "test_info": {
@@ -359,13 +527,17 @@ def save_test_result(scenario, final_data, test_passed, mismatches, stdout, stde
     status = "✅ PASS" if test_passed else "❌ FAIL"
     print(f"    💾 Test result saved: {result_file} ({status})")
 
-def run_test_scenario(scenario, test_number=None, verbose=False, extra_flags=None):
-    """Run a single test scenario"""
+def run_test_scenario(scenario, test_number=None, verbose=False, extra_flags=None, workspace=None, in_process=False):
+    """Run a single test scenario (in its own session when a workspace directory is given)
+    
+    in_process drives ConversationEngine directly; otherwise app.py runs as
+    a subprocess fed through its stdout markers.
+    """
     print(f"\n🧪 Running: {scenario['name']}")
     
     try:
         # Setup test data
-        start_data = setup_test_data(scenario)
+        start_data, session = setup_test_data(scenario, workspace)
         
         # Show available inputs for this scenario
         inputs_provided = scenario.get("inputs", {})
@@ -377,7 +549,13 @@ def run_test_scenario(scenario, test_number=None, verbose=False, extra_flags=Non
             print(f"    🚩 Extra flags: {' '.join(extra_flags)}")
         
         # Run the app with intelligent input selection
-        stdout, stderr, returncode = run_app_with_intelligent_inputs(scenario, verbose, extra_flags)
+        if in_process:
+            stdout, stderr, returncode = InProcessRunner(scenario, session, verbose, extra_flags).run()
+        else:
+            app_flags = list(extra_flags or [])
+            if session is not None:
+                app_flags += [f"--session={session.session_id}", f"--sessions-dir={workspace}"]
+            stdout, stderr, returncode = run_app_with_intelligent_inputs(scenario, verbose, app_flags)
         
         if returncode != 0:
             print(f"    ❌ App failed with return code {returncode}")
@@ -389,10 +567,10 @@ def run_test_scenario(scenario, test_number=None, verbose=False, extra_flags=Non
             return False, f"App crashed: {stderr}"
         
         # Evaluate results
-        test_passed, mismatches, final_data = evaluate_test(scenario)
+        test_passed, mismatches, final_data = evaluate_test(scenario, session)
         
         # Save test result
-        save_test_result(scenario, final_data, test_passed, mismatches, stdout, stderr)
+        save_test_result(scenario, final_data, test_passed, mismatches, stdout, stderr, session)
         
         # Print summary
         if test_number:
@@ -405,6 +583,79 @@ def run_test_scenario(scenario, test_number=None, verbose=False, extra_flags=Non
         print(error_msg)
         return None, error_msg
 
+def _suite_counters():
+    """Response cache and prefetch counters of this process, {"response_cache": stats, "prefetch": stats}"""
+    counters = {}
+    for agent in _test_agents.values():
+        if agent.response_cache is not None:
+            _add_counters(counters, "response_cache", agent.response_cache.stats())
+    for prefetcher in _test_prefetchers.values():
+        if prefetcher is not None:
+            _add_counters(counters, "prefetch", prefetcher.stats())
+    return counters
+
+def _add_counters(totals, name, stats, sign=1):
+    """Add (sign=-1: subtract) the counts of a stats() dict to totals[name] - rates are recomputed when printed"""
+    total = totals.setdefault(name, {})
+    for key, value in stats.items():
+        if key not in ("hit_rate", "memory_entries"):
+            total[key] = total.get(key, 0) + sign * value
+
+def _counter_delta(before, after):
+    """What the counters of one scenario added (pool workers run several scenarios)"""
+    delta = {}
+    for name, stats in after.items():
+        _add_counters(delta, name, stats)
+        if name in before:
+            _add_counters(delta, name, before[name], sign=-1)
+    return delta
+
+def print_suite_counters(counters):
+    """Print the response cache and prefetch summaries of the suite"""
+    import response_cache
+    import prefetch
+    
+    if "response_cache" in counters:
+        print(f"🗄️  Response cache: {response_cache.format_stats(counters['response_cache'])}")
+    if "prefetch" in counters:
+        print(f"🔮 Prefetch: {prefetch.format_stats(counters['prefetch'])}")
+
+def run_isolated_scenario(scenario, test_number, verbose=False, extra_flags=None, in_process=False, capture=True):
+    """Run one scenario in a temporary data directory (also the process pool worker)
+    
+    With capture, output is returned so parallel scenarios print as whole blocks.
+    The counters the scenario added are returned too, so the parent can sum them.
+    """
+    output = io.StringIO()
+    before = _suite_counters()
+    workspace = tempfile.mkdtemp(prefix="simple_assistant_test_")
+    try:
+        with contextlib.redirect_stdout(output) if capture else contextlib.nullcontext():
+            result, error = run_test_scenario(scenario, test_number, verbose, extra_flags, workspace, in_process)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+        for prefetcher in _test_prefetchers.values():
+            if prefetcher is not None:
+                prefetcher.flush()  # Pool workers exit without running any cleanup
+    return test_number, result, error, output.getvalue(), _counter_delta(before, _suite_counters())
+
+def run_scenarios_parallel(scenarios, jobs, verbose=False, extra_flags=None, in_process=False):
+    """Run scenarios on a pool of jobs processes, returning ({test number: result}, summed counters)"""
+    results = {}
+    counters = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(run_isolated_scenario, scenario, i, verbose, extra_flags, in_process)
+            for i, scenario in enumerate(scenarios, 1)
+        ]
+        for future in as_completed(futures):
+            test_number, result, error, output, scenario_counters = future.result()
+            print(output, end="", flush=True)
+            results[test_number] = result
+            for name, stats in scenario_counters.items():
+                _add_counters(counters, name, stats)
+    return results, counters
+
 def list_tests():
     """List available test scenarios"""
     scenarios = load_test_scenarios()
@@ -426,31 +677,51 @@ def _parse_command_line_flags():
     if verbose:
         sys.argv.remove("--verbose")  # Remove it so other parsing works
     
+    # --in-process drives the engine directly instead of running app.py end to end
+    in_process = "--in-process" in sys.argv
+    if in_process:
+        sys.argv.remove("--in-process")
+    
+    # Number of scenarios run in parallel (--jobs N or --jobs=N), None runs them in order
+    jobs = None
+    for index, arg in enumerate(sys.argv):
+        if arg == "--jobs" and index + 1 < len(sys.argv):
+            jobs = int(sys.argv[index + 1])
+            del sys.argv[index:index + 2]
+            break
+        if arg.startswith("--jobs="):
+            jobs = int(arg.split("=")[1])
+            del sys.argv[index]
+            break
+    
     # Extract extra flags to pass to app.py
     extra_flags = []
-    app_flags = ["--full-prompt", "--language", "--debug"]
+    app_flags = ["--full-prompt", "--language", "--debug", "--chat-messages", "--metrics", "--stream",
+                 "--offline-recommendations", "--response-cache", "--local-extraction",
+                 "--widget-chain", "--prefetch", "--model-routes"]
     for flag in app_flags:
         if flag in sys.argv:
             extra_flags.append(flag)
             sys.argv.remove(flag)
     
-    # Extract model parameter
-    model_flag = None
-    for i, arg in enumerate(sys.argv):
-        if arg.startswith("--model="):
-            model_flag = arg
-            sys.argv.remove(arg)
-            break
-    if model_flag:
-        extra_flags.append(model_flag)
-    
-    return verbose, extra_flags
+    # Extract value parameters (model, LLM backend, history budget)
+    value_flags = ["--model=", "--history-budget=", "--log-fsync=", "--llm=", "--llm-latency=", "--cassette=",
+                   "--temperature=", "--response-cache=", "--response-cache-file=", "--prefetch=",
+                   "--prefetch-budget=", "--model-routes="]
+    for prefix in value_flags:
+        for arg in sys.argv:
+            if arg.startswith(prefix):
+                extra_flags.append(arg)
+                sys.argv.remove(arg)
+                break
+    
+    return verbose, extra_flags, jobs, in_process
 
 def main():
     """Main test runner"""
     
     # Parse command-line flags
-    verbose, extra_flags = _parse_command_line_flags()
+    verbose, extra_flags, jobs, in_process = _parse_command_line_flags()
     
     # No arguments = run all tests
     if len(sys.argv) < 2:
@@ -459,23 +730,39 @@ def main():
             print("❌ No test scenarios found. Create data/test.json first.")
             return
             
-        print(f"🧪 Simple Onboarding Test Suite - {len(scenarios)} scenarios")
+        mode = "in-process" if in_process else "subprocess"
+        print(f"🧪 Simple Onboarding Test Suite - {len(scenarios)} scenarios, {mode}" + (f" ({jobs} jobs)" if jobs else ""))
         print("=" * 60)
         
         passed_tests = 0
         failed_tests = 0
+        start_time = time.perf_counter()
+        
+        if jobs:
+            # Every scenario gets its own data directory, so they can run concurrently
+            # The workers' counters come back with their results
+            results, counters = run_scenarios_parallel(scenarios, jobs, verbose, extra_flags, in_process)
+        elif in_process:
+            # In-process scenarios always get their own session, the data files stay untouched
+            results = {}
+            for i, scenario in enumerate(scenarios, 1):
+                _, results[i], error, _, _ = run_isolated_scenario(scenario, i, verbose, extra_flags, in_process, capture=False)
+            counters = _suite_counters()
+        else:
+            results = {}
+            for i, scenario in enumerate(scenarios, 1):
+                results[i], error = run_test_scenario(scenario, i, verbose, extra_flags)
+            counters = _suite_counters()
         
-        for i, scenario in enumerate(scenarios, 1):
-            result, error = run_test_scenario(scenario, i, verbose, extra_flags)
-            if result is None:  # Crashed
-                failed_tests += 1
-            elif result:  # Passed
+        for i in sorted(results):
+            if results[i]:  # Passed
                 passed_tests += 1
-            else:  # Failed
+            else:  # Failed or crashed (None)
                 failed_tests += 1
         
         print("=" * 60)
-        print(f"📊 Results: {passed_tests} passed, {failed_tests} failed")
+        print(f"📊 Results: {passed_tests} passed, {failed_tests} failed ({time.perf_counter() - start_time:.1f}s)")
+        print_suite_counters(counters)
         return
     
     command = sys.argv[1]
@@ -505,7 +792,10 @@ def main():
         scenario = scenarios[test_number - 1]
         print(f"🧪 Running: {scenario['name']} ({scenario.get('profile', 'generic')})")
         
-        run_test_scenario(scenario, test_number, verbose, extra_flags)
+        if in_process:
+            run_isolated_scenario(scenario, test_number, verbose, extra_flags, in_process, capture=False)
+        else:
+            run_test_scenario(scenario, test_number, verbose, extra_flags)
     
     else:
         print(f"❌ Unknown command: {command}")
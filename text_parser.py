@@ -32,6 +32,90 @@ def parse_language_tags(message):
     # TODO: For later reference - we're passing concatenated string to UI
     # Could separate into structured data for more advanced UI formatting
     
+# Tags rendered while streaming the user-facing part of a response
+STREAM_TAG_RENDER = {
+    "<english>": "🇺🇸 ",
+    "</english>": "",
+    "<turkish>": "\n🇹🇷 ",
+    "</turkish>": ""
+}
+
+class StreamDisplayFilter:
+    """Turn streamed response chunks into display text, hiding the <system_message> block
+    
+    Partial tags are held back until they can be recognized, language tags are
+    rendered with flags like parse_language_tags, and everything from
+    <system_message> on is suppressed.
+    """
+    
+    SYSTEM_TAG = "<system_message>"
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pending_space = ""
+        self._skip_space = True  # Drop whitespace at the start and after tags
+        self._done = False
+        self._tags = list(STREAM_TAG_RENDER) + [self.SYSTEM_TAG]
+    
+    def feed(self, chunk):
+        """Consume a chunk and return the text that is safe to display now"""
+        if self._done:
+            return ""
+        
+        self._buffer += chunk
+        output = []
+        
+        while self._buffer:
+            tag_start = self._buffer.find("<")
+            if tag_start == -1:
+                output.append(self._text(self._buffer))
+                self._buffer = ""
+                break
+            
+            output.append(self._text(self._buffer[:tag_start]))
+            self._buffer = self._buffer[tag_start:]
+            
+            if self._buffer.startswith(self.SYSTEM_TAG):
+                self._done = True
+                self._buffer = ""
+                break
+            
+            tag = next((t for t in STREAM_TAG_RENDER if self._buffer.startswith(t)), None)
+            if tag:
+                self._pending_space = ""
+                output.append(STREAM_TAG_RENDER[tag])
+                self._buffer = self._buffer[len(tag):]
+                self._skip_space = True
+            elif any(t.startswith(self._buffer) for t in self._tags):
+                # Possibly the start of a tag - wait for more text
+                break
+            else:
+                output.append(self._text("<"))
+                self._buffer = self._buffer[1:]
+        
+        return "".join(output)
+    
+    def close(self):
+        """Flush text held back at the end of the stream (an unfinished tag is plain text)"""
+        if self._done:
+            return ""
+        
+        text, self._buffer = self._buffer, ""
+        return self._text(text)
+    
+    def _text(self, text):
+        """Emit plain text, holding trailing whitespace until more text follows"""
+        if self._skip_space:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._skip_space = False
+        
+        text = self._pending_space + text
+        stripped = text.rstrip()
+        self._pending_space = text[len(stripped):]
+        return stripped
+
 def parse_response(llm_response):
     """Parse LLM response into user message and system commands"""
     # Split response into user message and system message
@@ -114,3 +198,267 @@ def validate_any_action(action):
     print(f"[DEBUG] - Invalid action '{action}', skipping")
     return None
 
+# Incremental parsing -------------------------------------------------------
+
+SYSTEM_OPEN_TAG = "<system_message>"
+SYSTEM_CLOSE_TAG = "</system_message>"
+
+def _held_back_length(text, tags):
+    """Length of the longest suffix of text that is a proper prefix of one of tags"""
+    longest = 0
+    for tag in tags:
+        for size in range(min(len(tag) - 1, len(text)), longest, -1):
+            if text.endswith(tag[:size]):
+                longest = size
+                break
+    return longest
+
+class _TagMatcher:
+    """Incremental leftmost, non-overlapping matcher for one system command pattern
+    
+    The pattern is a sequence of literals and runs ("one or more characters
+    except X"). Every run is followed by a literal starting with X, so each
+    candidate match is a deterministic automaton. Candidates in the same state
+    are merged (the earliest start wins), which keeps the work per character
+    constant and gives the same matches as re.findall / re.search.
+    """
+    
+    def __init__(self, tokens, regex, first_only=False):
+        self.tokens = tokens
+        self.regex = re.compile(regex)
+        self.first_only = first_only
+        self.finished = False
+        self._states = {}  # (token_index, offset_or_nonempty) -> start position
+    
+    def step(self, char, position, text_chars):
+        """Advance all candidates by one character, returns regex match groups on accept"""
+        if self.finished:
+            return None
+        
+        next_states = {}
+        accepted = None
+        
+        for state, start in self._states.items():
+            next_state = self._advance(state, char)
+            if next_state == "ACCEPT":
+                if accepted is None or start < accepted:
+                    accepted = start
+            elif next_state is not None and (next_state not in next_states or start < next_states[next_state]):
+                next_states[next_state] = start
+        
+        # Every match starts with the first literal - open a new candidate
+        if char == self.tokens[0][1][0]:
+            next_state = self._advance((0, 0), char)
+            if next_state is not None and next_state not in next_states:
+                next_states[next_state] = position
+        
+        if accepted is not None:
+            # Matches never overlap - drop every candidate inside this one
+            self._states = {}
+            if self.first_only:
+                self.finished = True
+            match = self.regex.match("".join(text_chars[accepted:position + 1]))
+            return match.groups()
+        
+        self._states = next_states
+        return None
+    
+    def _advance(self, state, char):
+        """Transition for one candidate: returns the next state, 'ACCEPT' or None"""
+        index, progress = state
+        kind, value = self.tokens[index]
+        
+        if kind == "run":
+            if char != value:
+                return (index, True)
+            if not progress:
+                return None
+            # The literal after a run starts with the excluded character
+            return self._after_literal_char(index + 1, 1)
+        
+        if char != value[progress]:
+            return None
+        return self._after_literal_char(index, progress + 1)
+    
+    def _after_literal_char(self, index, offset):
+        """State after matching offset characters of the literal at index"""
+        if offset < len(self.tokens[index][1]):
+            return (index, offset)
+        if index + 1 == len(self.tokens):
+            return "ACCEPT"
+        if self.tokens[index + 1][0] == "run":
+            return (index + 1, False)
+        return (index + 1, 0)
+
+class _LanguageTagScanner:
+    """Find the first <tag>...</tag> block in streamed user text (like re.search with .*?)"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.open_tag = f"<{name}>"
+        self.close_tag = f"</{name}>"
+        self.state = "open"  # open -> close -> done
+        self._tail = ""
+        self._content = []
+    
+    def feed(self, text):
+        """Consume user text, returns the stripped block content once the closing tag arrives"""
+        if self.state == "done":
+            return None
+        
+        text = self._tail + text
+        self._tail = ""
+        
+        if self.state == "open":
+            index = text.find(self.open_tag)
+            if index == -1:
+                keep = _held_back_length(text, [self.open_tag])
+                self._tail = text[len(text) - keep:] if keep else ""
+                return None
+            self.state = "close"
+            text = text[index + len(self.open_tag):]
+        
+        index = text.find(self.close_tag)
+        if index == -1:
+            keep = _held_back_length(text, [self.close_tag])
+            self._content.append(text[:len(text) - keep])
+            self._tail = text[len(text) - keep:] if keep else ""
+            return None
+        
+        self._content.append(text[:index])
+        self.state = "done"
+        return "".join(self._content).strip()
+
+class StreamingParser:
+    """Incremental, single-pass parser for streamed LLM responses
+    
+    feed() consumes chunks and returns events as soon as each closing tag
+    arrives:
+        {"type": "text", "text": ...}                 user-facing text
+        {"type": "english" | "turkish", "text": ...}  language blocks
+        {"type": "update", "field": ..., "value": ...}
+        {"type": "asking", "field": ...}
+        {"type": "action", "action": ...}             validated action name
+    close() returns the same dict as parse_response() on the full text.
+    """
+    
+    def __init__(self):
+        self._mode = "user"  # user -> system -> ignored (after a second <system_message>)
+        self._tail = ""
+        self._user_parts = []
+        self._system_chars = []
+        self._languages = {name: _LanguageTagScanner(name) for name in ("english", "turkish")}
+        self._language_text = {}
+        self._commands = {"updates": [], "asking": None, "recommendations": []}
+        self._update_matcher = _TagMatcher(
+            [("lit", '<update>"'), ("run", '"'), ("lit", '":"'), ("run", '"'), ("lit", '"</update>')],
+            r'<update>"([^"]+)":"([^"]+)"</update>'
+        )
+        self._asking_matcher = _TagMatcher(
+            [("lit", "<asking>"), ("run", "<"), ("lit", "</asking>")],
+            r'<asking>([^<]+)</asking>', first_only=True
+        )
+        self._action_matcher = _TagMatcher(
+            [("lit", "<action>"), ("run", "<"), ("lit", "</action>")],
+            r'<action>([^<]+)</action>'
+        )
+    
+    def feed(self, chunk):
+        """Consume a chunk of the response and return the events it completed"""
+        events = []
+        text = self._tail + chunk
+        self._tail = ""
+        
+        while text and self._mode != "ignored":
+            if self._mode == "user":
+                index = text.find(SYSTEM_OPEN_TAG)
+                if index == -1:
+                    keep = _held_back_length(text, [SYSTEM_OPEN_TAG])
+                    self._user_text(text[:len(text) - keep], events)
+                    self._tail = text[len(text) - keep:] if keep else ""
+                    break
+                self._user_text(text[:index], events)
+                self._mode = "system"
+                text = text[index + len(SYSTEM_OPEN_TAG):]
+            else:
+                # parse_response keeps the text up to a second <system_message>
+                # and removes every </system_message>
+                open_index = text.find(SYSTEM_OPEN_TAG)
+                close_index = text.find(SYSTEM_CLOSE_TAG)
+                if close_index != -1 and (open_index == -1 or close_index < open_index):
+                    self._system_text(text[:close_index], events)
+                    text = text[close_index + len(SYSTEM_CLOSE_TAG):]
+                elif open_index != -1:
+                    self._system_text(text[:open_index], events)
+                    self._mode = "ignored"
+                else:
+                    keep = _held_back_length(text, [SYSTEM_OPEN_TAG, SYSTEM_CLOSE_TAG])
+                    self._system_text(text[:len(text) - keep], events)
+                    self._tail = text[len(text) - keep:] if keep else ""
+                    break
+        
+        return events
+    
+    def close(self):
+        """Finish the stream and return the parse_response() result"""
+        events = []
+        if self._tail:
+            tail, self._tail = self._tail, ""
+            if self._mode == "user":
+                self._user_text(tail, events)
+            elif self._mode == "system":
+                self._system_text(tail, events)
+        
+        user_message = "".join(self._user_parts).strip()
+        english_text = self._language_text.get("english")
+        turkish_text = self._language_text.get("turkish")
+        if english_text is not None and turkish_text is not None:
+            final_user_message = f"🇺🇸 {english_text}\n🇹🇷 {turkish_text}"
+        elif english_text is not None:
+            final_user_message = f"🇺🇸 {english_text}"
+        else:
+            final_user_message = user_message
+        
+        return {
+            "user_message": final_user_message,
+            "system_commands": self._commands,
+            "raw_system": "".join(self._system_chars).strip()
+        }
+    
+    def _user_text(self, text, events):
+        """Handle text that belongs to the user message"""
+        if not text:
+            return
+        self._user_parts.append(text)
+        events.append({"type": "text", "text": text})
+        
+        for name, scanner in self._languages.items():
+            content = scanner.feed(text)
+            if content is not None:
+                self._language_text[name] = content
+                events.append({"type": name, "text": content})
+    
+    def _system_text(self, text, events):
+        """Run the command matchers over system message text, one character at a time"""
+        for char in text:
+            position = len(self._system_chars)
+            self._system_chars.append(char)
+            
+            groups = self._update_matcher.step(char, position, self._system_chars)
+            if groups:
+                update = {"field": groups[0], "value": groups[1]}
+                self._commands["updates"].append(update)
+                events.append({"type": "update", **update})
+            
+            groups = self._asking_matcher.step(char, position, self._system_chars)
+            if groups:
+                self._commands["asking"] = groups[0].strip()
+                events.append({"type": "asking", "field": self._commands["asking"]})
+            
+            groups = self._action_matcher.step(char, position, self._system_chars)
+            if groups:
+                validated_action = validate_any_action(groups[0].strip())
+                if validated_action:
+                    self._commands["recommendations"].append(validated_action)
+                    events.append({"type": "action", "action": validated_action})
+
@@ -3,10 +3,12 @@
 Simplified widget handler for simple_onboarding
 """
 
-import json
 from conversation_ui import get_user_input
+from prompt_registry import shared_cache, read_json
 import textwrap
 
+WIDGET_CONFIG_FILE = "data/widget_config.json"
+
 def wrap_text_with_prefix(text, max_width, continuation_prefix):
     """Wrap text with proper alignment for continuation lines"""
     if len(text) <= max_width:
@@ -53,20 +55,106 @@ def wrap_text_with_prefix(text, max_width, continuation_prefix):
     
     return lines
 
-def load_widget_config():
-    """Load widget configuration"""
+class WidgetRegistry:
+    """Widget configuration indexed by field, built once per version of the config file"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.fields = {}
+        
+        for field_name, widget_config in config.get("widget_fields", {}).items():
+            option_objects = widget_config.get("options")
+            spec = {
+                "enabled": widget_config.get("enabled", False),
+                "question_text": widget_config.get("question_text_tr", f"Select {field_name}"),
+                "question_text_en": widget_config.get("question_text", f"Select {field_name}"),
+                "has_options": option_objects is not None,
+                "values": [opt["value"] for opt in option_objects or []],
+                "display_options": [opt["display_tr"] for opt in option_objects or []],
+            }
+            spec["display_by_value"] = dict(zip(spec["values"], spec["display_options"]))
+            spec["value_by_display"] = dict(zip(spec["display_options"], spec["values"]))
+            
+            # Lower-cased display text and English value both resolve to the option
+            spec["choices"] = {}
+            for value, display in zip(spec["values"], spec["display_options"]):
+                spec["choices"].setdefault(display.lower(), (value, display))
+                spec["choices"].setdefault(value.lower(), (value, display))
+            
+            self.fields[field_name] = spec
+        
+        self.enabled_fields = frozenset(name for name, spec in self.fields.items() if spec["enabled"])
+    
+    def get(self, field_name):
+        """Return the indexed spec of a field, or None"""
+        return self.fields.get(field_name)
+
+def _build_widget_registry(path):
+    """FileCache loader: parse widget_config.json and index it"""
+    return WidgetRegistry(read_json(path))
+
+def get_widget_registry():
+    """Return the shared widget registry, rebuilt only when widget_config.json changes"""
     try:
-        with open("data/widget_config.json", 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return shared_cache.get(WIDGET_CONFIG_FILE, _build_widget_registry)
     except Exception as e:
         print(f"Error loading widget config: {e}")
-        return {}
+        return WidgetRegistry({})
+
+def load_widget_config():
+    """Load widget configuration"""
+    return get_widget_registry().config
 
 def is_widget_field(field_name):
     """Check if a field is configured as a widget field"""
-    config = load_widget_config()
-    widget_fields = config.get("widget_fields", {})
-    return field_name in widget_fields and widget_fields[field_name].get("enabled", False)
+    return field_name in get_widget_registry().enabled_fields
+
+def get_widget_prompt(field_name):
+    """Return (question_text, display_options) for a widget field, or None"""
+    spec = get_widget_registry().get(field_name)
+    
+    if not spec or not spec["has_options"]:
+        return None
+    
+    return spec["question_text"], list(spec["display_options"])
+
+def resolve_widget_choice(field_name, choice):
+    """Map a widget answer (option number or display text) to (english_value, turkish_display)"""
+    spec = get_widget_registry().get(field_name)
+    
+    if not spec or not spec["has_options"]:
+        return None
+    
+    choice = str(choice).strip()
+    
+    if choice.isdigit():
+        choice_num = int(choice)
+        if 1 <= choice_num <= len(spec["values"]):
+            return spec["values"][choice_num - 1], spec["display_options"][choice_num - 1]
+        return None
+    
+    # Accept the display text or the English value directly (e.g. from a web client)
+    return spec["choices"].get(choice.lower())
+
+def next_chained_widget(data):
+    """Next missing field of the data record if it is an enabled widget field (widget chain mode)"""
+    missing = [field for field, value in data.items() if value is None]
+    if missing and is_widget_field(missing[0]):
+        return missing[0]
+    return None
+
+def widget_chain_response(field, language_mode=False):
+    """Raw response asking a widget field without an LLM call, in the LLM response format
+    
+    The message is the widget's own question (question_text, with
+    question_text_tr in language mode).
+    """
+    spec = get_widget_registry().get(field)
+    if language_mode:
+        message = f"<english>{spec['question_text_en']}</english>\n<turkish>{spec['question_text']}</turkish>"
+    else:
+        message = spec["question_text_en"]
+    return f"{message}\n\n<system_message>\n<asking>{field}</asking>\n</system_message>"
 
 def print_widget_box(question_text, options, selected_option=None):
     """Print entire widget content in a nice box with text wrapping"""
@@ -112,22 +200,19 @@ def print_widget_box(question_text, options, selected_option=None):
 
 def show_widget_for_field(field_name):
     """Show widget interface for a specific field and get user selection"""
-    config = load_widget_config()
-    widget_fields = config.get("widget_fields", {})
+    spec = get_widget_registry().get(field_name)
     
-    if field_name not in widget_fields:
+    if spec is None:
         print(f"❌ No widget configuration found for field: {field_name}")
         return None
     
-    widget_config = widget_fields[field_name]
-    
     # Use Turkish question text
-    question_text = widget_config.get("question_text_tr", f"Select {field_name}")
+    question_text = spec["question_text"]
     
     # Get options
-    if "options" in widget_config:
-        option_objects = widget_config["options"]
-        display_options = [opt["display_tr"] for opt in option_objects]
+    if spec["has_options"]:
+        option_values = spec["values"]
+        display_options = spec["display_options"]
     else:
         print(f"❌ No options available for field: {field_name}")
         return None
@@ -150,7 +235,7 @@ def show_widget_for_field(field_name):
             if 1 <= choice_num <= len(display_options):
                 choice_index = choice_num - 1
                 selected_display = display_options[choice_index]  # Turkish display
-                selected_value = option_objects[choice_index]["value"]  # English value
+                selected_value = option_values[choice_index]  # English value
                 
                 print_widget_box(question_text, display_options, selected_display)
                 return selected_value, selected_display  # Return English for backend, Turkish for display
@@ -165,7 +250,7 @@ def show_widget_for_field(field_name):
             if display_options:
                 choice_index = 0
                 selected_display = display_options[choice_index]
-                selected_value = option_objects[choice_index]["value"]
+                selected_value = option_values[choice_index]
                 print_widget_box(question_text, display_options, selected_display)
                 return selected_value, selected_display
             return None
\ No newline at end of file